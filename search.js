@@ -0,0 +1,126 @@
+// Client-side search over the index built by utility/build_search_index.py.
+// Nothing is fetched until the search box is used; then index.json is loaded
+// once, and only the shards holding the query's terms after that.
+(function () {
+    const base = new URL('.', document.currentScript.src).href; // The site root
+    const indexDir = base + 'assets/search/';
+    const maxResults = 20;
+    let index = null;
+    const shards = {};
+
+    function loadIndex() {
+        if (!index) {
+            index = fetch(indexDir + 'index.json').then(response => response.json());
+        }
+        return index;
+    }
+
+    function loadShard(key, version) {
+        if (!shards[key]) {
+            shards[key] = fetch(indexDir + 'shard-' + key + '.json?v=' + version).then(response => response.json());
+        }
+        return shards[key];
+    }
+
+    // Same rules as tokenize() in build_search_index.py
+    function tokenize(text, settings) {
+        const words = text.toLowerCase().normalize('NFKD').replace(/[\u0300-\u036f]/g, '').match(/[a-z0-9]+/g) || [];
+        return words.filter(word => word.length >= settings.min_length && !settings.stop_words.includes(word));
+    }
+
+    // Postings are [doc id gap, count, ...] pairs; returns a Map of doc id -> count
+    function decode(postings) {
+        const docs = new Map();
+        let docId = 0;
+        for (let i = 0; i < postings.length; i += 2) {
+            docId += postings[i];
+            docs.set(docId, postings[i + 1]);
+        }
+        return docs;
+    }
+
+    async function search(query) {
+        const idx = await loadIndex();
+        const terms = [...new Set(tokenize(query, idx))];
+        if (!terms.length) {
+            return [];
+        }
+        let scores = null;
+        for (let i = 0; i < terms.length; i++) {
+            const term = terms[i];
+            const key = /[a-z]/.test(term[0]) ? term[0] : '0';
+            const shard = key in idx.shards ? await loadShard(key, idx.shards[key]) : {};
+            // The last word may still be being typed, so it also matches as a prefix
+            const matches = i === terms.length - 1 ? Object.keys(shard).filter(t => t.startsWith(term)) : (term in shard ? [term] : []);
+            const termScores = new Map();
+            for (const match of matches) {
+                const docs = decode(shard[match]);
+                const weight = Math.log(1 + idx.docs.length / docs.size);
+                docs.forEach((count, docId) => termScores.set(docId, (termScores.get(docId) || 0) + count * weight));
+            }
+            if (scores === null) {
+                scores = termScores;
+            } else {
+                // Every term must match
+                for (const docId of [...scores.keys()]) {
+                    if (termScores.has(docId)) {
+                        scores.set(docId, scores.get(docId) + termScores.get(docId));
+                    } else {
+                        scores.delete(docId);
+                    }
+                }
+            }
+        }
+        return [...scores.entries()]
+            .sort((a, b) => b[1] - a[1])
+            .slice(0, maxResults)
+            .map(([docId]) => ({ path: idx.docs[docId][0], title: idx.docs[docId][1], summary: idx.docs[docId][2] }));
+    }
+
+    function render(list, results, query) {
+        list.replaceChildren(...results.map(result => {
+            const item = document.createElement('li');
+            item.className = 'article-item';
+            const strong = document.createElement('strong');
+            const link = document.createElement('a');
+            link.href = base + result.path;
+            link.textContent = result.title;
+            strong.appendChild(link);
+            item.appendChild(strong);
+            if (result.summary) {
+                const summary = document.createElement('p');
+                summary.textContent = result.summary;
+                item.appendChild(summary);
+            }
+            return item;
+        }));
+        if (!results.length && query.trim()) {
+            const item = document.createElement('li');
+            item.textContent = 'No results.';
+            list.appendChild(item);
+        }
+        list.hidden = !query.trim();
+    }
+
+    // Wires up <form data-search> elements: an input and a results list
+    document.querySelectorAll('form[data-search]').forEach(function (form) {
+        const input = form.querySelector('input');
+        const list = form.querySelector('[data-search-results]');
+        let timer = null;
+        form.addEventListener('submit', event => event.preventDefault());
+        input.addEventListener('focus', loadIndex, { once: true });
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                const query = input.value;
+                search(query).then(results => {
+                    if (input.value === query) {
+                        render(list, results, query);
+                    }
+                });
+            }, 150);
+        });
+    });
+
+    window.siteSearch = search;
+})();
@@ -0,0 +1,122 @@
+import os
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import check_links
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers by path: /ok, /missing, /no-head (refuses HEAD) and /moved (redirects to /ok)."""
+    requests = []
+
+    def _respond(self, body):
+        type(self).requests.append((self.command, self.path))
+        if self.path == '/ok':
+            self.send_response(200)
+        elif self.path == '/no-head':
+            self.send_response(405 if self.command == 'HEAD' else 200)
+        elif self.path == '/moved':
+            self.send_response(301)
+            self.send_header('Location', '/ok')
+        else:
+            self.send_response(404)
+        self.send_header('Content-Length', str(len(body)) if self.command == 'GET' else '0')
+        self.end_headers()
+        if self.command == 'GET':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._respond(b'')
+
+    def do_GET(self):
+        self._respond(b'stub')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubHandler.requests = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def refused_url():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/"
+
+
+def make_site(root, stub_url, refused_url):
+    pages = {
+        'index.html': f"""<!DOCTYPE html>
+<html>
+<head><link href="https://fonts.gstatic.com" rel="preconnect"/></head>
+<body>
+<a href="about.html#team">Team</a>
+<a href="about.html#nobody">Nobody</a>
+<img src="assets/a.png" srcset="assets/a.png 480w, assets/missing.webp 960w"/>
+<a href="{stub_url}/ok">OK</a>
+<a href="{stub_url}/missing">Missing</a>
+<a href="{stub_url}/no-head">No HEAD</a>
+<a href="{stub_url}/moved#section">Moved</a>
+<a href="{refused_url}">Down</a>
+<a href="mailto:someone@example.com">Mail</a>
+</body>
+</html>
+""",
+        'about.html': '<html><body><h2 id="team">Team</h2></body></html>\n',
+    }
+    for name, content in pages.items():
+        (root / name).write_text(content, encoding='utf-8')
+    (root / 'assets').mkdir()
+    (root / 'assets' / 'a.png').write_bytes(b'')
+    return str(root)
+
+
+def broken_links(capsys):
+    out = capsys.readouterr().out
+    return sorted(line for line in out.splitlines() if line.startswith('index.html:'))
+
+
+def test_broken_internal_and_external_links_are_reported(tmp_path, stub_url, refused_url, capsys):
+    root_dir = make_site(tmp_path, stub_url, refused_url)
+    assert check_links.main(root_dir) == 4
+
+    broken = broken_links(capsys)
+    assert f"index.html:9: {stub_url}/missing (HTTP 404)" in broken
+    assert any(line.startswith(f"index.html:12: {refused_url} (") for line in broken)
+    assert "index.html:6: about.html#nobody (no id 'nobody' in about.html)" in broken
+    assert "index.html:7: assets/missing.webp (no such file)" in broken
+    # HEAD refused, so the page was fetched with GET instead
+    assert ('GET', '/no-head') in StubHandler.requests
+
+
+def test_offline_run_only_checks_internal_links(tmp_path, stub_url, refused_url, capsys):
+    root_dir = make_site(tmp_path, stub_url, refused_url)
+    assert check_links.main(root_dir, offline=True) == 2
+    assert StubHandler.requests == []
+
+
+def test_passing_results_are_cached(tmp_path, stub_url, refused_url, capsys):
+    root_dir = make_site(tmp_path, stub_url, refused_url)
+    check_links.main(root_dir)
+    with open(os.path.join(root_dir, os.path.basename(check_links.CACHE_PATH)), 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    assert cache[f"{stub_url}/ok"]['error'] is None
+    assert cache[f"{stub_url}/missing"]['error'] == "HTTP 404"
+
+    StubHandler.requests = []
+    assert check_links.main(root_dir) == 4
+    # Only the failing URL is requested again; the refused one never reaches the server
+    assert {path for _, path in StubHandler.requests} == {'/missing'}
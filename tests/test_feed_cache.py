@@ -0,0 +1,122 @@
+import os
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import feed_cache
+from import_substack import entry_body, entry_date
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'substack_feed.xml')
+ETAG = '"fixture-1"'
+POST_URL = 'https://harryhunter.substack.com/p/between-the-lines'
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serves the fixture feed with an ETag, or the status the test sets."""
+    status = 200
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(dict(self.headers))
+        if self.status != 200:
+            self.send_error(self.status)
+            return
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        with open(FIXTURE_PATH, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_servers = []
+
+
+def stop_server():
+    for httpd in _servers:
+        httpd.shutdown()
+        httpd.server_close()
+    _servers.clear()
+
+
+@pytest.fixture
+def server():
+    """A local stand-in for the Substack feed, returns its URL."""
+    FeedHandler.status = 200
+    FeedHandler.requests = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    _servers.append(httpd)
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/feed"
+    stop_server()
+
+
+@pytest.fixture
+def unused_url():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/feed"
+
+
+def test_entries_are_parsed_and_indexed_as_json(server, tmp_path):
+    entries = feed_cache.load_entries(server, str(tmp_path))
+    assert list(entries) == [POST_URL, 'https://harryhunter.substack.com/p/platform-teams-revisited']
+
+    _, _, index_path = feed_cache._cache_paths(server, str(tmp_path))
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    assert set(index['entries']) == set(entries)
+
+
+def test_not_modified_feed_uses_the_cached_entries(server, tmp_path, monkeypatch):
+    first = feed_cache.load_entries(server, str(tmp_path))
+    monkeypatch.setattr(feed_cache.feedparser, 'parse', lambda raw: pytest.fail("feed parsed again"))
+    cached = feed_cache.load_entries(server, str(tmp_path))
+
+    assert FeedHandler.requests[-1].get('If-None-Match') == ETAG
+    entry, original = cached[POST_URL], first[POST_URL]
+    assert entry.title == original.title
+    assert entry_body(entry) == entry_body(original)
+    assert entry_date(entry) == entry_date(original)
+
+
+@pytest.mark.parametrize('status', [404, 500, 503])
+def test_http_errors_fall_back_to_the_cache(server, tmp_path, status, capsys):
+    feed_cache.load_entries(server, str(tmp_path))
+    FeedHandler.status = status
+    entries = feed_cache.load_entries(server, str(tmp_path))
+    assert POST_URL in entries
+    assert f"HTTP {status}" in capsys.readouterr().out
+
+
+def test_unreachable_feed_falls_back_to_the_cache(server, tmp_path, capsys):
+    feed_cache.load_entries(server, str(tmp_path))
+    stop_server()
+    entries = feed_cache.load_entries(server, str(tmp_path))
+    assert POST_URL in entries
+    assert "using the cached feed" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('status', [404, 500])
+def test_http_error_without_a_cache_returns_none(server, tmp_path, status, capsys):
+    FeedHandler.status = status
+    assert feed_cache.load_entries(server, str(tmp_path)) is None
+    assert "no cached copy" in capsys.readouterr().out
+
+
+def test_refused_connection_without_a_cache_returns_none(unused_url, tmp_path, capsys):
+    assert feed_cache.load_entries(unused_url, str(tmp_path)) is None
+    assert "no cached copy" in capsys.readouterr().out
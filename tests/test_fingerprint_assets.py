@@ -0,0 +1,47 @@
+import json
+
+import fingerprint_assets
+
+
+def make_site(root):
+    (root / 'assets').mkdir()
+    (root / 'assets' / 'banner.jpg').write_bytes(b'banner')
+    (root / 'styles').mkdir()
+    (root / 'styles' / 'common.css').write_text(".hero { background: url('../assets/banner.jpg'); }\n")
+    (root / 'case_studies').mkdir()
+    (root / 'case_studies' / 'page.html').write_text("""<html>
+<head>
+<link href="../styles/common.css" rel="stylesheet"/>
+<style>.intro { background-image: url("../assets/banner.jpg"); }</style>
+</head>
+<body>
+<div style="background-image: url('../assets/banner.jpg');"></div>
+<div style="background-image: url('https://images.example.com/photo.jpg');"></div>
+</body>
+</html>
+""")
+
+
+def test_pages_point_at_hashed_assets(tmp_path):
+    make_site(tmp_path)
+    fingerprint_assets.main(str(tmp_path))
+
+    manifest = json.loads((tmp_path / '_data' / 'asset_manifest.json').read_text())
+    banner = manifest['assets/banner.jpg']
+    stylesheet = manifest['styles/common.css']
+    assert (tmp_path / banner).read_bytes() == b'banner'
+    assert f"url('../{banner}')" in (tmp_path / stylesheet).read_text()
+
+    page = (tmp_path / 'case_studies' / 'page.html').read_text()
+    assert f'href="../{stylesheet}"' in page
+    assert f'<style>.intro {{ background-image: url("../{banner}"); }}</style>' in page
+    assert f"style=\"background-image: url('../{banner}');\"" in page
+    assert "url('https://images.example.com/photo.jpg')" in page
+
+
+def test_revert_points_pages_back_at_the_sources(tmp_path):
+    make_site(tmp_path)
+    original = (tmp_path / 'case_studies' / 'page.html').read_text()
+    fingerprint_assets.main(str(tmp_path))
+    fingerprint_assets.main(str(tmp_path), revert=True)
+    assert (tmp_path / 'case_studies' / 'page.html').read_text() == original
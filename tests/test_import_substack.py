@@ -0,0 +1,15 @@
+import os
+
+import feedparser
+import pytest
+
+from import_substack import clean_html
+from clean_html_reference import CLEAN_HTML_FIXTURES, clean_html_multipass
+
+FEED_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'substack_feed.xml')
+FEED_POSTS = [entry.content[0].value for entry in feedparser.parse(FEED_PATH).entries]
+
+
+@pytest.mark.parametrize('post', CLEAN_HTML_FIXTURES + FEED_POSTS)
+def test_clean_html_matches_the_multipass_reference(post):
+    assert clean_html(post) == clean_html_multipass(post)
@@ -0,0 +1,42 @@
+import os
+
+import sync_headers
+from manifest import MANIFEST_PATH, Manifest
+
+PAGE = '<html><body><div id="header-placeholder"></div><main><p>Text</p></main></body></html>\n'
+
+
+def make_site(root):
+    for name in ('good.html', 'bad.html'):
+        (root / name).write_text(PAGE, encoding='utf-8')
+    return str(root)
+
+
+def is_fresh(root_dir, name):
+    manifest = Manifest(os.path.join(root_dir, os.path.basename(MANIFEST_PATH)), root_dir)
+    return manifest.is_fresh(os.path.join(root_dir, name), 'sync_headers', sync_headers.transform_config_hash())
+
+
+def test_failed_files_are_retried_on_the_next_run(tmp_path, monkeypatch, capsys):
+    root_dir = make_site(tmp_path)
+    sync_header_in_soup = sync_headers.sync_header_in_soup
+
+    def fail_on_bad_page(soup, file_path, root_dir):
+        if file_path.endswith('bad.html'):
+            raise ValueError("broken page")
+        return sync_header_in_soup(soup, file_path, root_dir)
+
+    monkeypatch.setattr(sync_headers, 'sync_header_in_soup', fail_on_bad_page)
+    sync_headers.main(root_dir, incremental=True)
+    out = capsys.readouterr().out
+    assert "1 file(s) failed:" in out
+    assert is_fresh(root_dir, 'good.html')
+    assert not is_fresh(root_dir, 'bad.html')
+
+    monkeypatch.setattr(sync_headers, 'sync_header_in_soup', sync_header_in_soup)
+    sync_headers.main(root_dir, incremental=True)
+    out = capsys.readouterr().out
+    assert "Skipping 1 unchanged file(s)." in out
+    assert "Synced header in: bad.html" in out
+    assert '<header' in (tmp_path / 'bad.html').read_text(encoding='utf-8')
+    assert is_fresh(root_dir, 'bad.html')
@@ -0,0 +1,29 @@
+import os
+
+import minify_site
+
+
+def make_site(root):
+    (root / 'styles').mkdir(parents=True)
+    (root / 'styles' / 'common.css').write_text("body {\n    margin: 0;\n}\n" * 40)
+    (root / 'index.html').write_text("<html>\n  <body>\n    <p>\n      Hello\n    </p>\n" + "    <p>Text</p>\n" * 40
+                                      + "  </body>\n</html>\n")
+
+
+def test_default_output_is_dist_under_the_root(tmp_path):
+    make_site(tmp_path)
+    minify_site.main(str(tmp_path))
+    assert (tmp_path / '_dist' / 'index.html').read_text().startswith('<html><body><p>Hello</p>')
+    assert (tmp_path / '_dist' / 'index.html.gz').exists()
+    assert (tmp_path / '.minify_cache.json').exists()
+
+
+def test_built_site_into_separate_output(tmp_path):
+    site = tmp_path / '_site'
+    make_site(site)
+    minify_site.main(str(site), output_dir=str(tmp_path / '_dist'), compress=False)
+    assert sorted(os.listdir(tmp_path / '_dist')) == ['index.html', 'styles']
+    assert (tmp_path / '_dist' / 'styles' / 'common.css').read_text().startswith('body{margin:0')
+    # The cache stays out of the built site, which may not be writable
+    assert (tmp_path / '.minify_cache.json').exists()
+    assert sorted(os.listdir(site)) == ['index.html', 'styles']
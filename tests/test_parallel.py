@@ -0,0 +1,33 @@
+import pytest
+
+import fix_links
+import update_analytics_tag
+from parallel import run_and_report
+
+PAGE = '<html><body><a href="../index.html">Home</a></body></html>\n'
+
+
+@pytest.mark.parametrize('func, extra_args', [
+    (fix_links.fix_article_paths, ()),
+    (update_analytics_tag.update_analytics_in_file, (update_analytics_tag.MEASUREMENT_ID,)),
+])
+def test_failures_in_worker_processes_are_summarized_in_order(func, extra_args, tmp_path, capsys):
+    paths = []
+    for name in ('a.html', 'b.html', 'c.html', 'd.html'):
+        path = tmp_path / name
+        if name in ('b.html', 'd.html'):
+            # Undecodable, so reading the page raises
+            path.write_bytes(b'\xff\xfe\xfa' + PAGE.encode('utf-8'))
+        else:
+            path.write_text(PAGE, encoding='utf-8')
+        paths.append(str(path))
+
+    results = run_and_report(func, [(path,) + extra_args for path in paths], jobs=2)
+    out = capsys.readouterr().out
+
+    assert [result.path for result in results] == paths
+    assert [result.error is not None for result in results] == [False, True, False, True]
+    assert "\n2 file(s) failed:\n" in out
+    summary = out.split("2 file(s) failed:\n", 1)[1].splitlines()
+    assert [line.split(':')[0].strip() for line in summary] == [paths[1], paths[3]]
+    assert all('UnicodeDecodeError' in line for line in summary)
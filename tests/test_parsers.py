@@ -0,0 +1,105 @@
+import os
+import shutil
+
+import pytest
+
+import parsers
+import pipeline
+from parsers import AUTO, ENV_VAR, REFERENCE_BACKEND, available_backends, check_conformance, make_soup, might_match
+
+# lxml moves the <ul> on this page out of its <p>; the other page parses the same with both
+CHANGED_PAGE = 'casestudy_key_SRE.html'
+CLEAN_PAGE = 'casestudy_key_CPDtoolkit.html'
+
+needs_lxml = pytest.mark.skipif('lxml' not in available_backends(), reason="lxml is not installed")
+
+
+def make_site(tmp_path, page):
+    """A site with just the given case study page."""
+    (tmp_path / 'case_studies').mkdir()
+    shutil.copy(os.path.join(parsers.ROOT_DIR, 'case_studies', page), tmp_path / 'case_studies' / page)
+    return str(tmp_path)
+
+
+def test_default_backend_is_the_reference(monkeypatch):
+    monkeypatch.delenv(ENV_VAR, raising=False)
+    assert parsers.default_backend() == REFERENCE_BACKEND
+
+
+def test_auto_picks_a_backend_that_conforms_on_the_site(monkeypatch):
+    monkeypatch.setenv(ENV_VAR, AUTO)
+    backend = parsers.default_backend()
+    assert os.environ[ENV_VAR] == backend
+    file_paths, mismatches = check_conformance(parsers.ROOT_DIR, [backend, REFERENCE_BACKEND])
+    assert file_paths
+    assert [(os.path.relpath(path, parsers.ROOT_DIR), diff) for path, _, diff in mismatches] == []
+
+
+@needs_lxml
+def test_a_backend_that_changes_a_page_is_not_picked(tmp_path):
+    root_dir = make_site(tmp_path, CHANGED_PAGE)
+    _, mismatches = check_conformance(root_dir, ['lxml', REFERENCE_BACKEND])
+    assert len(mismatches) == 1
+    assert parsers.conforming_backend(root_dir) == REFERENCE_BACKEND
+
+
+@needs_lxml
+def test_a_conforming_backend_is_picked(tmp_path):
+    root_dir = make_site(tmp_path, CLEAN_PAGE)
+    assert check_conformance(root_dir, ['lxml', REFERENCE_BACKEND])[1] == []
+    assert parsers.conforming_backend(root_dir) == 'lxml'
+
+
+@needs_lxml
+@pytest.mark.parametrize('gap', ['\n', '\n\n  ', ' '])
+def test_lxml_keeps_the_whitespace_after_the_doctype(gap):
+    markup = f"<!DOCTYPE html>{gap}<html><head></head><body><p>Text</p></body></html>"
+    assert str(make_soup(markup, 'lxml')) == str(make_soup(markup, REFERENCE_BACKEND))
+
+
+PROBED_PASSES = [p for p in pipeline.PASSES if p.probe is not None]
+# Malformed or unusual markup, each a page some probed pass changes
+TRICKY_PAGES = [
+    '<html><head><link rel="stylesheet" href="style&#46;css"></head><body></body></html>',
+    '<html><head><LINK REL="stylesheet" HREF="../article.css"></head><body></body></html>',
+    '<html><head><title>x</title><p><link rel="stylesheet" href="style.css"></head><body></body></html>',
+    '<table><tr><td><HEADER><img class="Menu profile-pic" src="p.png"></header></td></tr></table>',
+    '<html><body><div id="header&#45;placeholder"></div></body></html>',
+    '<html><body><header/><p>Unclosed <b>bold</body></html>',
+]
+
+
+def site_pages():
+    for root, dirs, files in os.walk(parsers.ROOT_DIR):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('_', '.')) and d not in ('utility', 'tests'))
+        for name in sorted(files):
+            if name.endswith('.html'):
+                yield os.path.join(root, name)
+
+
+def probe_misses(pages):
+    """Returns the (page, pass) pairs the probe skips although the pass changes the page."""
+    root_dir = parsers.ROOT_DIR
+    misses = []
+    for path, content in pages:
+        for p in PROBED_PASSES:
+            if not might_match(content, p.probe) and p.apply(make_soup(content, REFERENCE_BACKEND), path, root_dir):
+                misses.append((os.path.relpath(path, root_dir), p.name))
+    return misses
+
+
+def test_probes_never_skip_a_page_a_pass_would_change():
+    pages = []
+    for path in site_pages():
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append((path, f.read()))
+    assert probe_misses(pages) == []
+    # The probes do skip pages, or they would be pointless
+    assert any(not might_match(content, p.probe) for _, content in pages for p in PROBED_PASSES)
+
+
+@pytest.mark.parametrize('markup', TRICKY_PAGES)
+def test_probes_match_malformed_pages_a_pass_changes(markup):
+    path = os.path.join(parsers.ROOT_DIR, 'writing', 'substack', 'tricky.html')
+    assert any(p.apply(make_soup(markup, REFERENCE_BACKEND), path, parsers.ROOT_DIR) for p in PROBED_PASSES)
+    assert probe_misses([(path, markup)]) == []
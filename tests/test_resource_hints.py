@@ -0,0 +1,73 @@
+import os
+import re
+import shutil
+
+import pytest
+from bs4 import BeautifulSoup
+
+import resource_hints
+
+CSS_RULE = re.compile(r'([^{}@]+)\{([^{}]*)\}')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+@pytest.fixture(scope='module')
+def hinted_site(tmp_path_factory):
+    """A copy of the site's pages, styles and images with the resource hints added."""
+    root = tmp_path_factory.mktemp('site')
+    source = resource_hints.ROOT_DIR
+    for name in os.listdir(source):
+        path = os.path.join(source, name)
+        if name.endswith('.html'):
+            shutil.copy(path, root / name)
+        elif name in ('assets', 'styles', 'case_studies', 'writing', '_content'):
+            shutil.copytree(path, root / name)
+    resource_hints.main(str(root))
+    return str(root)
+
+
+def dimension_rules(stylesheet):
+    """Yields (selector, {property: value}) for the rules sizing an element."""
+    with open(stylesheet, 'r', encoding='utf-8') as f:
+        css = CSS_COMMENT.sub('', f.read())
+    for selector, body in CSS_RULE.findall(css):
+        declarations = dict(part.split(':', 1) for part in body.split(';') if ':' in part)
+        dimensions = {name.strip(): value.strip() for name, value in declarations.items()
+                      if name.strip() in ('width', 'height', 'max-width', 'max-height')}
+        if dimensions:
+            yield selector.strip(), dimensions
+
+
+def stamped_images():
+    """Yields (page, img) for the images resource_hints.py gives a width and height."""
+    root = resource_hints.ROOT_DIR
+    for path in resource_hints.find_pages(root):
+        with open(path, 'r', encoding='utf-8') as f:
+            soup = BeautifulSoup(f.read(), 'html.parser')
+        for img in soup.find_all('img'):
+            if 'width' not in img.attrs and 'height' not in img.attrs:
+                yield os.path.relpath(path, root), img
+
+
+def test_stamped_sizes_do_not_stretch_images(hinted_site):
+    stretched = []
+    checked = 0
+    for page in sorted({page for page, _ in stamped_images()}):
+        with open(os.path.join(hinted_site, page), 'r', encoding='utf-8') as f:
+            soup = BeautifulSoup(f.read(), 'html.parser')
+        stylesheets = [os.path.normpath(os.path.join(hinted_site, os.path.dirname(page), link['href']))
+                       for link in soup.find_all('link', href=True)
+                       if 'stylesheet' in link.get('rel', []) and '://' not in link['href']]
+        for img in soup.find_all('img', width=True, height=True):
+            checked += 1
+            css = {}
+            for stylesheet in filter(os.path.exists, stylesheets):
+                for selector, dimensions in dimension_rules(stylesheet):
+                    if img in soup.select(selector):
+                        css.update(dimensions)
+            # A size set in CSS needs the other dimension set to auto, or the attribute wins
+            for fixed, other in (('width', 'height'), ('max-width', 'height'), ('height', 'width'), ('max-height', 'width')):
+                if css.get(fixed, 'auto') not in ('auto', 'none') and css.get(other) != 'auto':
+                    stretched.append(f"{page}: {img.get('src')} ({fixed}: {css[fixed]})")
+    assert checked
+    assert stretched == []
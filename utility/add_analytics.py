@@ -1,6 +1,30 @@
 import os
+import argparse
 
-def update_gtag_id_in_file(file_path, old_id, new_id):
+from parallel import add_jobs_argument, run_and_report
+from update_analytics_tag import defer_analytics_in_text
+from instrument import add_report_argument, record_error, set_report
+from site_io import add_write_mode_arguments, set_write_mode, write_if_changed
+
+# The placeholder left in older pages and the GTag ID that replaces it.
+OLD_GTAG_ID = 'G-YOUR_MEASUREMENT_ID'
+NEW_GTAG_ID = 'GTM-K2TRN682'
+
+def update_gtag_id_in_text(content, old_id, new_id):
+    """
+    Returns the content with the old Google Tag ID replaced by the new one.
+
+    Args:
+        content (str): The HTML content.
+        old_id (str): The placeholder or old GTag ID to be replaced.
+        new_id (str): The new GTag ID.
+    """
+    # If the old ID isn't there, no action is needed for this content.
+    if old_id not in content:
+        return content
+    return content.replace(old_id, new_id)
+
+def update_gtag_id_in_file(file_path, old_id, new_id, defer=False):
     """
     Replaces the old Google Tag ID with the new one in a given file.
 
@@ -8,29 +32,32 @@ def update_gtag_id_in_file(file_path, old_id, new_id):
         file_path (str): The path to the HTML file.
         old_id (str): The placeholder or old GTag ID to be replaced.
         new_id (str): The new GTag ID.
+        defer (bool): Also switch the page to loading gtag.js after the page
+            has loaded, keeping a single config call.
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
             content = file.read()
 
-        # Check if the old ID exists and if the new ID is already present
-        if old_id not in content:
-            # If the old ID isn't there, no action is needed for this file.
+        new_content = update_gtag_id_in_text(content, old_id, new_id)
+        if defer:
+            new_content = defer_analytics_in_text(new_content)
+        if not write_if_changed(file_path, new_content):
             # We can print a message for verbosity or just skip it silently.
             # print(f"ID '{old_id}' not found in {file_path}. Skipping.")
             return
 
-        new_content = content.replace(old_id, new_id)
-
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(new_content)
-        
-        print(f"Successfully updated GTag ID in {file_path} to '{new_id}'.")
+        if old_id in content:
+            print(f"Successfully updated GTag ID in {file_path} to '{new_id}'.")
+        if defer:
+            print(f"Deferred gtag.js loading in {file_path}.")
 
     except Exception as e:
         print(f"An error occurred while processing {file_path}: {e}")
+        record_error(e)
+        raise
 
-def update_all_html_files(directory, old_id, new_id):
+def update_all_html_files(directory, old_id, new_id, jobs=1, defer=False):
     """
     Walks through a directory and updates the GTag ID in all HTML files.
 
@@ -38,24 +65,33 @@ def update_all_html_files(directory, old_id, new_id):
         directory (str): The root directory to search for HTML files.
         old_id (str): The placeholder or old GTag ID to be replaced.
         new_id (str): The new GTag ID.
+        jobs (int): Number of worker processes to use.
+        defer (bool): Also switch the pages to loading gtag.js after the page.
     """
     if not os.path.isdir(directory):
         print(f"Error: Directory '{directory}' not found.")
         return
 
     print(f"Scanning for HTML files in '{directory}'...")
-    for root, _, files in os.walk(directory):
-        for filename in files:
+    file_paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
             if filename.endswith('.html'):
-                file_path = os.path.join(root, filename)
-                update_gtag_id_in_file(file_path, old_id, new_id)
+                file_paths.append(os.path.join(root, filename))
+    run_and_report(update_gtag_id_in_file, [(path, old_id, new_id, defer) for path in file_paths], jobs)
     print("...Scan complete.")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replace the GTag ID in all HTML files.")
     # The root directory of your portfolio project.
-    portfolio_directory = '/Users/harryhunter/Documents/my-portfolio'
-    old_gtag_id = 'G-YOUR_MEASUREMENT_ID'
-    new_gtag_id = 'GTM-K2TRN682'
-    
-    update_all_html_files(portfolio_directory, old_gtag_id, new_gtag_id)
+    parser.add_argument('--root', default='/Users/harryhunter/Documents/my-portfolio', help="Root directory of the site.")
+    parser.add_argument('--defer', action='store_true', help="Also load gtag.js after the page instead of from <head>.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    update_all_html_files(args.root, OLD_GTAG_ID, NEW_GTAG_ID, args.jobs, args.defer)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+The article catalog that the lists on writing.html are rendered from.
+
+Every listed article is one entry in _data/articles.json:
+
+    {"section": "newsletter", "title": "...", "date": "2025-10-03",
+     "path": "writing/substack/2025-10-03_on-paternity-leave.html",
+     "summary": "...", "source_url": "https://harryhunter.substack.com/p/..."}
+
+Each <ul data-list="SECTION"> on the page holds the entries of that section,
+ordered by date as configured in LISTS. Entries are kept sorted per section,
+so adding one is a binary search, and they are deduplicated by source URL
+(or by path for articles without one), so importing a post twice updates
+its entry instead of listing it again. Rendering rewrites only the contents
+of those lists in one streaming pass over the page.
+
+Usage:
+    python utility/article_catalog.py --init  # seed the catalog from writing.html
+    python utility/article_catalog.py         # re-render writing.html from the catalog
+"""
+import os
+import html
+import json
+import bisect
+import argparse
+from datetime import datetime
+
+from parsers import make_soup
+from stream_rewrite import START_TAG, END_TAG, iter_tokens, iter_attributes
+from site_io import add_write_mode_arguments, set_write_mode, write_if_changed
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CATALOG_PATH = os.path.join(ROOT_DIR, '_data', 'articles.json')
+WRITING_PAGE_PATH = os.path.join(ROOT_DIR, 'writing.html')
+LIST_ATTRIBUTE = 'data-list'
+# Section -> (order, item style). 'inline' items are "Title: summary",
+# 'block' items put the summary in its own paragraph.
+LISTS = {
+    'newsletter': ('newest', 'inline'),
+    'continuum': ('newest', 'block'),
+    'week-notes-s0': ('oldest', 'block'),
+    'week-notes-s1': ('oldest', 'block'),
+    'week-notes-s2': ('oldest', 'block'),
+    'travel-notes': ('oldest', 'block'),
+}
+DEFAULT_LIST = ('newest', 'block')
+# --- End Configuration ---
+
+
+def _sort_key(entry):
+    return (entry.get('date', ''), entry['path'])
+
+
+def entry_key(entry):
+    """The key entries are deduplicated by."""
+    return entry.get('source_url') or entry['path']
+
+
+def date_from_path(path):
+    """Returns the YYYY-MM-DD prefix of an article's file name, or ''."""
+    prefix = os.path.basename(path)[:10]
+    try:
+        datetime.strptime(prefix, '%Y-%m-%d')
+    except ValueError:
+        return ''
+    return prefix
+
+
+class Catalog:
+    """
+    The catalog on disk, held as one date-sorted list per section.
+    """
+
+    def __init__(self, path=CATALOG_PATH, entries=None):
+        """Loads the catalog at path, or starts one from the given entries."""
+        self.path = path
+        self.sections = {}
+        self.keys = {}
+        if entries is None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f).get('articles', [])
+        for entry in entries or []:
+            self.add(entry)
+        self.changed = False
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, entry):
+        """
+        Adds an entry, replacing any entry with the same key.
+        Returns False if an identical entry was already there.
+        """
+        key = entry_key(entry)
+        old = self.keys.get(key)
+        if old == entry:
+            return False
+        if old is not None:
+            self._remove(old)
+        bisect.insort(self.sections.setdefault(entry['section'], []), entry, key=_sort_key)
+        self.keys[key] = entry
+        self.changed = True
+        return True
+
+    def _remove(self, entry):
+        entries = self.sections[entry['section']]
+        index = bisect.bisect_left(entries, _sort_key(entry), key=_sort_key)
+        while entries[index] is not entry:
+            index += 1
+        del entries[index]
+
+    def entries(self, section):
+        """The entries of a section in the order they are listed."""
+        entries = self.sections.get(section, [])
+        order, _ = LISTS.get(section, DEFAULT_LIST)
+        return entries[::-1] if order == 'newest' else list(entries)
+
+    def save(self):
+        articles = [entry for section in sorted(self.sections) for entry in self.sections[section]]
+        write_if_changed(self.path, json.dumps({'articles': articles}, indent=1, sort_keys=True, ensure_ascii=False) + '\n')
+        self.changed = False
+
+
+def render_items(entries, style, indent, prefix=''):
+    """
+    Returns the <li> markup for entries, laid out like prettify() would at
+    the given indentation.
+    """
+    lines = []
+    for entry in entries:
+        href = html.escape(prefix + entry['path'])
+        title = html.escape(entry['title'], quote=False)
+        summary = html.escape(entry.get('summary') or '', quote=False)
+        lines.append(f'{indent}<li class="article-item">')
+        if style == 'inline':
+            lines += [f'{indent} <a href="{href}">', f'{indent}  {title}', f'{indent} </a>']
+            if summary:
+                lines.append(f'{indent} : {summary}')
+        else:
+            lines += [f'{indent} <strong>', f'{indent}  <a href="{href}">', f'{indent}   {title}',
+                      f'{indent}  </a>', f'{indent} </strong>']
+            if summary:
+                lines += [f'{indent} <p>', f'{indent}  {summary}', f'{indent} </p>']
+        lines.append(f'{indent}</li>')
+    return ''.join(line + '\n' for line in lines)
+
+
+def render_listings(markup, catalog, prefix=''):
+    """
+    Replaces the contents of every <ul data-list="SECTION"> in the markup with
+    the section's entries. Everything else is passed through untouched.
+    """
+    out = []
+    last = 0
+    offset = 0
+    section = None
+    depth = 0
+    for kind, raw, name in iter_tokens([markup]):
+        if name == 'ul' and kind == START_TAG:
+            if section is not None:
+                depth += 1
+            else:
+                attrs = {attr: value for attr, value, _, _ in iter_attributes(raw)}
+                if attrs.get(LIST_ATTRIBUTE):
+                    section = attrs[LIST_ATTRIBUTE]
+                    line_start = markup.rfind('\n', 0, offset) + 1
+                    indent = markup[line_start:offset] if not markup[line_start:offset].strip() else ''
+                    out.append(markup[last:offset + len(raw)])
+        elif name == 'ul' and kind == END_TAG and section is not None:
+            if depth:
+                depth -= 1
+            else:
+                _, style = LISTS.get(section, DEFAULT_LIST)
+                out.append('\n' + render_items(catalog.entries(section), style, indent + ' ', prefix) + indent)
+                last = offset
+                section = None
+        offset += len(raw)
+    out.append(markup[last:])
+    return ''.join(out)
+
+
+def update_page(page_path, catalog):
+    """
+    Re-renders the lists of a page (or a page source) from the catalog.
+    Returns True if the file changed.
+    """
+    with open(page_path, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+    return write_if_changed(page_path, render_listings(content, catalog))
+
+
+def _source_url(article_path):
+    """
+    Returns the "Originally published on" link of an article page, or None.
+    """
+    if not os.path.exists(article_path):
+        return None
+    with open(article_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    in_published = False
+    for kind, raw, name in iter_tokens([content]):
+        if kind != START_TAG:
+            continue
+        attrs = {attr: value for attr, value, _, _ in iter_attributes(raw)}
+        if name == 'p' and 'originally-published' in (attrs.get('class') or '').split():
+            in_published = True
+        elif name == 'a' and in_published and attrs.get('href'):
+            return html.unescape(attrs['href'])
+    return None
+
+
+def seed_from_page(page_path, catalog_path=CATALOG_PATH, root_dir=ROOT_DIR):
+    """
+    Builds a catalog from the items currently in a page's lists.
+    """
+    entries = []
+    with open(page_path, 'r', encoding='utf-8') as f:
+        soup = make_soup(f)
+    for article_list in soup.find_all('ul', attrs={LIST_ATTRIBUTE: True}):
+        for item in article_list.find_all('li', recursive=False):
+            link = item.find('a', href=True)
+            if link is None:
+                continue
+            summary = item.find('p')
+            if summary is not None:
+                summary = summary.get_text()
+            else:
+                # Inline items: "<a>Title</a>: summary"
+                summary = ''.join(item.find_all(string=True, recursive=False)).strip().lstrip(':')
+            path = link['href']
+            entry = {
+                'section': article_list[LIST_ATTRIBUTE],
+                'title': ' '.join(link.get_text().split()),
+                'date': date_from_path(path),
+                'path': path,
+                'summary': ' '.join(summary.split()),
+            }
+            source_url = _source_url(os.path.join(root_dir, path))
+            if source_url:
+                entry['source_url'] = source_url
+            entries.append(entry)
+    return Catalog(catalog_path, entries)
+
+
+def main(root_dir=ROOT_DIR, init=False):
+    catalog_path = os.path.join(root_dir, os.path.relpath(CATALOG_PATH, ROOT_DIR))
+    page_path = os.path.join(root_dir, os.path.relpath(WRITING_PAGE_PATH, ROOT_DIR))
+    if init:
+        catalog = seed_from_page(page_path, catalog_path, root_dir)
+        catalog.save()
+        print(f"Wrote {len(catalog)} article(s) to {os.path.relpath(catalog_path, root_dir)}.")
+        return
+    catalog = Catalog(catalog_path)
+    if update_page(page_path, catalog):
+        print(f"Rendered {len(catalog)} article(s) into {os.path.relpath(page_path, root_dir)}.")
+    else:
+        print(f"{os.path.relpath(page_path, root_dir)} is up to date.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render writing.html's article lists from the catalog.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    parser.add_argument('--init', action='store_true', help="Seed the catalog from the lists in writing.html.")
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    main(os.path.abspath(args.root), args.init)
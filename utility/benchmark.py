@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the site maintenance utilities on synthetic corpora.
+
+A corpus of N pages is generated from the real templates
+(writing/_substack_template.html and case_studies/case_study_template.html).
+For each utility the per-file function is timed over every page, and the
+utility's full main() walk is timed over a fresh copy of the corpus. Each
+measurement runs in its own process so peak RSS is reported per benchmark.
+The clean_html and clean_html_multipass benchmarks time the Substack
+cleaner against its original multipass version (clean_html_reference.py)
+on the same synthetic posts.
+
+Results are written as JSON so runs on different commits can be compared:
+
+    python utility/benchmark.py --sizes 100,1000 --output bench.json
+    python utility/benchmark.py --sizes 100,1000 --compare bench.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from contextlib import redirect_stdout
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SUBSTACK_TEMPLATE_PATH = os.path.join(ROOT_DIR, 'writing', '_substack_template.html')
+CASE_STUDY_TEMPLATE_PATH = os.path.join(ROOT_DIR, 'case_studies', 'case_study_template.html')
+DEFAULT_SIZES = [100, 1000, 10000]
+# Share of the corpus that are writing/ articles; the rest are case studies.
+ARTICLE_SHARE = 0.7
+# Every Nth page carries an old stylesheet link / relative path so the
+# updaters have real work to do rather than only checking.
+STALE_EVERY = 5
+WRITING_SECTIONS = ['substack', 'thoughtleadership', 'travel_notes', 'week_notes']
+# --- End Configuration ---
+
+
+def _article_body(index, stale):
+    """
+    A synthetic Substack article body, a few paragraphs with links and an image.
+    """
+    prefix = '../' if stale else '../../'
+    paragraphs = []
+    for n in range(12):
+        paragraphs.append(
+            f'<p>Paragraph {n} of article {index}. Lorem ipsum dolor sit amet, consectetur '
+            f'adipiscing elit, <em>sed do eiusmod</em> tempor incididunt ut labore et dolore magna '
+            f'aliqua. See <a href="{prefix}writing.html">the writing page</a> for more.</p>')
+    paragraphs.insert(4, f'<figure><img alt="Figure {index}" src="{prefix}assets/horizon1.png"/></figure>')
+    return '\n'.join(paragraphs)
+
+
+def _substack_post(index):
+    """
+    A synthetic Substack RSS entry body for benchmarking clean_html().
+    """
+    return (
+        '<div class="subscription-widget-wrap"><div class="subscribe-widget">Subscribe</div></div>'
+        + f'<div class="captioned-image-container"><figure><a class="image-link" href="https://substack.com/img/{index}">'
+          f'<div class="image2-inset"><picture><source type="image/webp" srcset="https://substack.com/img/{index}.webp"/>'
+          f'<img src="https://substack.com/img/{index}.png" alt="img" width="1200" height="800" class="sizing-normal" loading="lazy"/>'
+          '</picture></div></a></figure></div>'
+        + ''.join(f'<p style="x">Post {index} paragraph {n} with <span>inline</span> <a href="https://example.com/{n}">link</a>.</p><p></p>'
+                  for n in range(15)))
+
+
+def build_corpus(root_dir, size):
+    """
+    Writes a synthetic site with `size` pages under root_dir.
+    """
+    with open(SUBSTACK_TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+        article_template = f.read()
+    with open(CASE_STUDY_TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+        case_study_template = f.read()
+
+    # bundle_css reads the real stylesheets
+    shutil.copytree(os.path.join(ROOT_DIR, 'styles'), os.path.join(root_dir, 'styles'), dirs_exist_ok=True)
+    for section in WRITING_SECTIONS:
+        os.makedirs(os.path.join(root_dir, 'writing', section), exist_ok=True)
+    os.makedirs(os.path.join(root_dir, 'case_studies'), exist_ok=True)
+
+    article_count = int(size * ARTICLE_SHARE)
+    for index in range(size):
+        stale = index % STALE_EVERY == 0
+        if index < article_count:
+            content = article_template.replace('{{ARTICLE_TITLE}}', f'Article {index}')
+            content = content.replace('{{SUBSTACK_URL}}', f'https://example.substack.com/p/article-{index}')
+            content = content.replace('{{PUBLISH_DATE}}', 'January 01, 2025')
+            content = content.replace('{{ARTICLE_BODY}}', _article_body(index, stale))
+            if stale:
+                content = content.replace('../../styles/writing_articles.css', '../article.css')
+            section = WRITING_SECTIONS[index % len(WRITING_SECTIONS)]
+            path = os.path.join(root_dir, 'writing', section, f'article-{index:05d}.html')
+        else:
+            content = case_study_template
+            if stale:
+                content = content.replace('../styles/case_studies_articles.css', '../style.css')
+            path = os.path.join(root_dir, 'case_studies', f'casestudy-{index:05d}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def _html_files(root_dir, subdir=None, nested_only=False):
+    base = os.path.join(root_dir, subdir) if subdir else root_dir
+    paths = []
+    for root, dirs, files in os.walk(base):
+        dirs.sort()
+        if nested_only and root == base:
+            continue
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.html'))
+    return paths
+
+
+def _bundle_args(bundle_css, root_dir):
+    with redirect_stdout(io.StringIO()):
+        bundles = bundle_css.build_bundles(root_dir)
+    return [(p, root_dir, bundles) for p in bundle_css.find_html_files(root_dir)]
+
+
+# Each benchmark: (per-file function, list of argument tuples, main walk).
+# They are built lazily inside the child process so imports are measured too.
+def _benchmarks(root_dir):
+    import sync_headers
+    import update_article_css
+    import update_casestudy_css
+    import fix_links
+    import add_analytics
+    import update_analytics_tag
+    import bundle_css
+    import import_substack
+    import clean_html_reference
+    import pipeline
+
+    case_studies_dir = os.path.join(root_dir, 'case_studies')
+    writing_dir = os.path.join(root_dir, 'writing')
+    return {
+        'sync_headers': (
+            sync_headers.sync_header_in_file,
+            lambda: [(p, root_dir) for p in _html_files(root_dir)],
+            lambda: sync_headers.main(root_dir)),
+        'update_article_css': (
+            update_article_css.update_article_html,
+            lambda: [(p, root_dir) for p in _html_files(root_dir, 'writing')],
+            lambda: update_article_css.main(portfolio_root=root_dir)),
+        'update_casestudy_css': (
+            update_casestudy_css.update_casestudy_html,
+            lambda: [(p, root_dir) for p in _html_files(root_dir, 'case_studies')],
+            lambda: update_casestudy_css.main(case_studies_dir)),
+        'fix_links': (
+            fix_links.fix_article_paths,
+            lambda: [(p,) for p in _html_files(root_dir, 'writing', nested_only=True)],
+            lambda: fix_links.main(writing_dir=writing_dir)),
+        'add_analytics': (
+            add_analytics.update_gtag_id_in_file,
+            lambda: [(p, add_analytics.OLD_GTAG_ID, add_analytics.NEW_GTAG_ID) for p in _html_files(root_dir)],
+            lambda: add_analytics.update_all_html_files(root_dir, add_analytics.OLD_GTAG_ID, add_analytics.NEW_GTAG_ID)),
+        'update_analytics_tag': (
+            update_analytics_tag.update_analytics_in_file,
+            lambda: [(p, update_analytics_tag.MEASUREMENT_ID) for p in _html_files(root_dir)],
+            lambda: update_analytics_tag.main(root_dir)),
+        'bundle_css': (
+            bundle_css.bundle_page,
+            lambda: _bundle_args(bundle_css, root_dir),
+            lambda: bundle_css.main(root_dir)),
+        'clean_html': (
+            import_substack.clean_html,
+            lambda: [(_substack_post(i),) for i in range(len(_html_files(root_dir, 'writing')))],
+            None),
+        'clean_html_multipass': (
+            clean_html_reference.clean_html_multipass,
+            lambda: [(_substack_post(i),) for i in range(len(_html_files(root_dir, 'writing')))],
+            None),
+        'pipeline': (
+            pipeline.process_file,
+            lambda: [(p, root_dir, pipeline.PASSES) for p in _html_files(root_dir)],
+            lambda: pipeline.run(root_dir, pipeline.PASSES)),
+    }
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _run_benchmark(utility, mode, root_dir, queue):
+    """
+    Child process entry point: runs one benchmark and puts the result on the queue.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    func, make_args, run_main = _benchmarks(root_dir)[utility]
+    sink = io.StringIO()
+    latencies = []
+
+    if mode == 'per_file':
+        arg_tuples = make_args()
+        started = time.perf_counter()
+        with redirect_stdout(sink):
+            for args in arg_tuples:
+                call_started = time.perf_counter()
+                func(*args)
+                latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+        files = len(arg_tuples)
+    else:
+        files = len(make_args())
+        started = time.perf_counter()
+        with redirect_stdout(sink):
+            run_main()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    queue.put({
+        'utility': utility,
+        'mode': mode,
+        'files': files,
+        'seconds': round(elapsed, 6),
+        'files_per_sec': round(files / elapsed, 2) if elapsed else None,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 4) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 4) if latencies else None,
+        'peak_rss_kb': _peak_rss_kb(),
+    })
+
+
+def run_one(utility, mode, corpus_dir, work_dir):
+    """
+    Runs a benchmark in a child process on a fresh copy of the corpus.
+    """
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
+    shutil.copytree(corpus_dir, work_dir)
+
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_benchmark, args=(utility, mode, work_dir, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, baseline=None):
+    baseline_index = {(r['utility'], r['mode'], r['pages']): r for r in (baseline or [])}
+    header = f"{'utility':<22}{'mode':<10}{'pages':>7}{'files/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'rss MB':>8}"
+    if baseline:
+        header += f"{'vs base':>9}"
+    print(header)
+    for r in results:
+        p50 = f"{r['p50_ms']:.2f}" if r['p50_ms'] is not None else '-'
+        p99 = f"{r['p99_ms']:.2f}" if r['p99_ms'] is not None else '-'
+        rss = f"{r['peak_rss_kb'] / 1024:.0f}" if r['peak_rss_kb'] else '-'
+        line = f"{r['utility']:<22}{r['mode']:<10}{r['pages']:>7}{r['files_per_sec'] or 0:>11.1f}{p50:>9}{p99:>9}{rss:>8}"
+        base = baseline_index.get((r['utility'], r['mode'], r['pages']))
+        if baseline:
+            if base and base['seconds'] and r['seconds']:
+                line += f"{base['seconds'] / r['seconds']:>8.2f}x"
+            else:
+                line += f"{'-':>9}"
+        print(line)
+
+
+def main():
+    utilities = ['sync_headers', 'update_article_css', 'update_casestudy_css', 'fix_links',
+                 'add_analytics', 'update_analytics_tag', 'bundle_css', 'clean_html', 'clean_html_multipass', 'pipeline']
+
+    parser = argparse.ArgumentParser(description="Benchmark the site maintenance utilities.")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma separated corpus sizes in pages (default: %(default)s).")
+    parser.add_argument('--utilities', default=','.join(utilities),
+                        help="Comma separated utilities to benchmark (default: all).")
+    parser.add_argument('--modes', default='per_file,main', help="per_file, main or both (default: both).")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    parser.add_argument('--compare', help="A previous JSON results file to compare against.")
+    args = parser.parse_args()
+
+    selected = args.utilities.split(',')
+    unknown = [u for u in selected if u not in utilities]
+    if unknown:
+        print(f"Error: unknown utilities: {', '.join(unknown)}")
+        sys.exit(1)
+    sizes = [int(s) for s in args.sizes.split(',')]
+    modes = args.modes.split(',')
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='site-bench-') as tmp_dir:
+        for size in sizes:
+            corpus_dir = os.path.join(tmp_dir, f'corpus-{size}')
+            print(f"Building {size} page corpus...")
+            build_corpus(corpus_dir, size)
+            for utility in selected:
+                for mode in modes:
+                    if mode == 'main' and utility.startswith('clean_html'):
+                        continue
+                    result = run_one(utility, mode, corpus_dir, os.path.join(tmp_dir, 'work'))
+                    result['pages'] = size
+                    results.append(result)
+                    print(f"  {utility} [{mode}]: {result['files_per_sec']} files/s")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    print()
+    print_table(results, baseline)
+
+    if args.output:
+        report = {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+The dependency graph behind incremental builds of build_site.py.
+
+For every generated page the graph records the hash of each input it was
+rendered from (the layout, the header menu, the head configuration, its own
+source and, for pages with article lists such as writing.html, the catalog)
+and the hash of the output that was written. A rebuild compares the current
+input hashes against the recorded ones, so the dirty set is exactly the
+pages with a changed input plus pages whose output went missing or was
+edited by hand.
+
+Source file hashes are cached by size and mtime like the manifest, so
+planning a no-op rebuild doesn't read every source.
+"""
+import os
+import json
+
+from manifest import file_hash
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GRAPH_PATH = os.path.join(ROOT_DIR, '.build_graph.json')
+# Plan lines printed per group of pages dirty for the same reasons
+PLAN_EXAMPLES = 5
+# --- End Configuration ---
+
+
+class DependencyGraph:
+    """
+    The on-disk graph: outputs (relative paths) -> {input id: hash}.
+    """
+
+    def __init__(self, path=GRAPH_PATH, root_dir=ROOT_DIR):
+        self.path = path
+        self.root_dir = root_dir
+        self.outputs = {}
+        self.files = {}
+        self.derived = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.outputs = data.get('outputs', {})
+                self.files = data.get('files', {})
+                self.derived = data.get('derived', {})
+            except (ValueError, OSError) as e:
+                print(f"Ignoring unreadable build graph {path}: {e}")
+
+    def file_hash(self, file_path):
+        """
+        Returns the content hash of a file, reusing the stored hash when the
+        size and mtime are unchanged.
+        """
+        key = os.path.relpath(file_path, self.root_dir).replace('\\', '/')
+        stat = os.stat(file_path)
+        cached = self.files.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = file_hash(file_path)
+        self.files[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def derive(self, digest, func):
+        """
+        Returns func() memoized under a file content hash, for values such as
+        front matter that only change when the file does.
+        """
+        if digest not in self.derived:
+            self.derived[digest] = func()
+        return self.derived[digest]
+
+    def dirty_reasons(self, output_rel, inputs):
+        """
+        Returns why an output needs rebuilding: the ids of the inputs that
+        changed since it was built, or a note about the output itself.
+        An empty list means the output is up to date.
+        """
+        entry = self.outputs.get(output_rel)
+        if entry is None:
+            return ['new']
+        output_path = os.path.join(self.root_dir, output_rel)
+        if not os.path.exists(output_path):
+            return ['output missing']
+        reasons = sorted(input_id for input_id, digest in inputs.items() if entry['inputs'].get(input_id) != digest)
+        reasons += sorted(f"{input_id} removed" for input_id in entry['inputs'] if input_id not in inputs)
+        if not reasons and self.file_hash(output_path) != entry['output']:
+            reasons.append('output edited')
+        return reasons
+
+    def record(self, output_rel, inputs):
+        """
+        Records that output_rel, as it is now on disk, was built from inputs.
+        """
+        self.outputs[output_rel] = {
+            'inputs': dict(inputs),
+            'output': self.file_hash(os.path.join(self.root_dir, output_rel)),
+        }
+
+    def save(self):
+        self.files = {key: value for key, value in self.files.items()
+                      if os.path.exists(os.path.join(self.root_dir, key))}
+        live = {entry[2] for entry in self.files.values()}
+        self.derived = {digest: value for digest, value in self.derived.items() if digest in live}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'outputs': self.outputs, 'files': self.files, 'derived': self.derived}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def print_plan(plan, total):
+    """
+    Prints the rebuild plan, a dict of output -> reasons, grouped by reasons.
+    """
+    print(f"Rebuild plan: {len(plan)} of {total} page(s) dirty.")
+    groups = {}
+    for output_rel, reasons in sorted(plan.items()):
+        groups.setdefault(', '.join(reasons), []).append(output_rel)
+    for reasons, outputs in sorted(groups.items(), key=lambda item: -len(item[1])):
+        print(f"  {len(outputs)} page(s) <- {reasons}")
+        for output_rel in outputs[:PLAN_EXAMPLES]:
+            print(f"      {output_rel}")
+        if len(outputs) > PLAN_EXAMPLES:
+            print(f"      ... and {len(outputs) - PLAN_EXAMPLES} more")
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Builds the static full-text search index used by search.js.
+
+The text of each article under writing/ and case_studies/ (the <main>
+element, without scripts and styles) is tokenized into lower-case words and
+turned into an inverted index, written to assets/search/:
+
+    index.json      the documents ([path, title, summary] by id), the
+                    tokenizer settings and a version per shard
+    shard-a.json    {term: postings} for the terms starting with "a", ...
+
+Postings are flat lists of [doc id gap, term frequency, ...] pairs: doc ids
+are delta-encoded, so they stay small numbers that compress well when the
+JSON is served gzipped. The browser only fetches index.json once the search
+box is used, and then only the shards for the query's terms.
+
+Builds are incremental: each page's extracted terms are cached by content
+hash in .search_cache.json, so only new or changed pages are parsed again.
+A shard is only rewritten when its contents change.
+
+Usage:
+    python utility/build_search_index.py [--jobs N]
+"""
+import os
+import re
+import glob
+import json
+import argparse
+import unicodedata
+from collections import Counter
+
+from parsers import make_soup
+from manifest import content_hash, file_hash
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, set_report
+from site_io import add_write_mode_arguments, is_dry_run, remove_file, set_write_mode, write_if_changed
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+INDEX_DIR = os.path.join(ROOT_DIR, 'assets', 'search')
+CACHE_PATH = os.path.join(ROOT_DIR, '.search_cache.json')
+PAGE_PATTERNS = ['writing/*/*.html', 'case_studies/*.html']
+SUMMARY_LENGTH = 160
+MIN_TERM_LENGTH = 2
+STOP_WORDS = {
+    'a', 'about', 'after', 'all', 'also', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'been', 'but',
+    'by', 'can', 'could', 'did', 'do', 'for', 'from', 'had', 'has', 'have', 'he', 'her', 'his', 'how',
+    'if', 'in', 'into', 'is', 'it', 'its', 'just', 'me', 'more', 'my', 'no', 'not', 'of', 'on', 'one',
+    'or', 'our', 'out', 'so', 'some', 'than', 'that', 'the', 'their', 'them', 'then', 'there', 'these',
+    'they', 'this', 'to', 'up', 'us', 'was', 'we', 'were', 'what', 'when', 'which', 'who', 'will',
+    'with', 'would', 'you', 'your',
+}
+# --- End Configuration ---
+
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """
+    Returns the indexable terms of a text, in order. search.js applies the
+    same rules to queries: lower case, accents stripped, runs of [a-z0-9].
+    """
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(c))
+    return [term for term in WORD.findall(text) if len(term) >= MIN_TERM_LENGTH and term not in STOP_WORDS]
+
+
+def shard_for(term):
+    """The shard a term lives in: its first letter, or '0' for digits."""
+    return term[0] if term[0].isalpha() else '0'
+
+
+def extract_document(soup):
+    """
+    Returns (title, summary, text) for a parsed page.
+    """
+    main = soup.find('main') or soup.body or soup
+    for element in main.find_all(['script', 'style', 'noscript']):
+        element.decompose()
+    heading = main.find(class_='page-title') or main.find(['h1', 'h2'])
+    title = heading.get_text() if heading else (soup.title.get_text() if soup.title else '')
+    text = ' '.join(main.get_text(' ').split())
+
+    description = soup.find('meta', attrs={'name': 'description'})
+    summary = description.get('content', '') if description else ''
+    if not summary:
+        # The first paragraph that isn't the "Originally published on" note
+        for paragraph in main.find_all('p'):
+            if 'originally-published' not in (paragraph.get('class') or []) and paragraph.get_text(strip=True):
+                summary = paragraph.get_text(' ')
+                break
+    summary = ' '.join(summary.split())
+    if len(summary) > SUMMARY_LENGTH:
+        summary = summary[:SUMMARY_LENGTH].rsplit(' ', 1)[0] + '…'
+    return ' '.join(title.split()), summary, text
+
+
+def index_page(file_path, digest):
+    """
+    Worker entry point: extracts one page. Returns its cache entry.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        soup = make_soup(f)
+    title, summary, text = extract_document(soup)
+    # Title words count extra, so a match in the title ranks first
+    terms = Counter(tokenize(text)) + Counter(tokenize(title) * 2)
+    return {'hash': digest, 'title': title, 'summary': summary, 'terms': dict(sorted(terms.items()))}
+
+
+def find_pages(root_dir):
+    """Returns the indexed pages relative to root_dir, skipping page templates."""
+    pages = set()
+    for pattern in PAGE_PATTERNS:
+        for path in glob.glob(os.path.join(root_dir, pattern)):
+            name = os.path.basename(path)
+            if 'template' not in name and not name.startswith('_'):
+                pages.add(os.path.relpath(path, root_dir).replace('\\', '/'))
+    return sorted(pages)
+
+
+def build_shards(documents):
+    """
+    Builds the inverted index for documents, a list of (path, cache entry)
+    whose positions are the doc ids. Returns {shard: {term: postings}}.
+    """
+    postings = {}
+    for doc_id, (_, entry) in enumerate(documents):
+        for term, count in entry['terms'].items():
+            postings.setdefault(term, []).append((doc_id, count))
+
+    shards = {}
+    for term in sorted(postings):
+        encoded = []
+        previous = 0
+        for doc_id, count in postings[term]:
+            encoded += [doc_id - previous, count]
+            previous = doc_id
+        shards.setdefault(shard_for(term), {})[term] = encoded
+    return shards
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+def load_cache(cache_path):
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable search cache {cache_path}: {e}")
+    return {}
+
+
+def build(root_dir=ROOT_DIR, jobs=1):
+    """
+    Brings the index in root_dir up to date. Returns the number of files written.
+    """
+    index_dir = os.path.join(root_dir, os.path.relpath(INDEX_DIR, ROOT_DIR))
+    cache_path = os.path.join(root_dir, os.path.basename(CACHE_PATH))
+    cache = load_cache(cache_path)
+    # Tokenizer changes invalidate every cached entry
+    settings = {'min_length': MIN_TERM_LENGTH, 'stop_words': sorted(STOP_WORDS)}
+    if cache.get('settings') != content_hash(_dumps(settings)):
+        cache = {}
+    pages = cache.get('pages', {})
+
+    rel_paths = find_pages(root_dir)
+    digests = {rel: file_hash(os.path.join(root_dir, rel)) for rel in rel_paths}
+    stale = [rel for rel in rel_paths if pages.get(rel, {}).get('hash') != digests[rel]]
+    print(f"Indexing {len(stale)} new or changed page(s), reusing {len(rel_paths) - len(stale)}.")
+    results = run_and_report(index_page, [(os.path.join(root_dir, rel), digests[rel]) for rel in stale], jobs)
+    for result in results:
+        if result.error is None:
+            pages[os.path.relpath(result.path, root_dir).replace('\\', '/')] = result.value
+    pages = {rel: pages[rel] for rel in rel_paths if rel in pages}
+
+    documents = sorted(pages.items())
+    shards = build_shards(documents)
+    written = 0
+    versions = {}
+    total_bytes = 0
+    for shard, terms in shards.items():
+        text = _dumps(terms)
+        versions[shard] = content_hash(text)[:10]
+        total_bytes += len(text.encode('utf-8'))
+        written += write_if_changed(os.path.join(index_dir, f'shard-{shard}.json'), text)
+    for path in glob.glob(os.path.join(index_dir, 'shard-*.json')):
+        if os.path.basename(path)[6:-5] not in shards and remove_file(path):
+            print(f"Removed empty shard {os.path.basename(path)}")
+
+    index = dict(settings, docs=[[rel, entry['title'], entry['summary']] for rel, entry in documents],
+                 shards=versions)
+    index_text = _dumps(index)
+    written += write_if_changed(os.path.join(index_dir, 'index.json'), index_text)
+
+    if not is_dry_run():
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({'settings': content_hash(_dumps(settings)), 'pages': pages}, f, sort_keys=True)
+
+    term_count = sum(len(terms) for terms in shards.values())
+    largest = max((len(_dumps(terms).encode('utf-8')) for terms in shards.values()), default=0)
+    print(f"...Indexed {len(documents)} page(s), {term_count} term(s) in {len(shards)} shard(s): "
+          f"{len(index_text.encode('utf-8')) / 1024:.1f} KB index, {total_bytes / 1024:.1f} KB of shards "
+          f"(largest {largest / 1024:.1f} KB). "
+          f"{written} file(s) {'would change' if is_dry_run() else 'written'}.")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the static search index for writing/ and case_studies/.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    build(os.path.abspath(args.root), args.jobs)
+
+
+if __name__ == "__main__":
+    main()
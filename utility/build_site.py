@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Builds pages from a shared layout instead of patching them in place.
+
+Each generated page has a source under _content/ at the same relative path.
+The source holds the page's own markup (everything between the header and
+the closing script tag, i.e. <main> and <footer>) after a front matter
+comment:
+
+    <!--
+    title: Harry Hunter - Portfolio
+    description: A product manager and engineering leader ...
+    -->
+    <main>
+    ...
+
+The layout in _templates/base.html supplies the rest: the <head> with the
+page's stylesheets (bundle_css.PAGE_STYLESHEETS) and the analytics tag, the
+header built by sync_headers.create_header_html, and the closing script.
+Rendering is string assembly with compiled templates, so a build is one pass
+over the sources, the same inputs always give the same bytes, and a page is
+only written when its output changed. A layout or menu change is a rebuild
+rather than a rewrite script. Pages without a source are left alone.
+
+Usage:
+    python utility/build_site.py --extract   # create sources for pages that have none
+    python utility/build_site.py [--bundle-css] [--jobs N]
+    python utility/build_site.py --incremental [--plan]  # rebuild only what changed
+
+Incremental rebuilds use the dependency graph in build_graph.py: a layout,
+menu or stylesheet change dirties every page, an article edit dirties that
+article, and writing.html is only rebuilt when the article catalog it
+lists changes.
+"""
+import os
+import time
+import html
+import argparse
+from bs4 import BeautifulSoup
+
+import bundle_css
+import templates
+import article_catalog
+import sync_headers
+from templates import load_template
+from sync_headers import create_header_html
+from manifest import config_hash, source_hash
+from build_graph import GRAPH_PATH, DependencyGraph, print_plan
+from update_analytics_tag import MEASUREMENT_ID
+from stream_rewrite import START_TAG, END_TAG, TEXT, iter_tokens, iter_attributes
+from parsers import make_soup
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, phase, set_report
+from site_io import add_write_mode_arguments, is_dry_run, set_write_mode, write_if_changed
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CONTENT_DIR = '_content'
+LAYOUT_PATH = os.path.join(ROOT_DIR, '_templates', 'base.html')
+# Directories that never hold pages. Underscore directories aren't published by Jekyll either.
+EXCLUDE_DIRS = {'utility', '.git', '.github', 'assets', 'styles'}
+# Front matter keys, in the order they are written
+META_KEYS = ['title', 'description']
+# --- End Configuration ---
+
+# Rendered headers per relative root prefix ('', '../', '../../')
+_headers = {}
+
+
+def source_path_for(page_path, root_dir=ROOT_DIR):
+    return os.path.join(root_dir, CONTENT_DIR, os.path.relpath(page_path, root_dir))
+
+
+def page_path_for(source_path, root_dir=ROOT_DIR):
+    return os.path.join(root_dir, os.path.relpath(source_path, os.path.join(root_dir, CONTENT_DIR)))
+
+
+def catalog_path_for(root_dir=ROOT_DIR):
+    return os.path.join(root_dir, os.path.relpath(article_catalog.CATALOG_PATH, ROOT_DIR))
+
+
+def has_source(page_path, root_dir=ROOT_DIR):
+    """Returns True if the page is generated from a source in _content/."""
+    return os.path.exists(source_path_for(page_path, root_dir))
+
+
+def parse_source(text):
+    """
+    Splits a source file into (meta dict, body markup).
+    """
+    meta = {}
+    if text.startswith('<!--\n'):
+        end = text.find('\n-->')
+        if end != -1:
+            for line in text[5:end].splitlines():
+                key, sep, value = line.partition(':')
+                if sep:
+                    meta[key.strip()] = value.strip()
+            text = text[end + 4:]
+    return meta, text.strip('\n')
+
+
+def format_source(meta, body):
+    lines = [f"{key}: {meta[key]}" for key in META_KEYS if meta.get(key)]
+    return '<!--\n' + ''.join(line + '\n' for line in lines) + '-->\n' + body + '\n'
+
+
+def _root_prefix(rel_path):
+    depth = len(rel_path.replace('\\', '/').split('/')) - 1
+    return '../' * depth
+
+
+def header_html(prefix):
+    """
+    The site header for pages `prefix` away from the root, from MENU_ITEMS.
+    """
+    if prefix not in _headers:
+        soup = BeautifulSoup('', 'html.parser')
+        # Indented to sit inside <body>, like prettify() lays out the hand-maintained pages
+        _headers[prefix] = '\n'.join('  ' + line for line in create_header_html(soup, prefix).prettify().splitlines())
+    return _headers[prefix]
+
+
+def is_listing(body):
+    """Returns True if the markup has lists rendered from the article catalog."""
+    return f'{article_catalog.LIST_ATTRIBUTE}=' in body
+
+
+def render_page(rel_path, source_text, layout_path=LAYOUT_PATH, catalog=None):
+    """
+    Renders one page from its source text and returns the HTML. Article
+    lists (see article_catalog.py) are filled in from catalog.
+    """
+    meta, body = parse_source(source_text)
+    prefix = _root_prefix(rel_path)
+    if catalog is not None and is_listing(body):
+        body = article_catalog.render_listings(body, catalog, prefix)
+    description = meta.get('description')
+    stylesheets = ''.join(
+        f'  <link href="{prefix}{bundle_css.STYLES_DIR}/{sheet}" rel="stylesheet"/>\n'
+        for sheet in bundle_css.stylesheets_for(rel_path))
+    return load_template(layout_path).render({
+        'TITLE': html.escape(meta.get('title', ''), quote=False),
+        'META': f'  <meta content="{html.escape(description, quote=False).replace(chr(34), "&quot;")}" name="description"/>\n' if description else '',
+        'STYLESHEETS': stylesheets,
+        'MEASUREMENT_ID': MEASUREMENT_ID,
+        'HEADER': header_html(prefix),
+        'CONTENT': body,
+        'ROOT': prefix,
+    })
+
+
+def build_page(source_path, root_dir, bundles=None):
+    """
+    Worker entry point: renders one source and writes the page if it changed.
+    With bundles (from bundle_css.build_bundles) the critical CSS and bundle
+    link are applied as part of the render.
+    """
+    page_path = page_path_for(source_path, root_dir)
+    rel_path = os.path.relpath(page_path, root_dir)
+    with phase('read'), open(source_path, 'r', encoding='utf-8') as f:
+        source_text = f.read()
+    with phase('transform'):
+        catalog = None
+        if is_listing(source_text):
+            catalog = article_catalog.Catalog(catalog_path_for(root_dir))
+        output = render_page(rel_path, source_text, catalog=catalog)
+
+    if bundles is not None:
+        soup = make_soup(output)
+        with phase('transform'):
+            bundle_css.bundle_soup(soup, page_path, root_dir, bundles)
+        with phase('serialize'):
+            output = str(soup)
+
+    if not write_if_changed(page_path, output):
+        return False
+    print(f"Built: {rel_path}")
+    return True
+
+
+def extract_source(page_path, root_dir=ROOT_DIR):
+    """
+    Returns the source text for an existing page: its title and description
+    plus the raw markup between </header> and the closing script.js tag.
+    Raises ValueError for pages that don't follow that structure.
+    """
+    with open(page_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    meta = {}
+    title_parts = None
+    body_start = body_end = None
+    offset = 0
+    for kind, raw, name in iter_tokens([content]):
+        if kind == START_TAG and name == 'title':
+            title_parts = []
+        elif kind == END_TAG and name == 'title' and title_parts is not None:
+            meta['title'] = ' '.join(html.unescape(''.join(title_parts)).split())
+            title_parts = None
+        elif kind == TEXT and title_parts is not None:
+            title_parts.append(raw)
+        elif kind == START_TAG and name == 'meta':
+            attrs = {attr: value for attr, value, _, _ in iter_attributes(raw)}
+            if attrs.get('name') == 'description' and attrs.get('content'):
+                meta['description'] = ' '.join(html.unescape(attrs['content']).split())
+        elif kind == END_TAG and name == 'header' and body_start is None:
+            body_start = offset + len(raw)
+        elif kind == START_TAG and name == 'script' and body_start is not None:
+            src = {attr: value for attr, value, _, _ in iter_attributes(raw)}.get('src') or ''
+            if src.endswith('script.js'):
+                body_end = offset
+        offset += len(raw)
+
+    if body_start is None or body_end is None or 'title' not in meta:
+        raise ValueError("expected a <title>, a </header> and a closing script.js tag")
+    return format_source(meta, content[body_start:body_end].lstrip('\n').rstrip())
+
+
+def extract_page(page_path, root_dir, force=False):
+    """
+    Worker entry point: writes the _content/ source for one page.
+    """
+    source_path = source_path_for(page_path, root_dir)
+    if os.path.exists(source_path) and not force:
+        return
+    try:
+        source = extract_source(page_path, root_dir)
+    except ValueError as e:
+        print(f"Skipping {os.path.relpath(page_path, root_dir)}: {e}")
+        return
+    if write_if_changed(source_path, source):
+        print(f"Extracted: {os.path.relpath(source_path, root_dir)}")
+
+
+def find_pages(root_dir):
+    """Returns the site's pages, skipping page templates and unpublished directories."""
+    file_paths = []
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDE_DIRS and not d.startswith('_'))
+        for filename in sorted(files):
+            if filename.endswith('.html') and 'template' not in filename:
+                file_paths.append(os.path.join(root, filename))
+    return file_paths
+
+
+def find_sources(root_dir):
+    """Returns every source under _content/."""
+    file_paths = []
+    for root, dirs, files in os.walk(os.path.join(root_dir, CONTENT_DIR)):
+        dirs.sort()
+        file_paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.html'))
+    return file_paths
+
+
+def build(root_dir=ROOT_DIR, jobs=1, bundle=False, source_paths=None):
+    """
+    Builds the given sources (default: all of them). Returns the FileResults.
+    """
+    if source_paths is None:
+        source_paths = find_sources(root_dir)
+    bundles = bundle_css.build_bundles(root_dir) if bundle else None
+    results = run_and_report(build_page, [(path, root_dir, bundles) for path in source_paths], jobs)
+    built = sum(1 for r in results if r.value)
+    print(f"...Built {len(source_paths)} page(s), {built} changed.")
+    return results
+
+
+def site_inputs(graph, bundles=None):
+    """
+    The inputs every page depends on, as {input id: hash}.
+    """
+    inputs = {
+        'layout': graph.file_hash(LAYOUT_PATH),
+        'header': config_hash(sync_headers.MENU_ITEMS, source_hash(sync_headers.__file__)),
+        'head': config_hash(bundle_css.PAGE_STYLESHEETS, MEASUREMENT_ID),
+        'build scripts': source_hash(__file__, templates.__file__, bundle_css.__file__),
+    }
+    if bundles is not None:
+        inputs['css bundles'] = config_hash(sorted((list(sheets), rel) for sheets, (rel, _) in bundles.items()))
+    return inputs
+
+
+def page_inputs(graph, root_dir, source_paths, shared):
+    """
+    Returns {page rel path: {input id: hash}} for the given sources: the
+    shared inputs, the page's own source and, for pages with article lists,
+    the article catalog.
+    """
+    content_dir = os.path.join(root_dir, CONTENT_DIR)
+    catalog_path = catalog_path_for(root_dir)
+    graph_inputs = {}
+    for path in source_paths:
+        inputs = dict(shared)
+        inputs['source'] = graph.file_hash(path)
+
+        def listing():
+            with open(path, 'r', encoding='utf-8') as f:
+                return is_listing(f.read())
+        if graph.derive(inputs['source'], listing):
+            inputs['catalog'] = graph.file_hash(catalog_path) if os.path.exists(catalog_path) else ''
+        graph_inputs[os.path.relpath(path, content_dir).replace('\\', '/')] = inputs
+    return graph_inputs
+
+
+def rebuild(root_dir=ROOT_DIR, jobs=1, bundle=False, plan_only=False):
+    """
+    Rebuilds only the pages whose inputs changed since the last rebuild,
+    printing the plan and timings. Returns the FileResults.
+    """
+    start = time.perf_counter()
+    graph = DependencyGraph(os.path.join(root_dir, os.path.basename(GRAPH_PATH)), root_dir)
+    bundles = bundle_css.build_bundles(root_dir) if bundle else None
+    source_paths = find_sources(root_dir)
+    graph_inputs = page_inputs(graph, root_dir, source_paths, site_inputs(graph, bundles))
+    plan = {}
+    for rel_path, inputs in graph_inputs.items():
+        reasons = graph.dirty_reasons(rel_path, inputs)
+        if reasons:
+            plan[rel_path] = reasons
+    planned = time.perf_counter()
+    print_plan(plan, len(graph_inputs))
+    print(f"Planned in {planned - start:.2f}s.")
+    if plan_only:
+        graph.save()
+        return []
+
+    content_dir = os.path.join(root_dir, CONTENT_DIR)
+    dirty = [path for path in source_paths if os.path.relpath(path, content_dir).replace('\\', '/') in plan]
+    results = run_and_report(build_page, [(path, root_dir, bundles) for path in dirty], jobs)
+    if is_dry_run():
+        # Nothing was written, so the graph stays as it was
+        print(f"...Would rebuild {len(dirty)} page(s), {sum(1 for r in results if r.value)} changed.")
+        return results
+    for result in results:
+        # Pages that failed stay out of the graph so the next rebuild retries them
+        if result.error is None:
+            rel_path = os.path.relpath(result.path, content_dir).replace('\\', '/')
+            graph.record(rel_path, graph_inputs[rel_path])
+    # Forget pages whose source was deleted
+    for rel_path in set(graph.outputs) - set(graph_inputs):
+        del graph.outputs[rel_path]
+    graph.save()
+    built = time.perf_counter()
+    changed = sum(1 for r in results if r.value)
+    print(f"...Rebuilt {len(dirty)} page(s), {changed} changed, in {built - planned:.2f}s "
+          f"({built - start:.2f}s total).")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the site's pages from _content/ and the shared layout.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    parser.add_argument('--extract', action='store_true', help="Create _content/ sources from the existing pages.")
+    parser.add_argument('--force', action='store_true', help="With --extract, overwrite existing sources.")
+    parser.add_argument('--bundle-css', action='store_true', help="Inline critical CSS and link the hashed bundles.")
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"Rebuild only pages whose inputs changed (tracked in {os.path.basename(GRAPH_PATH)}).")
+    parser.add_argument('--plan', action='store_true', help="Print the incremental rebuild plan without building.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    root_dir = os.path.abspath(args.root)
+
+    if args.extract:
+        print("Extracting page sources...")
+        run_and_report(extract_page, [(path, root_dir, args.force) for path in find_pages(root_dir)], args.jobs)
+        return
+    if args.incremental or args.plan:
+        rebuild(root_dir, args.jobs, args.bundle_css, plan_only=args.plan)
+        return
+    print("Building pages...")
+    build(root_dir, args.jobs, args.bundle_css)
+
+
+if __name__ == "__main__":
+    main()
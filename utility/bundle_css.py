@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Inlines each page's critical CSS and replaces its stylesheet links with one
+minified, content-hashed bundle.
+
+Every page used to link styles/common.css plus a page specific sheet, two
+render-blocking requests on top of the Google Fonts CSS. For each page this
+script:
+- looks up the stylesheets the page uses in PAGE_STYLESHEETS,
+- inlines the rules whose selectors match an element of the page into a
+  <style data-critical> block in <head>,
+- links a single minified bundle of those stylesheets, named after its
+  content hash (styles/dist/<name>.<hash>.css), and loads it without
+  blocking rendering,
+- loads the Google Fonts CSS without blocking rendering as well.
+
+The bundle holds the complete stylesheets rather than only the rules that
+weren't inlined, so that one file is shared (and cached) by every page of
+the same kind and state rules like header.scrolled still apply.
+
+This is a deploy step: .github/workflows/jekyll-gh-pages.yml runs it on
+the checked-out pages before the Jekyll build, so the committed pages keep
+linking the sources in styles/ and styles/dist/ is not committed. Running it
+locally rewrites the pages the same way, to preview the result; git checkout
+the pages afterwards.
+
+Usage:
+    python utility/bundle_css.py [--jobs N] [--incremental]
+"""
+import os
+import re
+import glob
+import hashlib
+import fnmatch
+import argparse
+from collections import namedtuple
+from bs4.element import Stylesheet
+
+from parsers import default_backend, make_soup
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, phase, record_error, set_report
+from manifest import add_incremental_argument, config_hash, run_incremental, source_hash
+from site_io import add_write_mode_arguments, remove_file, set_write_mode, write_if_changed
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+STYLES_DIR = 'styles'
+BUNDLE_DIR = os.path.join(STYLES_DIR, 'dist')
+# Source stylesheets (relative to styles/) per page, first matching pattern wins.
+# Patterns are matched against the page path relative to the site root.
+PAGE_STYLESHEETS = [
+    ('writing/*/*.html', ['common.css', 'writing_articles.css']),
+    # Sub-landing pages which use case_studies.css, not case_studies_articles.css
+    ('case_studies/thekey.html', ['common.css', 'case_studies.css']),
+    ('case_studies/atkinsrealis.html', ['common.css', 'case_studies.css']),
+    ('case_studies/*.html', ['common.css', 'case_studies_articles.css']),
+    ('index.html', ['common.css', 'index.css']),
+    ('books.html', ['common.css', 'books.css']),
+    ('case_studies.html', ['common.css', 'case_studies.css']),
+    ('cv.html', ['common.css', 'cv.css']),
+    ('writing.html', ['common.css', 'writing.css']),
+    ('*.html', ['common.css']),
+]
+FONTS_HREF_PREFIX = 'https://fonts.googleapis.com/css'
+# Dynamic pseudo-classes and pseudo-elements can't be matched against a static
+# document, so they are dropped before testing whether a selector is used.
+DYNAMIC_PSEUDO = re.compile(
+    r'::?(?:before|after|first-line|first-letter|marker|placeholder|selection|'
+    r'hover|focus|focus-within|focus-visible|active|visited|link|target)\b', re.IGNORECASE)
+# Loads a stylesheet without blocking the first render
+ASYNC_ONLOAD = "this.onload=null;this.media='all'"
+# --- End Configuration ---
+
+# A parsed CSS block. children is None for style rules and simple at-rules
+# (body holds the declarations) and a list of nested blocks for @media/@supports.
+Block = namedtuple('Block', ['prelude', 'body', 'children'])
+
+NESTING_AT_RULES = ('@media', '@supports', '@layer', '@container', '@document')
+
+
+def stylesheets_for(rel_path):
+    """
+    Returns the source stylesheets of a page, relative to styles/.
+    """
+    rel_path = rel_path.replace('\\', '/')
+    for pattern, sheets in PAGE_STYLESHEETS:
+        if fnmatch.fnmatch(rel_path, pattern):
+            return list(sheets)
+    return []
+
+
+def _relative_href(target_rel, file_path, root_dir):
+    # target_rel is relative to the site root, the result to the page's directory
+    return os.path.relpath(os.path.join(root_dir, target_rel), os.path.dirname(file_path)).replace('\\', '/')
+
+
+def link_stylesheets(soup, file_path, root_dir=ROOT_DIR):
+    """
+    Adds <link rel="stylesheet"> tags for the page's source stylesheets after
+    the last link in <head>, skipping those already linked. Used by the
+    clean-up scripts after they remove outdated links; bundle_css.py later
+    folds these into the bundle.
+    """
+    head = soup.find('head')
+    if head is None:
+        return
+    linked = {link.get('href') for link in head.find_all('link', href=True, recursive=False)}
+    hrefs = [_relative_href(f'{STYLES_DIR}/{sheet}', file_path, root_dir)
+             for sheet in stylesheets_for(os.path.relpath(file_path, root_dir))]
+    new_links = [soup.new_tag('link', rel='stylesheet', href=href) for href in hrefs if href not in linked]
+
+    all_links = head.find_all('link', href=True, recursive=False)
+    if all_links:
+        # Keep the new links at the end of the other links
+        anchor = all_links[-1]
+        for link in new_links:
+            anchor.insert_after(link)
+            anchor = link
+    else:
+        for link in new_links:
+            head.append(link)
+
+
+def _strip_comments(css):
+    return re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+
+
+def parse_css(css):
+    """
+    Splits a stylesheet into a list of Blocks. Enough for the hand written
+    sheets in styles/: no nesting inside style rules, no braces in strings.
+    """
+    css = _strip_comments(css)
+    blocks, pos = _parse_blocks(css, 0)
+    return blocks
+
+
+def _parse_blocks(css, pos):
+    blocks = []
+    while pos < len(css):
+        brace = css.find('{', pos)
+        close = css.find('}', pos)
+        semicolon = css.find(';', pos)
+        if close != -1 and (brace == -1 or close < brace):
+            # End of the enclosing block
+            return blocks, close + 1
+        if brace == -1:
+            break
+        if semicolon != -1 and semicolon < brace and css[pos:semicolon].strip().startswith('@'):
+            # Statement at-rule such as @import or @charset
+            blocks.append(Block(css[pos:semicolon].strip(), None, None))
+            pos = semicolon + 1
+            continue
+
+        prelude = css[pos:brace].strip()
+        if prelude.lower().startswith(NESTING_AT_RULES):
+            children, pos = _parse_blocks(css, brace + 1)
+            blocks.append(Block(prelude, None, children))
+        else:
+            end = css.find('}', brace)
+            if end == -1:
+                end = len(css)
+            blocks.append(Block(prelude, css[brace + 1:end].strip(), None))
+            pos = end + 1
+    return blocks, len(css)
+
+
+def _minify_declarations(body):
+    body = re.sub(r'\s+', ' ', body).strip()
+    # Spaces inside values like "0 auto" are significant, around : ; and , they are not
+    body = re.sub(r'\s*([:;,])\s*', r'\1', body)
+    return body.rstrip(';')
+
+
+def _minify_prelude(prelude):
+    prelude = re.sub(r'\s+', ' ', prelude).strip()
+    return re.sub(r'\s*([,>{}+~])\s*', r'\1', prelude) if not prelude.startswith('@') else re.sub(r'\s*,\s*', ',', prelude)
+
+
+def serialize_css(blocks):
+    """
+    Serializes Blocks back to minified CSS.
+    """
+    out = []
+    for block in blocks:
+        if block.children is not None:
+            inner = serialize_css(block.children)
+            if inner:
+                out.append(f"{_minify_prelude(block.prelude)}{{{inner}}}")
+        elif block.body is None:
+            out.append(f"{_minify_prelude(block.prelude)};")
+        else:
+            out.append(f"{_minify_prelude(block.prelude)}{{{_minify_declarations(block.body)}}}")
+    return ''.join(out)
+
+
+def minify_css(css):
+    return serialize_css(parse_css(css))
+
+
+def _selector_used(selector, soup):
+    """
+    Returns True if any element of the page matches the selector (ignoring
+    dynamic states). Selectors the matcher doesn't understand count as used.
+    """
+    for part in selector.split(','):
+        static = DYNAMIC_PSEUDO.sub('', part).strip()
+        if not static or static.endswith(('>', '+', '~')):
+            static = (static + ' *').strip()
+        try:
+            if soup.select_one(static) is not None:
+                return True
+        except Exception:
+            return True
+    return False
+
+
+def critical_blocks(blocks, soup):
+    """
+    Returns the style rules (and the @media blocks around them) that match
+    an element of the page. @font-face, @keyframes and friends stay in the bundle only.
+    """
+    critical = []
+    for block in blocks:
+        if block.children is not None:
+            children = critical_blocks(block.children, soup)
+            if children:
+                critical.append(Block(block.prelude, None, children))
+        elif block.body is not None and not block.prelude.startswith('@'):
+            if _selector_used(block.prelude, soup):
+                critical.append(block)
+    return critical
+
+
+def _rebase_urls(css, from_dir, to_dir):
+    """
+    Rewrites relative url() references in css written for from_dir so they
+    still resolve when the css is used from to_dir.
+    """
+    def replace(match):
+        quote, url = match.group(1), match.group(2)
+        if re.match(r'^(?:[a-z]+:|/|#)', url, re.IGNORECASE):
+            return match.group(0)
+        rebased = os.path.relpath(os.path.join(from_dir, url), to_dir).replace('\\', '/')
+        return f"url({quote}{rebased}{quote})"
+    return re.sub(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)', replace, css)
+
+
+def build_bundles(root_dir=ROOT_DIR):
+    """
+    Writes one minified, content-hashed bundle per distinct combination of
+    stylesheets in PAGE_STYLESHEETS and removes bundles that are no longer used.
+    Returns a dict mapping the stylesheet tuple to (bundle path relative to
+    the root, parsed Blocks of the combined sources).
+    """
+    styles_dir = os.path.join(root_dir, STYLES_DIR)
+    bundle_dir = os.path.join(root_dir, BUNDLE_DIR)
+
+    bundles = {}
+    for _, sheets in PAGE_STYLESHEETS:
+        key = tuple(sheets)
+        if key in bundles:
+            continue
+        sources = []
+        for sheet in sheets:
+            with open(os.path.join(styles_dir, sheet), 'r', encoding='utf-8') as f:
+                sources.append(_rebase_urls(f.read(), styles_dir, bundle_dir))
+        blocks = parse_css('\n'.join(sources))
+        css = serialize_css(blocks)
+
+        name = os.path.splitext(sheets[-1])[0]
+        digest = hashlib.sha256(css.encode('utf-8')).hexdigest()[:10]
+        bundle_rel = f"{BUNDLE_DIR}/{name}.{digest}.css".replace('\\', '/')
+        bundle_path = os.path.join(root_dir, bundle_rel)
+        if write_if_changed(bundle_path, css):
+            print(f"Wrote {bundle_rel} ({len(css)} bytes from {', '.join(sheets)})")
+        bundles[key] = (bundle_rel, blocks)
+
+    in_use = {os.path.basename(path) for path, _ in bundles.values()}
+    for stale in glob.glob(os.path.join(bundle_dir, '*.css')):
+        if os.path.basename(stale) not in in_use and remove_file(stale):
+            print(f"Removed stale bundle {os.path.relpath(stale, root_dir)}")
+    return bundles
+
+
+def _is_source_stylesheet(link, file_path, root_dir):
+    # Links to styles/*.css, i.e. the unbundled sources
+    href = link.get('href', '')
+    if not href or re.match(r'^(?:[a-z]+:)?//', href, re.IGNORECASE) or link.get('data-bundle') is not None:
+        return False
+    target = os.path.normpath(os.path.join(os.path.dirname(file_path), href.split('?')[0]))
+    return os.path.dirname(target) == os.path.join(os.path.normpath(root_dir), STYLES_DIR)
+
+
+def _async_link(soup, href, **attrs):
+    link = soup.new_tag('link', rel='stylesheet', href=href, media='print', onload=ASYNC_ONLOAD, **attrs)
+    fallback = soup.new_tag('noscript')
+    fallback.append(soup.new_tag('link', rel='stylesheet', href=href, **attrs))
+    return link, fallback
+
+
+def bundle_soup(soup, file_path, root_dir, bundles):
+    """
+    Replaces the stylesheet links of an already parsed page with its critical
+    CSS and an async bundle link. Returns True if the document was changed.
+    """
+    head = soup.find('head')
+    sheets = tuple(stylesheets_for(os.path.relpath(file_path, root_dir)))
+    if head is None or sheets not in bundles:
+        return False
+    before = str(head)
+    bundle_rel, blocks = bundles[sheets]
+
+    # The sources are folded into the bundle
+    for link in head.find_all('link', rel='stylesheet', recursive=False):
+        if _is_source_stylesheet(link, file_path, root_dir):
+            link.decompose()
+
+    # The fonts stylesheet uses font-display: swap, so it doesn't need to block either
+    for link in head.find_all('link', rel='stylesheet', href=lambda href: href and href.startswith(FONTS_HREF_PREFIX),
+                              recursive=False):
+        if link.get('onload') is None:
+            async_link, fallback = _async_link(soup, link['href'])
+            link.replace_with(async_link)
+            async_link.insert_after(fallback)
+
+    page_dir = os.path.dirname(file_path)
+    critical_css = _rebase_urls(serialize_css(critical_blocks(blocks, soup)), os.path.join(root_dir, BUNDLE_DIR), page_dir)
+    bundle_href = _relative_href(bundle_rel, file_path, root_dir)
+
+    # Update what a previous run inserted in place, so reformatting the page
+    # (e.g. by sync_headers' prettify) doesn't make every run rewrite it
+    critical = head.find(lambda tag: tag.name == 'style' and tag.has_attr('data-critical'))
+    if critical is None:
+        critical = soup.new_tag('style', attrs={'data-critical': ''})
+        all_links = head.find_all('link', href=True, recursive=False)
+        anchor = all_links[-1] if all_links else None
+        if anchor is not None and anchor.find_next_sibling() is not None and anchor.find_next_sibling().name == 'noscript':
+            # Keep an async link and its fallback together
+            anchor = anchor.find_next_sibling()
+        if anchor is None:
+            head.append(critical)
+        else:
+            anchor.insert_after(critical)
+    if critical.get_text().strip() != critical_css:
+        # A Stylesheet string is written out as is, without escaping the > combinators
+        critical.clear()
+        critical.append(Stylesheet(critical_css))
+
+    bundle_links = head.find_all(lambda tag: tag.name == 'link' and tag.has_attr('data-bundle'))
+    if not bundle_links:
+        bundle_link, fallback = _async_link(soup, bundle_href, **{'data-bundle': ''})
+        critical.insert_after(bundle_link)
+        bundle_link.insert_after(fallback)
+    for link in bundle_links:
+        link['href'] = bundle_href
+
+    return str(head) != before
+
+
+def bundle_page(file_path, root_dir, bundles):
+    """
+    Worker entry point: bundles the stylesheets of one page.
+    """
+    try:
+        with phase('read'), open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        soup = make_soup(content)
+        with phase('transform'):
+            changed = bundle_soup(soup, file_path, root_dir, bundles)
+        if changed:
+            with phase('serialize'):
+                content = str(soup)
+            if write_if_changed(file_path, content):
+                print(f"Updated file: {os.path.relpath(file_path, root_dir)}")
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
+
+
+def find_html_files(root_dir):
+    """Returns the site pages, skipping the utility scripts and the page templates."""
+    file_paths = []
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = sorted(d for d in dirs if d not in {'utility', '.git', '.github', 'assets', STYLES_DIR} and not d.startswith('_'))
+        for filename in sorted(files):
+            # Templates link the stylesheets relative to the pages generated from them
+            if filename.endswith('.html') and 'template' not in filename:
+                file_paths.append(os.path.join(root, filename))
+    return file_paths
+
+
+def main(root_dir=ROOT_DIR, jobs=1, incremental=False):
+    print("Building CSS bundles...")
+    bundles = build_bundles(root_dir)
+    arg_tuples = [(path, root_dir, bundles) for path in find_html_files(root_dir)]
+    print("Inlining critical CSS...")
+    if incremental:
+        digest = config_hash(sorted(path for path, _ in bundles.values()), PAGE_STYLESHEETS,
+                             default_backend(), source_hash(__file__))
+        run_incremental('bundle_css', digest, bundle_page, arg_tuples, jobs, root_dir)
+    else:
+        run_and_report(bundle_page, arg_tuples, jobs)
+    print("...Finished bundling CSS.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inline critical CSS and link one hashed bundle per page.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_incremental_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(args.root, args.jobs, args.incremental)
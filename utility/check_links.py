@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Checks every link on the site: href, src and srcset values in all pages.
+
+Internal links are resolved against an in-memory index of the files in the
+tree (built with a single walk), so checking them needs no network and no
+per-link filesystem calls. Links with a #fragment into another page are
+checked against the ids on that page.
+
+External links are checked concurrently: each URL is requested (HEAD, then
+GET for servers that don't allow HEAD) from a bounded pool of asyncio tasks,
+with at most a few requests in flight per host. Successful results are
+cached in .link_cache.json for CACHE_TTL_HOURS, so a nightly run only
+re-checks links that are new, expired or were failing.
+
+Usage:
+    python utility/check_links.py [--offline] [--refresh] [--jobs N]
+
+Exits with status 1 if any link is broken.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import posixpath
+import http.client
+import urllib.parse
+
+from stream_rewrite import START_TAG, iter_tokens, iter_attributes, read_chunks
+from parallel import add_jobs_argument, run_per_file, report_results
+from instrument import add_report_argument, set_report
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CACHE_PATH = os.path.join(ROOT_DIR, '.link_cache.json')
+CACHE_TTL_HOURS = 24 * 7
+# Directories that aren't published (underscore directories are skipped too)
+EXCLUDE_DIRS = {'utility', '.git', '.github'}
+LINK_ATTRIBUTES = ('href', 'src', 'srcset')
+# Resource hints point at a host, not a page
+SKIP_RELS = {'preconnect', 'dns-prefetch'}
+SKIP_SCHEMES = ('mailto:', 'tel:', 'javascript:', 'data:')
+MAX_CONCURRENT = 16
+MAX_PER_HOST = 4
+MAX_REDIRECTS = 5
+TIMEOUT_SECONDS = 15
+USER_AGENT = 'Mozilla/5.0 (compatible; harryjan.github.io link checker)'
+# --- End Configuration ---
+
+
+def find_html_files(root_dir):
+    file_paths = []
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDE_DIRS and not d.startswith('_'))
+        for filename in sorted(files):
+            if filename.endswith('.html') and 'template' not in filename:
+                file_paths.append(os.path.join(root, filename))
+    return file_paths
+
+
+def build_path_index(root_dir):
+    """
+    Returns the set of every file and directory in the tree, relative to
+    root_dir with forward slashes. Directories end with a slash.
+    """
+    paths = set()
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = [d for d in dirs if d != '.git']
+        rel_root = os.path.relpath(root, root_dir).replace('\\', '/')
+        prefix = '' if rel_root == '.' else rel_root + '/'
+        paths.add(prefix)
+        paths.update(prefix + name for name in files)
+    return paths
+
+
+def _link_values(attr, value):
+    if attr == 'srcset':
+        # "image-480.webp 480w, image-960.webp 960w"
+        return [candidate.split()[0] for candidate in value.split(',') if candidate.strip()]
+    return [value]
+
+
+def extract_links(file_path):
+    """
+    Worker entry point: returns (links, ids) for one page, where links is a
+    list of (line, url) and ids the set of element ids/anchor names on it.
+    """
+    links = []
+    ids = set()
+    line = 1
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for kind, raw, name in iter_tokens(read_chunks(f)):
+            if kind == START_TAG:
+                attrs = {attr: value for attr, value, _, _ in iter_attributes(raw)}
+                for anchor in (attrs.get('id'), attrs.get('name') if name == 'a' else None):
+                    if anchor:
+                        ids.add(anchor)
+                rels = set((attrs.get('rel') or '').lower().split())
+                if not (name == 'link' and rels & SKIP_RELS):
+                    for attr in LINK_ATTRIBUTES:
+                        if attrs.get(attr):
+                            links.extend((line, url) for url in _link_values(attr, attrs[attr].strip()))
+            line += raw.count('\n')
+    return links, ids
+
+
+def resolve_internal(page_rel, url):
+    """
+    Returns (target path, fragment) for a relative or root-relative link,
+    with the target relative to the root, or (None, None) if it points
+    outside the site.
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = urllib.parse.unquote(parts.path)
+    if not path:
+        return page_rel, parts.fragment
+    if path.startswith('/'):
+        target = posixpath.normpath(path.lstrip('/') or '.')
+    else:
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(page_rel), path))
+    if target == '..' or target.startswith('../'):
+        return None, None
+    return target, parts.fragment
+
+
+def check_internal(page_rel, url, path_index, page_ids):
+    """
+    Returns None if an internal link resolves, otherwise why it doesn't.
+    """
+    target, fragment = resolve_internal(page_rel, url)
+    if target is None:
+        return "points outside the site"
+    if target == '.':
+        target = 'index.html'
+    elif target + '/' in path_index:
+        target += '/index.html'
+    if target not in path_index:
+        return "no such file"
+    if fragment and target in page_ids and fragment not in page_ids[target]:
+        return f"no id '{fragment}' in {target}"
+    return None
+
+
+def _request(method, url):
+    """
+    Sends one request, following redirects. Returns the final status code.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(parts.netloc, timeout=TIMEOUT_SECONDS)
+        try:
+            path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+            connection.request(method, path, headers={'User-Agent': USER_AGENT, 'Accept': '*/*'})
+            response = connection.getresponse()
+            location = response.getheader('Location')
+            status = response.status
+        finally:
+            connection.close()
+        if status in (301, 302, 303, 307, 308) and location:
+            url = urllib.parse.urljoin(url, location)
+            continue
+        return status
+    raise OSError("too many redirects")
+
+
+def check_url(url):
+    """
+    Returns (status, error) for an external URL. error is None if it works.
+    """
+    try:
+        status = _request('HEAD', url)
+        if status in (403, 405, 501):
+            # Some servers refuse HEAD but serve GET
+            status = _request('GET', url)
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+    return status, None if status < 400 else f"HTTP {status}"
+
+
+async def _check_all(urls, max_concurrent, max_per_host):
+    pool = asyncio.Semaphore(max_concurrent)
+    hosts = {}
+
+    async def check(url):
+        host = hosts.setdefault(urllib.parse.urlsplit(url).netloc, asyncio.Semaphore(max_per_host))
+        # Take the host slot first, so requests queued for a busy host don't hold pool slots
+        async with host, pool:
+            return url, await asyncio.to_thread(check_url, url)
+
+    return await asyncio.gather(*(check(url) for url in urls))
+
+
+def check_external(urls, cache, ttl_hours=CACHE_TTL_HOURS, max_concurrent=MAX_CONCURRENT, max_per_host=MAX_PER_HOST):
+    """
+    Checks the URLs not already in the cache with a fresh, passing result.
+    Updates the cache and returns {url: error or None} for every URL.
+    """
+    now = time.time()
+    stale = [url for url in urls
+             if url not in cache or cache[url]['error'] or now - cache[url]['checked'] > ttl_hours * 3600]
+    print(f"Checking {len(stale)} external link(s) ({len(urls) - len(stale)} cached)...")
+    if stale:
+        for url, (status, error) in asyncio.run(_check_all(stale, max_concurrent, max_per_host)):
+            cache[url] = {'status': status, 'error': error, 'checked': now}
+    return {url: cache[url]['error'] for url in urls}
+
+
+def load_cache(cache_path):
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable link cache {cache_path}: {e}")
+    return {}
+
+
+def save_cache(cache, cache_path):
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def main(root_dir=ROOT_DIR, jobs=1, offline=False, refresh=False, ttl_hours=CACHE_TTL_HOURS):
+    """
+    Checks the links under root_dir. Returns the number of broken links.
+    """
+    print("Collecting links...")
+    file_paths = find_html_files(root_dir)
+    results = run_per_file(extract_links, [(path,) for path in file_paths], jobs)
+    report_results([r for r in results if r.error])
+    path_index = build_path_index(root_dir)
+
+    pages = {}
+    page_ids = {}
+    for result in results:
+        if result.error is None:
+            rel = os.path.relpath(result.path, root_dir).replace('\\', '/')
+            pages[rel], page_ids[rel] = result.value
+
+    broken = []
+    external = {}
+    link_count = 0
+    for rel, links in pages.items():
+        for line, url in links:
+            if url.startswith(SKIP_SCHEMES) or '{{' in url:
+                continue
+            link_count += 1
+            if url.startswith('//'):
+                url = 'https:' + url
+            if url.startswith(('http://', 'https://')):
+                external.setdefault(url.split('#')[0], []).append((rel, line))
+            elif '://' in url:
+                continue
+            else:
+                reason = check_internal(rel, url, path_index, page_ids)
+                if reason:
+                    broken.append((rel, line, url, reason))
+    internal_broken = len(broken)
+    print(f"Checked {link_count - sum(len(v) for v in external.values())} internal link(s) "
+          f"in {len(pages)} page(s): {internal_broken} broken.")
+
+    if offline:
+        print(f"Offline: skipped {len(external)} external URL(s).")
+    elif external:
+        cache_path = os.path.join(root_dir, os.path.basename(CACHE_PATH))
+        cache = {} if refresh else load_cache(cache_path)
+        errors = check_external(sorted(external), cache, ttl_hours)
+        save_cache(cache, cache_path)
+        for url, error in errors.items():
+            if error:
+                broken.extend((rel, line, url, error) for rel, line in external[url])
+        print(f"Checked {len(external)} external URL(s): {sum(1 for e in errors.values() if e)} broken.")
+
+    for rel, line, url, reason in sorted(broken):
+        print(f"{rel}:{line}: {url} ({reason})")
+    print(f"...Found {len(broken)} broken link(s).")
+    return len(broken)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the internal and external links of every page.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    parser.add_argument('--offline', action='store_true', help="Only check internal links.")
+    parser.add_argument('--refresh', action='store_true', help="Ignore cached external results.")
+    parser.add_argument('--ttl', type=float, default=CACHE_TTL_HOURS,
+                        help="Hours a passing external result stays cached (default: %(default)s).")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    args = parser.parse_args()
+    set_report(args)
+    sys.exit(1 if main(os.path.abspath(args.root), args.jobs, args.offline, args.refresh, args.ttl) else 0)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+An on-disk cache for the Substack RSS feed.
+
+The raw feed is stored together with the ETag / Last-Modified headers it was
+served with, and later fetches send a conditional GET. When the server
+answers 304 Not Modified, the entries are loaded from the cached index
+(keyed by post link, stored as plain JSON) instead of downloading and
+re-parsing the feed. If the feed can't be fetched at all (an HTTP error, a
+timeout, no network) the cached copy is used; without one the error is
+printed and no entries are returned.
+
+The feed URL is a parameter, so the cache can be exercised against a local
+server (tests/test_feed_cache.py does this with tests/fixtures/substack_feed.xml):
+
+    python -m http.server --directory tests/fixtures 8000
+    python utility/feed_cache.py http://localhost:8000/substack_feed.xml
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import urllib.error
+import urllib.request
+import feedparser
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CACHE_DIR = os.path.join(ROOT_DIR, '.feed_cache')
+TIMEOUT_SECONDS = 30
+USER_AGENT = 'harryjan.github.io feed importer'
+# --- End Configuration ---
+
+
+def _cache_paths(url, cache_dir):
+    # One set of files per feed URL
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+    base = os.path.join(cache_dir, key)
+    return base + '.xml', base + '.json', base + '.entries.json'
+
+
+def _write_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_cached(raw_path):
+    with open(raw_path, 'rb') as f:
+        return f.read()
+
+
+def fetch(url, cache_dir=CACHE_DIR):
+    """
+    Returns (raw_feed_bytes, meta, from_cache). Sends a conditional GET
+    based on the cached validators and falls back to the cached copy if the
+    feed can't be fetched. Returns (None, {}, False) if it can't be fetched
+    and isn't cached.
+    """
+    raw_path, meta_path, _ = _cache_paths(url, cache_dir)
+    meta = {}
+    if os.path.exists(meta_path) and os.path.exists(raw_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    if meta.get('etag'):
+        request.add_header('If-None-Match', meta['etag'])
+    if meta.get('last_modified'):
+        request.add_header('If-Modified-Since', meta['last_modified'])
+
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS) as response:
+            raw = response.read()
+            meta = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'sha256': hashlib.sha256(raw).hexdigest(),
+                'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and meta:
+            print("Feed not modified, using cached entries.")
+            return _read_cached(raw_path), meta, True
+        error = f"HTTP {e.code} {e.reason}"
+    except (urllib.error.URLError, OSError) as e:
+        # URLError for connection failures, plain OSError for timeouts and resets
+        error = getattr(e, 'reason', None) or e
+    else:
+        error = None
+
+    if error is not None:
+        if not meta:
+            print(f"Error: could not fetch the feed from {url} ({error}) and there is no cached copy.")
+            return None, {}, False
+        print(f"Could not fetch {url} ({error}), using the cached feed from {meta.get('fetched_at')}.")
+        return _read_cached(raw_path), meta, True
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_atomic(raw_path, raw)
+    _write_atomic(meta_path, json.dumps(meta, indent=2).encode('utf-8'))
+    return raw, meta, False
+
+
+def _to_feedparser_dict(value):
+    # Entries read back from JSON get feedparser's attribute access again
+    if isinstance(value, dict):
+        return feedparser.FeedParserDict({key: _to_feedparser_dict(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_to_feedparser_dict(item) for item in value]
+    return value
+
+
+def _load_index(index_path):
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (ValueError, OSError) as e:
+        print(f"Ignoring unreadable feed index {index_path}: {e}")
+        return {}
+
+
+def load_entries(url, cache_dir=CACHE_DIR):
+    """
+    Returns a dict of feed entries keyed by post link, or None if the feed
+    couldn't be fetched or parsed. The parsed index is cached next to the raw
+    feed and reused as long as the feed content is unchanged.
+    """
+    _, _, index_path = _cache_paths(url, cache_dir)
+    raw, meta, _ = fetch(url, cache_dir)
+    if raw is None:
+        return None
+
+    if os.path.exists(index_path):
+        cached = _load_index(index_path)
+        if cached.get('sha256') == meta.get('sha256') and 'entries' in cached:
+            return {link: _to_feedparser_dict(entry) for link, entry in cached['entries'].items()}
+
+    feed = feedparser.parse(raw)
+    if feed.bozo:
+        print(f"Error parsing feed: {feed.bozo_exception}")
+        return None
+
+    entries = {entry.link: entry for entry in feed.entries}
+    # struct_time values such as published_parsed are stored as lists
+    index = json.dumps({'sha256': meta.get('sha256'), 'entries': entries}, default=list)
+    _write_atomic(index_path, index.encode('utf-8'))
+    return entries
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python utility/feed_cache.py <feed_url>")
+        sys.exit(1)
+    started = time.perf_counter()
+    entries = load_entries(sys.argv[1])
+    if entries is not None:
+        print(f"{len(entries)} entries in {time.perf_counter() - started:.3f}s")
+        for link in entries:
+            print(f"  {link}")
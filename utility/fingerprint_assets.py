@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Fingerprints the site's stylesheets and images so they can be cached for good.
+
+The pages reference their assets by fixed names (styles/common.css,
+../../styles/writing_articles.css, assets/the-key-logo.png), so a browser
+has to revalidate them on every visit or risk showing a stale file after a
+change. This script:
+- copies every asset in ASSET_PATTERNS to a name carrying its content hash
+  (styles/common.css -> styles/common.1a2b3c4d5e.css), next to the original
+  so relative url()s keep working,
+- records source -> hashed name in _data/asset_manifest.json (also readable
+  from Liquid as site.data.asset_manifest),
+- rewrites the href/src/srcset references in every page, and the url()s in
+  style attributes and <style> blocks, to the hashed names in a single
+  streaming pass per page, and
+- removes the copies of earlier versions.
+
+A hashed URL never changes content, so it can be served with a long,
+immutable cache lifetime wherever the host allows it, and a changed asset
+always gets a new URL. Re-running is cheap: unchanged copies and pages are
+left untouched, and pages already pointing at an older hashed name are
+moved to the current one.
+
+This is a deploy step: the Pages workflow runs it on the checkout after
+bundle_css.py and resource_hints.py, right before Jekyll builds the site, so
+the committed pages keep the source names and the hashed copies and the
+manifest are ignored by git. The other utilities (the CSS updaters,
+bundle_css.py, build_site.py) work with the source names. If you run it
+locally to preview the result, --revert points the pages back at the
+sources (git checkout works too).
+
+Usage:
+    python utility/fingerprint_assets.py [--jobs N] [--revert]
+"""
+import os
+import re
+import glob
+import json
+import hashlib
+import argparse
+import posixpath
+import urllib.parse
+
+from stream_rewrite import replace_attribute_values, rewrite_file
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, record_error, set_report
+from site_io import add_write_mode_arguments, remove_file, set_write_mode, write_if_changed
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MANIFEST_PATH = os.path.join(ROOT_DIR, '_data', 'asset_manifest.json')
+# Assets to fingerprint, relative to the root. Images come before the
+# stylesheets so url()s in the CSS can point at their hashed names.
+ASSET_PATTERNS = ['assets/*', 'assets/optimized/*', 'styles/*.css']
+ASSET_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.avif', '.css')
+PAGE_PATTERNS = ['*.html', 'writing/*/*.html', 'case_studies/*.html']
+REFERENCE_ATTRIBUTES = ('href', 'src', 'srcset', 'style')
+HASH_LENGTH = 10
+# --- End Configuration ---
+
+HASHED_NAME = re.compile(r'^(?P<stem>.+)\.[0-9a-f]{%d}(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def source_name(rel_path):
+    """Returns the source an asset path names: itself, or the original of a hashed copy."""
+    match = HASHED_NAME.match(rel_path)
+    return match.group('stem') + match.group('ext') if match else rel_path
+
+
+def find_assets(root_dir):
+    """Returns the source assets relative to root_dir, in ASSET_PATTERNS order."""
+    assets = []
+    for pattern in ASSET_PATTERNS:
+        for path in sorted(glob.glob(os.path.join(root_dir, pattern))):
+            rel = os.path.relpath(path, root_dir).replace('\\', '/')
+            if (os.path.isfile(path) and rel.lower().endswith(ASSET_EXTENSIONS)
+                    and not HASHED_NAME.match(rel) and rel not in assets):
+                assets.append(rel)
+    return assets
+
+
+def find_pages(root_dir):
+    """Returns the pages to rewrite, skipping page templates."""
+    pages = []
+    for pattern in PAGE_PATTERNS:
+        for path in sorted(glob.glob(os.path.join(root_dir, pattern))):
+            name = os.path.basename(path)
+            if 'template' not in name and not name.startswith('_'):
+                pages.append(path)
+    return pages
+
+
+def map_url(url, base_dir, mapping):
+    """
+    Returns url, relative to base_dir (both relative to the root), pointing
+    at mapping[source] if it references a known asset or a hashed copy of
+    one. Other URLs are returned unchanged.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return url
+    path = urllib.parse.unquote(parts.path)
+    if path.startswith('/'):
+        target = posixpath.normpath(path.lstrip('/'))
+    else:
+        target = posixpath.normpath(posixpath.join(base_dir, path))
+    new_target = mapping.get(source_name(target))
+    if new_target is None or new_target == target:
+        return url
+    if path.startswith('/'):
+        new_path = '/' + new_target
+    else:
+        new_path = posixpath.relpath(new_target, base_dir or '.')
+    return urllib.parse.urlunsplit(('', '', urllib.parse.quote(new_path), parts.query, parts.fragment))
+
+
+def _map_css(css, base_dir, mapping):
+    return CSS_URL.sub(lambda m: f"url({m.group(1)}{map_url(m.group(2), base_dir, mapping)}{m.group(1)})", css)
+
+
+def _map_srcset(value, base_dir, mapping):
+    candidates = []
+    for candidate in value.split(','):
+        words = candidate.split()
+        if words:
+            words[0] = map_url(words[0], base_dir, mapping)
+        candidates.append(' '.join(words))
+    return ', '.join(candidates)
+
+
+def fingerprint_page(file_path, root_dir, mapping):
+    """
+    Worker entry point: points one page's references at the names in mapping.
+    Returns True if the page changed.
+    """
+    base_dir = os.path.relpath(os.path.dirname(file_path), root_dir).replace('\\', '/')
+    base_dir = '' if base_dir == '.' else base_dir
+
+    def replace(name, value, quote):
+        if name not in REFERENCE_ATTRIBUTES or '{{' in value:
+            return value
+        if name == 'srcset':
+            return _map_srcset(value, base_dir, mapping)
+        if name == 'style':
+            return _map_css(value, base_dir, mapping)
+        return map_url(value, base_dir, mapping)
+
+    def replace_style_block(raw, tag):
+        return _map_css(raw, base_dir, mapping) if tag == 'style' else raw
+
+    try:
+        if rewrite_file(file_path, on_start_tag=lambda raw, tag: replace_attribute_values(raw, replace),
+                        on_raw_text=replace_style_block):
+            print(f"Updated: {os.path.relpath(file_path, root_dir)}")
+            return True
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
+    return False
+
+
+def hashed_copy(rel_path, data):
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def fingerprint_assets(root_dir):
+    """
+    Writes the hashed copies of every asset. Returns the manifest,
+    {source path: hashed path}, relative to root_dir.
+    """
+    manifest = {}
+    for rel in find_assets(root_dir):
+        with open(os.path.join(root_dir, rel), 'rb') as f:
+            data = f.read()
+        if rel.endswith('.css'):
+            # Point url()s at the hashed images, which changes the stylesheet's own hash
+            data = _map_css(data.decode('utf-8'), posixpath.dirname(rel), manifest).encode('utf-8')
+        manifest[rel] = hashed_copy(rel, data)
+        if write_if_changed(os.path.join(root_dir, manifest[rel]), data):
+            print(f"Wrote {manifest[rel]}")
+    return manifest
+
+
+def load_manifest(manifest_path):
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable asset manifest {manifest_path}: {e}")
+    return {}
+
+
+def main(root_dir=ROOT_DIR, jobs=1, revert=False):
+    manifest_path = os.path.join(root_dir, os.path.relpath(MANIFEST_PATH, ROOT_DIR))
+    previous = load_manifest(manifest_path)
+    pages = find_pages(root_dir)
+
+    if revert:
+        print(f"Pointing {len(pages)} page(s) back at the source assets...")
+        mapping = {source: source for source in find_assets(root_dir)}
+        results = run_and_report(fingerprint_page, [(path, root_dir, mapping) for path in pages], jobs)
+        print(f"...Updated {sum(1 for r in results if r.value)} page(s).")
+        return
+
+    print("Fingerprinting assets...")
+    manifest = fingerprint_assets(root_dir)
+    write_if_changed(manifest_path, json.dumps(manifest, indent=1, sort_keys=True) + '\n')
+
+    print(f"Rewriting references in {len(pages)} page(s)...")
+    results = run_and_report(fingerprint_page, [(path, root_dir, manifest) for path in pages], jobs)
+
+    removed = 0
+    for stale in sorted(set(previous.values()) - set(manifest.values())):
+        if remove_file(os.path.join(root_dir, stale)):
+            print(f"Removed stale copy {stale}")
+            removed += 1
+    print(f"...Fingerprinted {len(manifest)} asset(s), updated "
+          f"{sum(1 for r in results if r.value)} page(s), removed {removed} stale copies.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy assets to content-hashed names and point the pages at them.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    parser.add_argument('--revert', action='store_true', help="Point the pages back at the unhashed source assets.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(os.path.abspath(args.root), args.jobs, args.revert)
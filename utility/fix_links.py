@@ -1,66 +1,102 @@
 #!/usr/bin/env python3
 import os
-import re
+import argparse
+
+from stream_rewrite import replace_attribute_values, rewrite_file, rewrite_text
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, record_error, set_report
+from manifest import add_incremental_argument, run_incremental, source_hash
+from site_io import add_write_mode_arguments, set_write_mode
 
 # The root directory of your portfolio
 # The script assumes it's running from the same directory as the 'writing' folder.
 ROOT_DIR = os.getcwd() 
 WRITING_DIR = os.path.join(ROOT_DIR, 'writing')
 
-# Patterns to find and replace.
+# Attributes to fix.
 # We're looking for hrefs and srcs that start with '../' but not '../../'
 # This is a simple but effective way to target the incorrect paths.
-patterns_to_fix = {
-    # For links like href="../index.html" or href="../article.css"
-    re.compile(r'href="\.\./(?!(\.\./))([^"]*)"'): r'href="../../\2"',
-    # For images like src="../profile.png"
-    re.compile(r'src="\.\./(?!(\.\./))([^"]*)"'): r'src="../../\2"',
+ATTRIBUTES_TO_FIX = ('href', 'src')
+
+# Specific fixes applied after the '../' -> '../../' rewrite
+SPECIFIC_FIXES = {
+    # The profile image which is now in assets
+    ('src', '../../profile.png'): '../../assets/profile.png',
+    # The article.css which is now in the root
+    ('href', '../article.css'): '../../article.css',
 }
 
-def fix_article_paths(file_path):
+def fix_attribute_value(name, value, quote):
     """
-    Reads a file, replaces incorrect relative paths, and writes it back.
+    Returns the corrected value for a single attribute.
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        original_content = content
-        
-        # Apply all find-and-replace patterns
-        for pattern, replacement in patterns_to_fix.items():
-            content = pattern.sub(replacement, content)
+    # Only double-quoted href/src values are rewritten, as before
+    if name not in ATTRIBUTES_TO_FIX or quote != '"':
+        return value
+    # For links like href="../index.html" or images like src="../profile.png"
+    if value.startswith('../') and not value.startswith('../../'):
+        value = '../' + value
+    return SPECIFIC_FIXES.get((name, value), value)
 
-        # A specific fix for the profile image which is now in assets
-        content = content.replace('src="../../profile.png"', 'src="../../assets/profile.png"')
-        # A specific fix for the article.css which is now in the root
-        content = content.replace('href="../article.css"', 'href="../../article.css"')
+def fix_start_tag(raw_tag, name):
+    return replace_attribute_values(raw_tag, fix_attribute_value)
 
+def fix_article_paths_in_text(content):
+    """
+    Returns the content with incorrect relative paths replaced.
+    """
+    return rewrite_text(content, on_start_tag=fix_start_tag)
 
-        if content != original_content:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+def fix_article_paths(file_path):
+    """
+    Streams a file through the rewriter, replacing incorrect relative paths.
+    The file is only replaced if something changed.
+    """
+    try:
+        if rewrite_file(file_path, on_start_tag=fix_start_tag):
             print(f"Updated: {file_path}")
         else:
             print(f"No changes needed for: {file_path}")
 
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
 
-def main():
+def find_article_files(writing_dir=WRITING_DIR):
     """
-    Walks through the writing/ directory and fixes files in subdirectories.
+    Returns the HTML files in subdirectories of the writing/ directory.
     """
-    print("Starting to scan for article files to fix...")
+    file_paths = []
     # We walk through all directories and files in the 'writing' folder
-    for root, dirs, files in os.walk(WRITING_DIR):
+    for root, dirs, files in os.walk(writing_dir):
+        dirs.sort()
         # We only want to process files in subdirectories of 'writing'
-        if root != WRITING_DIR:
-            for file in files:
+        if root != writing_dir:
+            for file in sorted(files):
                 if file.endswith('.html'):
-                    full_path = os.path.join(root, file)
-                    fix_article_paths(full_path)
+                    file_paths.append(os.path.join(root, file))
+    return file_paths
+
+def main(jobs=1, incremental=False, writing_dir=WRITING_DIR):
+    """
+    Walks through the writing/ directory and fixes files in subdirectories.
+    """
+    print("Starting to scan for article files to fix...")
+    arg_tuples = [(path,) for path in find_article_files(writing_dir)]
+    if incremental:
+        run_incremental('fix_links', source_hash(__file__), fix_article_paths, arg_tuples, jobs, os.path.dirname(writing_dir))
+    else:
+        run_and_report(fix_article_paths, arg_tuples, jobs)
     print("...Finished fixing article links.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Fix relative links in article pages.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_incremental_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(args.jobs, args.incremental)
@@ -2,16 +2,41 @@
 import os
 import sys
 import re
-import feedparser
-from bs4 import BeautifulSoup
+import argparse
 from datetime import datetime
+from bs4 import CData, NavigableString, Tag
+
+from parsers import make_soup
+from feed_cache import load_entries
+from templates import load_template as load_compiled_template
+from build_site import CONTENT_DIR, extract_page, source_path_for
+from article_catalog import Catalog, update_page
+from substack_images import localize_images
+from parallel import add_jobs_argument, report_results, run_per_file
+from instrument import add_report_argument, set_report
+from site_io import add_write_mode_arguments, is_dry_run, set_write_mode, write_if_changed
 
 # --- Configuration ---
 SUBSTACK_URL = "https://harryhunter.substack.com"
+FEED_URL = f"{SUBSTACK_URL}/feed"
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 TEMPLATE_PATH = os.path.join(ROOT_DIR, 'writing', '_substack_template.html')
 OUTPUT_DIR = os.path.join(ROOT_DIR, 'writing', 'substack')
 WRITING_PAGE_PATH = os.path.join(ROOT_DIR, 'writing.html')
+# The list on writing.html that imported posts are added to (see article_catalog.LISTS)
+NEWSLETTER_SECTION = 'newsletter'
+# Whitelist of the tags (and their attributes) kept in an imported post
+ALLOWED_TAGS = {
+    'p': [], 'h3': [], 'h4': [], 'ul': [], 'ol': [], 'li': [],
+    'blockquote': [], 'em': [], 'strong': [], 'hr': [],
+    'figure': [],
+    'a': ['href', 'target', 'rel'],
+    'img': ['src', 'alt', 'height', 'width']
+}
+# Substack's subscription buttons, removed from posts
+SUBSCRIBE_WIDGET = re.compile("subscribe-widget")
+# The strings get_text() counts as text
+TEXT_TYPES = (NavigableString, CData)
 # --- End Configuration ---
 
 def slugify(text):
@@ -24,109 +49,202 @@ def slugify(text):
     text = text.strip('-')
     return text
 
+def _is_subscribe_widget(tag):
+    classes = tag.get('class')
+    if not classes:
+        return False
+    return SUBSCRIBE_WIDGET.search(' '.join(classes) if isinstance(classes, list) else classes) is not None
+
+
+def _sanitize(soup, tag, wrap_links):
+    """
+    Cleans the descendants of tag in place, depth first, in a single walk.
+    Returns (has_text, has_img) for them, after cleaning. Linked images are
+    wrapped in a <figure> if wrap_links is set, i.e. outside figures and links.
+    """
+    has_text = has_img = False
+    for child in list(tag.contents):
+        if not isinstance(child, Tag):
+            if type(child) in TEXT_TYPES and child.strip():
+                has_text = True
+            continue
+        # Remove Substack-specific elements like the subscription buttons
+        if _is_subscribe_widget(child):
+            child.decompose()
+            continue
+
+        name = child.name
+        child_text, child_img = _sanitize(soup, child, wrap_links and name not in ('figure', 'a'))
+        # Remove empty paragraphs
+        if name == 'p' and not child_text and not child_img:
+            child.decompose()
+            continue
+        has_text = has_text or child_text
+        has_img = has_img or child_img or name == 'img'
+
+        if name not in ALLOWED_TAGS:
+            # Unwrap the tag if it's not allowed, keeping its (already cleaned) content
+            child.unwrap()
+            continue
+        allowed_attrs = ALLOWED_TAGS[name]
+        for attr in list(child.attrs):
+            if attr not in allowed_attrs:
+                del child[attr]
+        if name == 'a':
+            # Ensure external links open in a new tab
+            child['target'] = '_blank'
+            child['rel'] = 'noopener noreferrer'
+            # Wrap linked images from Substack in a <figure> tag for consistent styling
+            if child_img and wrap_links:
+                child.wrap(soup.new_tag('figure'))
+    return has_text, has_img
+
+
 def clean_html(html_content):
     """
     Cleans the HTML content from Substack's RSS feed to match the site's style.
-    """
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    # Remove Substack-specific elements like the subscription buttons
-    for element in soup.find_all(class_=re.compile("subscribe-widget")):
-        element.decompose()
-
-    # Remove empty paragraphs
-    for p in soup.find_all('p'):
-        if not p.get_text(strip=True) and not p.find_all('img'):
-            p.decompose()
-
-    # Wrap linked images from Substack in a <figure> tag for consistent styling
-    for a_tag in soup.find_all('a'):
-        if a_tag.find('img') and not a_tag.find_parent('figure'):
-            a_tag.wrap(soup.new_tag('figure'))
-
-    # Whitelist of allowed tags and their attributes
-    allowed_tags = {
-        'p': [], 'h3': [], 'h4': [], 'ul': [], 'ol': [], 'li': [],
-        'blockquote': [], 'em': [], 'strong': [], 'hr': [],
-        'figure': [],
-        'a': ['href', 'target', 'rel'],
-        'img': ['src', 'alt', 'height', 'width']
-    }
-
-    # Clean all tags
-    for tag in soup.find_all(True):
-        if tag.name not in allowed_tags:
-            # Unwrap the tag if it's not allowed, keeping its content
-            tag.unwrap()
-        else:
-            # Remove all attributes except the whitelisted ones
-            allowed_attrs = allowed_tags[tag.name]
-            for attr in list(tag.attrs):
-                if attr not in allowed_attrs:
-                    del tag[attr]
-
-    # Ensure external links open in a new tab
-    for a_tag in soup.find_all('a'):
-        a_tag['target'] = '_blank'
-        a_tag['rel'] = 'noopener noreferrer'
 
+    Applies every rule in one walk over the tree, and produces the same
+    markup as the original one pass per rule (clean_html_reference.py).
+    """
+    soup = make_soup(html_content, fragment=True)
+    _sanitize(soup, soup, True)
     # Prettify the HTML to make it readable
     return soup.prettify()
 
-def add_to_writing_page(article_title, article_path, publish_date):
+
+def add_articles_to_writing_page(articles):
     """
-    Adds a link to the new article to the main writing.html page.
+    Adds several new articles to the catalog and re-renders the lists on
+    writing.html once. articles is a list of
+    (article_title, article_path, publish_date, source_url, summary) tuples.
+    Re-imported posts replace their entry rather than being listed twice.
     """
-    print("Adding link to writing.html...")
+    print("Adding links to writing.html...")
     try:
-        with open(WRITING_PAGE_PATH, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'html.parser')
-
-        # Find the "Newsletter" section and its article list
-        newsletter_header = soup.find('h3', string=re.compile(r'\s*Newsletter\s*'))
-        if not newsletter_header:
-            print("Could not find '<h3>Newsletter</h3>' section in writing.html. Skipping update.")
+        catalog = Catalog()
+        for article_title, article_path, publish_date, source_url, summary in articles:
+            entry = {
+                'section': NEWSLETTER_SECTION,
+                'title': article_title,
+                'date': publish_date.strftime('%Y-%m-%d'),
+                'path': os.path.relpath(article_path, ROOT_DIR).replace('\\', '/'),
+                'summary': summary,
+                'source_url': source_url,
+            }
+            if not catalog.add(entry):
+                print(f"Already listed, skipping: {entry['path']}")
+        if not catalog.changed:
             return
+        catalog.save()
 
-        article_list = newsletter_header.find_next_sibling('ul', class_='article-list')
-        if not article_list:
-            # If the list doesn't exist, create it after the newsletter paragraph
-            p_tag = newsletter_header.find_next_sibling('p')
-            article_list = soup.new_tag('ul', **{'class': 'article-list'})
-            p_tag.insert_after(article_list)
+        # Pages built from _content/ render the lists at build time, but keep the source in step too
+        for path in (WRITING_PAGE_PATH, source_path_for(WRITING_PAGE_PATH, ROOT_DIR)):
+            if os.path.exists(path):
+                update_page(path, catalog)
+
+    except Exception as e:
+        print(f"Error updating writing.html: {e}")
+
+def add_to_writing_page(article_title, article_path, publish_date, source_url, summary=''):
+    """
+    Adds a link to the new article to the main writing.html page.
+    """
+    add_articles_to_writing_page([(article_title, article_path, publish_date, source_url, summary)])
+
+def fetch_entries(feed_url=None):
+    """
+    Fetches the RSS feed through the on-disk cache and returns its entries
+    indexed by post link, or None if the feed couldn't be parsed.
+    """
+    print("Fetching RSS feed...")
+    return load_entries(feed_url or FEED_URL)
 
-        # Create the new list item
-        new_li = soup.new_tag('li', **{'class': 'article-item'})
-        new_li.string = f"[{publish_date.strftime('%Y-%m-%d')}] "
-        new_a = soup.new_tag('a', href=os.path.relpath(article_path, ROOT_DIR).replace('\\', '/'))
-        new_a.string = article_title
-        new_li.append(new_a)
+def entry_date(entry):
+    return datetime(*entry.published_parsed[:6])
 
-        article_list.insert(0, new_li) # Prepend to the top of the list
+def entry_summary(entry):
+    """
+    Returns the post's subtitle as plain text, or '' if the feed has none.
+    """
+    summary = entry.get('summary') or ''
+    # feedparser falls back to the post body when the item has no <description>
+    if summary == entry_body(entry):
+        return ''
+    return ' '.join(make_soup(summary, fragment=True).get_text().split()) if summary else ''
 
-        with open(WRITING_PAGE_PATH, 'w', encoding='utf-8') as f:
-            f.write(str(soup.prettify()))
+def entry_body(entry):
+    """
+    Returns the raw HTML body of an RSS entry, or None if it has no content.
+    """
+    if 'content' in entry and len(entry.content) > 0:
+        return entry.content[0].value
+    return None
 
+def clean_post(post_url, raw_body):
+    """
+    Worker entry point for bulk imports: cleans one post body. post_url
+    labels the result in the report and names the post if it can't be cleaned.
+    """
+    try:
+        return clean_html(raw_body)
     except Exception as e:
-        print(f"Error updating writing.html: {e}")
+        print(f"Error processing {post_url}: {e}")
+        raise
+
+def load_template():
+    return load_compiled_template(TEMPLATE_PATH)
 
-def main(post_url):
+def write_article(entry, cleaned_body, template):
     """
-    Main function to fetch, process, and create the article file.
+    Renders the template for an entry and writes the article file. When the
+    site is built from _content/, the article's source is written there too.
+    Returns the path of the new file.
     """
-    print("Fetching RSS feed...")
-    feed_url = f"{SUBSTACK_URL}/feed"
-    feed = feedparser.parse(feed_url)
+    # --- Extract Data ---
+    title = entry.title
+    link = entry.link
+    
+    # Format date as "Month Day, Year"
+    pub_date_parsed = entry_date(entry)
+    pub_date_formatted = pub_date_parsed.strftime('%B %d, %Y')
+
+    # Fill in the placeholders
+    final_content = template.render({
+        'ARTICLE_TITLE': title,
+        'SUBSTACK_URL': link,
+        'PUBLISH_DATE': pub_date_formatted,
+        'ARTICLE_BODY': cleaned_body,
+    })
+
+    # Create filename
+    date_prefix = pub_date_parsed.strftime('%Y-%m-%d')
+    slug = slugify(title)
+    filename = f"{date_prefix}_{slug}.html"
+    output_path = os.path.join(OUTPUT_DIR, filename)
 
-    if feed.bozo:
-        print(f"Error parsing feed: {feed.bozo_exception}")
+    if write_if_changed(output_path, final_content):
+        sync_source(output_path)
+    return output_path
+
+def sync_source(page_path):
+    """
+    If the site is built from _content/ (see build_site.py), copies a page
+    written here back into its source so the next build keeps the change.
+    """
+    # In --dry-run / --diff mode the page on disk is still the old one
+    if os.path.isdir(os.path.join(ROOT_DIR, CONTENT_DIR)) and not is_dry_run():
+        extract_page(page_path, ROOT_DIR, force=True)
+
+def main(post_url, feed_url=None, keep_remote_images=False):
+    """
+    Main function to fetch, process, and create the article file.
+    """
+    entries = fetch_entries(feed_url)
+    if entries is None:
         return
 
-    target_entry = None
-    for entry in feed.entries:
-        if entry.link == post_url:
-            target_entry = entry
-            break
+    target_entry = entries.get(post_url)
 
     if not target_entry:
         print(f"Could not find post with URL: {post_url}")
@@ -134,68 +252,116 @@ def main(post_url):
 
     print(f"Found post: '{target_entry.title}'")
 
-    # --- Extract Data ---
-    title = target_entry.title
-    link = target_entry.link
-    
-    # Format date as "Month Day, Year"
-    pub_date_parsed = datetime(*target_entry.published_parsed[:6])
-    pub_date_formatted = pub_date_parsed.strftime('%B %d, %Y')
-    
     # Get the main content
-    raw_body = ""
-    if 'content' in target_entry and len(target_entry.content) > 0:
-        raw_body = target_entry.content[0].value
-    else:
+    raw_body = entry_body(target_entry)
+    if raw_body is None:
         print("Could not find content in the RSS entry.")
         return
 
     # --- Clean and Prepare ---
     print("Cleaning HTML content...")
     cleaned_body = clean_html(raw_body)
+    if not keep_remote_images:
+        cleaned_body = localize_images([cleaned_body], OUTPUT_DIR)[0]
 
     # --- Generate File ---
     print("Generating new HTML file...")
     try:
-        with open(TEMPLATE_PATH, 'r', encoding='utf-8') as f:
-            template_content = f.read()
+        template = load_template()
     except FileNotFoundError:
         print(f"Error: Template file not found at {TEMPLATE_PATH}")
         return
 
-    # Replace placeholders
-    final_content = template_content.replace('{{ARTICLE_TITLE}}', title)
-    final_content = final_content.replace('{{SUBSTACK_URL}}', link)
-    final_content = final_content.replace('{{PUBLISH_DATE}}', pub_date_formatted)
-    final_content = final_content.replace('{{ARTICLE_BODY}}', cleaned_body)
-
-    # Create filename
-    date_prefix = pub_date_parsed.strftime('%Y-%m-%d')
-    slug = slugify(title)
-    filename = f"{date_prefix}_{slug}.html"
-    output_path = os.path.join(OUTPUT_DIR, filename)
-
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(final_content)
+    output_path = write_article(target_entry, cleaned_body, template)
 
     print("\nSuccess!")
     print(f"New article created at: {output_path}")
     print("\nNext steps:")
-    add_to_writing_page(title, output_path, pub_date_parsed)
+    add_to_writing_page(target_entry.title, output_path, entry_date(target_entry),
+                        target_entry.link, entry_summary(target_entry))
     print(f"1. Review the new article: {output_path}")
     print(f"2. Review the updated writing page: {WRITING_PAGE_PATH}")
     print("3. Commit and push the changes if everything looks correct.")
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python utility/import_substack.py <substack_post_url>")
-        sys.exit(1)
+def bulk_import(since=None, until=None, jobs=1, feed_url=None, keep_remote_images=False):
+    """
+    Imports every post in the feed (optionally only those published between
+    since and until, inclusive) in one run: the feed is fetched and parsed
+    once, the post bodies are cleaned in parallel and writing.html is
+    updated in a single write.
+    """
+    feed_entries = fetch_entries(feed_url)
+    if feed_entries is None:
+        return
+
+    entries = []
+    for entry in feed_entries.values():
+        published = entry_date(entry).date()
+        if (since and published < since) or (until and published > until):
+            continue
+        if entry_body(entry) is None:
+            print(f"Could not find content for '{entry.title}', skipping.")
+            continue
+        entries.append(entry)
+
+    if not entries:
+        print("No posts to import.")
+        return
+    print(f"Importing {len(entries)} post(s)...")
+
+    try:
+        template = load_template()
+    except FileNotFoundError:
+        print(f"Error: Template file not found at {TEMPLATE_PATH}")
+        return
 
+    print("Cleaning HTML content...")
+    results = run_per_file(clean_post, [(entry.link, entry_body(entry)) for entry in entries], jobs)
+    report_results(results)
+
+    cleaned = [(entry, result.value) for entry, result in zip(entries, results) if not result.error]
+    if not keep_remote_images:
+        # One concurrent download for every image across the batch
+        bodies = localize_images([body for _, body in cleaned], OUTPUT_DIR)
+        cleaned = [(entry, body) for (entry, _), body in zip(cleaned, bodies)]
+
+    print("Generating new HTML files...")
+    articles = []
+    for entry, cleaned_body in cleaned:
+        output_path = write_article(entry, cleaned_body, template)
+        print(f"New article created at: {output_path}")
+        articles.append((entry.title, output_path, entry_date(entry), entry.link, entry_summary(entry)))
+
+    add_articles_to_writing_page(articles)
+    print(f"\nImported {len(articles)} post(s). Review the new articles and {WRITING_PAGE_PATH} before committing.")
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+if __name__ == "__main__":
     # Before running, you may need to install dependencies:
     # pip install feedparser beautifulsoup4
-    
-    post_url_arg = sys.argv[1]
-    main(post_url_arg)
\ No newline at end of file
+    # Optionally, for faster parsing: pip install lxml
+    parser = argparse.ArgumentParser(
+        description="Import posts from the Substack RSS feed.",
+        usage="python utility/import_substack.py <substack_post_url> | --all [--since YYYY-MM-DD] [--until YYYY-MM-DD]")
+    parser.add_argument('post_url', nargs='?', help="URL of the post to import.")
+    parser.add_argument('--all', action='store_true', help="Import every post in the feed.")
+    parser.add_argument('--since', type=_parse_date, help="With --all, only posts published on or after this date.")
+    parser.add_argument('--until', type=_parse_date, help="With --all, only posts published on or before this date.")
+    parser.add_argument('--feed-url', default=FEED_URL, help="RSS feed to import from (default: %(default)s).")
+    parser.add_argument('--keep-remote-images', action='store_true', help="Leave <img> tags pointing at Substack's CDN.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+
+    if args.all:
+        bulk_import(args.since, args.until, args.jobs, args.feed_url, args.keep_remote_images)
+    elif args.post_url:
+        main(args.post_url, args.feed_url, args.keep_remote_images)
+    else:
+        parser.print_usage()
+        sys.exit(1)
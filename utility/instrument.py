@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Per-file timings and run reports for the utilities.
+
+With --report PATH (or the SITE_REPORT environment variable, which is how
+worker processes see it) every file processed through parallel.run_per_file()
+gets a record of where its time went and what happened to it:
+
+    {"type": "file", "tool": "sync_headers", "path": "writing.html",
+     "status": "changed", "seconds": 0.0123, "bytes_in": 10240, "bytes_out": 10212,
+     "phases": {"read": 0.0001, "parse": 0.0080, "serialize": 0.0030, "write": 0.0002, "other": 0.0010}}
+
+Phases are recorded by the shared helpers (parsers.make_soup() times read
+and parse, site_io.write_if_changed() times write and counts bytes out,
+stream_rewrite.rewrite_file() times transform) and by the tools' own
+phase() blocks; the time not covered by any phase is "other". Nested phases
+are exclusive: time spent parsing inside a transform block counts as parse
+only. Status is "changed" if the file was (or in a dry run would be)
+written, "error" if the call raised or the tool reported an error, and
+"skipped" otherwise.
+
+Records are appended to the report as JSON lines, followed by one
+{"type": "run", ...} line per run, and a summary of the slowest files and
+phases is printed when the run ends. An existing report can be summarized
+again with:
+
+    python utility/instrument.py report.jsonl [--slowest N]
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# --- Configuration ---
+ENV_VAR = 'SITE_REPORT'
+SLOWEST_FILES = 10
+# --- End Configuration ---
+
+# The record of the file being processed in this process, and its open phases
+_current = None
+_stack = []
+# Records collected by this process for the end-of-run summary
+_records = []
+_run_started = None
+
+
+def enabled():
+    return bool(os.environ.get(ENV_VAR))
+
+
+def add_report_argument(parser):
+    """
+    Adds the shared --report option to an argparse parser.
+    Call set_report() with the parsed arguments.
+    """
+    parser.add_argument('--report', metavar='PATH',
+                        help="Append per-file timings to a JSONL run report and print a summary.")
+
+
+def set_report(args):
+    global _run_started
+    if getattr(args, 'report', None):
+        os.environ[ENV_VAR] = os.path.abspath(args.report)
+    if enabled() and _run_started is None:
+        _run_started = (time.time(), time.perf_counter())
+        atexit.register(finish_run)
+
+
+def tool_name():
+    return os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'python'
+
+
+def begin(path):
+    """Starts the record for one file."""
+    global _current
+    try:
+        bytes_in = os.path.getsize(path)
+    except (OSError, TypeError):
+        bytes_in = 0
+    _current = {'path': path, 'status': 'skipped', 'bytes_in': bytes_in, 'bytes_out': 0,
+                'phases': {}, 'error': None, 'started': time.perf_counter()}
+    _stack.clear()
+
+
+def end(error=None):
+    """Finishes the current record and returns it (None when not recording)."""
+    global _current
+    record = _current
+    if record is None:
+        return None
+    _current = None
+    seconds = time.perf_counter() - record.pop('started')
+    phases = record['phases']
+    other = seconds - sum(phases.values())
+    if other > 0:
+        phases['other'] = other
+    record['phases'] = {name: round(value, 6) for name, value in phases.items()}
+    record['seconds'] = round(seconds, 6)
+    if error:
+        record['status'] = 'error'
+        record['error'] = record['error'] or error.splitlines()[0]
+    return record
+
+
+@contextmanager
+def phase(name):
+    """
+    Times a block of work as the given phase of the current file.
+    """
+    if _current is None:
+        yield
+        return
+    frame = [time.perf_counter(), 0.0]
+    _stack.append(frame)
+    try:
+        yield
+    finally:
+        _stack.pop()
+        elapsed = time.perf_counter() - frame[0]
+        if _current is not None:
+            _current['phases'][name] = _current['phases'].get(name, 0.0) + elapsed - frame[1]
+        if _stack:
+            _stack[-1][1] += elapsed
+
+
+def add_bytes_out(count):
+    if _current is not None:
+        _current['bytes_out'] += count
+
+
+def mark_changed():
+    if _current is not None and _current['status'] != 'error':
+        _current['status'] = 'changed'
+
+
+def record_error(error):
+    """
+    Marks the current file as failed, for tools that catch their own exceptions.
+    """
+    if _current is not None:
+        _current['status'] = 'error'
+        _current['error'] = f"{error.__class__.__name__}: {error}" if isinstance(error, Exception) else str(error)
+
+
+def log_results(func, results):
+    """
+    Appends the timing records of a batch of FileResults to the report.
+    """
+    if not enabled():
+        return
+    tool = f"{tool_name()}:{func.__name__}"
+    lines = []
+    for result in results:
+        record = result.timing
+        if record is None:
+            continue
+        record = dict(record, type='file', tool=tool, path=os.path.relpath(str(record['path'])).replace('\\', '/'))
+        _records.append(record)
+        lines.append(json.dumps(record, sort_keys=True))
+    if lines:
+        with open(os.environ[ENV_VAR], 'a', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines))
+
+
+def summarize(records, slowest=SLOWEST_FILES, seconds=None):
+    """
+    Prints the summary table for a list of file records.
+    """
+    if not records:
+        print("Run report: no files were processed.")
+        return
+    statuses = {}
+    phases = {}
+    for record in records:
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+        for name, value in record['phases'].items():
+            phases[name] = phases.get(name, 0.0) + value
+    busy = sum(record['seconds'] for record in records)
+    wall = f" in {seconds:.2f}s" if seconds is not None else ''
+    print(f"\nRun report: {len(records)} file(s){wall}, {busy:.2f}s of per-file work; "
+          + ', '.join(f"{count} {status}" for status, count in sorted(statuses.items())) + '.')
+    print(f"  bytes in {sum(r['bytes_in'] for r in records):,}, out {sum(r['bytes_out'] for r in records):,}")
+
+    print(f"  {'phase':<12}{'seconds':>10}{'share':>8}")
+    for name, value in sorted(phases.items(), key=lambda item: -item[1]):
+        print(f"  {name:<12}{value:>10.3f}{value / busy if busy else 0:>8.0%}")
+
+    print(f"  Slowest {min(slowest, len(records))} file(s):")
+    for record in sorted(records, key=lambda r: -r['seconds'])[:slowest]:
+        top = max(record['phases'].items(), key=lambda item: item[1], default=('-', 0))
+        print(f"  {record['seconds']:>8.3f}s  {record['status']:<8} {top[0]:<10} {record['path']}")
+
+    failed = [record for record in records if record['status'] == 'error']
+    for record in failed:
+        print(f"  error: {record['path']}: {record.get('error')}")
+
+
+def finish_run():
+    """
+    Writes the run line to the report and prints the summary (at exit).
+    """
+    started, started_counter = _run_started
+    seconds = time.perf_counter() - started_counter
+    run = {
+        'type': 'run', 'tool': tool_name(), 'argv': sys.argv[1:],
+        'started': datetime.fromtimestamp(started, timezone.utc).isoformat(timespec='seconds'),
+        'seconds': round(seconds, 6), 'files': len(_records),
+    }
+    with open(os.environ[ENV_VAR], 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run, sort_keys=True) + '\n')
+    summarize(_records, seconds=seconds)
+    print(f"  Report appended to {os.path.relpath(os.environ[ENV_VAR])}")
+
+
+def load_report(path):
+    """Returns the (file records, run records) of a JSONL report."""
+    files, runs = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                (runs if record.get('type') == 'run' else files).append(record)
+    return files, runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a JSONL run report.")
+    parser.add_argument('report', help="Report written with --report.")
+    parser.add_argument('--slowest', type=int, default=SLOWEST_FILES, help="Number of slowest files to list.")
+    args = parser.parse_args()
+    files, runs = load_report(args.report)
+    for run in runs:
+        print(f"{run['started']}  {run['tool']} {' '.join(run['argv'])}: {run['files']} file(s) in {run['seconds']:.2f}s")
+    summarize(files, args.slowest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+A persistent manifest of which files each utility has already processed.
+
+For every file the manifest stores its content hash and, per tool, the hash
+of the content the tool last left behind together with a hash of the tool's
+configuration (e.g. the header menu items or the GTag ID, plus the script's
+own source). A file is only handed to a tool again if its content or the
+tool's configuration has changed since the last run.
+
+To avoid re-hashing the whole tree, the size and mtime of each file are kept
+alongside its hash and the hash is only recomputed when those change.
+"""
+import os
+import json
+import hashlib
+
+from parallel import run_and_report
+from site_io import is_dry_run
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MANIFEST_PATH = os.path.join(ROOT_DIR, '.site_manifest.json')
+# --- End Configuration ---
+
+
+def content_hash(data):
+    """
+    Returns the sha256 hex digest of a str or bytes value.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return content_hash(f.read())
+
+
+def config_hash(*parts):
+    """
+    Returns a stable hash of the given configuration values (dicts, lists,
+    strings...). Dict ordering matters for things like menu items, so dicts
+    are hashed in their insertion order.
+    """
+    return content_hash(json.dumps(parts, default=str))
+
+
+def source_hash(*module_files):
+    """
+    Returns a hash of the given source files, so changing a script's rules
+    invalidates what it processed before.
+    """
+    return config_hash(*[file_hash(path) for path in module_files])
+
+
+class Manifest:
+    """
+    The on-disk manifest, keyed by path relative to the root directory.
+    """
+
+    def __init__(self, path=MANIFEST_PATH, root_dir=ROOT_DIR):
+        self.path = path
+        self.root_dir = root_dir
+        self.files = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.files = json.load(f).get('files', {})
+            except (ValueError, OSError) as e:
+                print(f"Ignoring unreadable manifest {path}: {e}")
+
+    def _key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.root_dir).replace('\\', '/')
+
+    def current_hash(self, file_path):
+        """
+        Returns the content hash of a file, reusing the stored hash when the
+        size and mtime are unchanged.
+        """
+        entry = self.files.setdefault(self._key(file_path), {'tools': {}})
+        stat = os.stat(file_path)
+        if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('sha256'):
+            return entry['sha256']
+        entry['sha256'] = file_hash(file_path)
+        entry['size'] = stat.st_size
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return entry['sha256']
+
+    def is_fresh(self, file_path, tool, digest):
+        """
+        True if the tool already processed this exact content with this configuration.
+        """
+        entry = self.files.get(self._key(file_path))
+        if not entry or tool not in entry.get('tools', {}):
+            return False
+        seen_hash, seen_digest = entry['tools'][tool]
+        return seen_digest == digest and seen_hash == self.current_hash(file_path)
+
+    def record(self, file_path, tool, digest):
+        """
+        Records that the tool has processed the file as it is now on disk.
+        """
+        file_hash_now = self.current_hash(file_path)
+        self.files[self._key(file_path)]['tools'][tool] = [file_hash_now, digest]
+
+    def save(self):
+        # Drop entries for files that no longer exist
+        self.files = {key: entry for key, entry in self.files.items()
+                      if os.path.exists(os.path.join(self.root_dir, key))}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def add_incremental_argument(parser):
+    """
+    Adds the shared --incremental option to an argparse parser.
+    """
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help=f"Skip files unchanged since the last run (tracked in {os.path.basename(MANIFEST_PATH)}).")
+
+
+def run_incremental(tool, digest, func, arg_tuples, jobs=1, root_dir=ROOT_DIR):
+    """
+    Like parallel.run_and_report(), but skips files the manifest says are
+    fresh for this tool and configuration, and records the processed files
+    afterwards. The first element of each argument tuple is the file path.
+    """
+    manifest = Manifest(os.path.join(root_dir, os.path.basename(MANIFEST_PATH)), root_dir)
+    arg_tuples = list(arg_tuples)
+    stale = [args for args in arg_tuples if not manifest.is_fresh(args[0], tool, digest)]
+
+    skipped = len(arg_tuples) - len(stale)
+    if skipped:
+        print(f"Skipping {skipped} unchanged file(s).")
+
+    results = run_and_report(func, stale, jobs)
+    if is_dry_run():
+        # Nothing was written, so nothing is up to date yet
+        return results
+
+    for result in results:
+        # Leave files that blew up unrecorded so they are retried next time.
+        failed = result.error is not None or (result.timing or {}).get('status') == 'error'
+        if not failed and os.path.exists(result.path):
+            manifest.record(result.path, tool, digest)
+    manifest.save()
+    return results
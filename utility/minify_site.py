@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Builds a minified, precompressed copy of the site in _dist/.
+
+The utilities write pages through BeautifulSoup's prettify(), which puts
+every tag on its own indented line, inline elements included: a good part
+of each page is whitespace. This script copies every published file to
+_dist/ (which Jekyll ignores, like every underscore directory) and on the way:
+- minifies HTML: comments are dropped, runs of whitespace collapse to one
+  character, and whitespace a browser wouldn't render (next to block-level
+  elements, or right after another space) is removed; <pre> and <textarea>
+  are left alone,
+- minifies CSS, in stylesheets and <style> blocks, with bundle_css's minifier,
+- writes .gz (and .br, when the brotli package is installed) siblings for
+  text files, for servers that send precompressed files as they are.
+
+The Pages workflow runs it on Jekyll's output after the build
+(--root _site --output _dist --no-compress) and uploads _dist/ instead of
+_site/. GitHub Pages compresses responses itself and doesn't serve .gz/.br
+siblings, so the workflow skips them: they are only useful on a host that
+serves precompressed files.
+
+Each file is processed in a worker; its result is cached by content hash
+in .minify_cache.json next to the output directory, so unchanged files are
+neither minified nor compressed again on the next run. Files removed from
+the site are removed from the output as well.
+
+Usage:
+    python utility/minify_site.py [--jobs N] [--root DIR] [--output DIR] [--no-compress]
+"""
+import os
+import re
+import json
+import gzip
+import argparse
+
+from stream_rewrite import COMMENT, DECL, END_TAG, RAW_TEXT, START_TAG, TEXT, iter_tokens
+from bundle_css import minify_css
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, phase, set_report
+from manifest import config_hash, file_hash, source_hash
+from site_io import add_write_mode_arguments, is_dry_run, remove_file, set_write_mode, write_if_changed
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, without it only .gz files are written
+    brotli = None
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+OUTPUT_DIR = os.path.join(ROOT_DIR, '_dist')
+CACHE_PATH = os.path.join(ROOT_DIR, '.minify_cache.json')
+# Not published (underscore and dot files and directories are skipped too)
+EXCLUDE = {'utility', 'Gemfile', 'Gemfile.lock', 'node_modules', 'vendor'}
+COMPRESS_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg', '.xml', '.txt')
+# Smaller files aren't worth a compressed sibling
+MIN_COMPRESS_SIZE = 256
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# Elements a browser lays out as blocks: whitespace next to their tags isn't
+# rendered. <li> is missing on purpose, as the nav menu displays it inline.
+BLOCK_ELEMENTS = {
+    'html', 'head', 'body', 'header', 'footer', 'main', 'nav', 'section', 'article', 'aside', 'div', 'p',
+    'blockquote', 'pre', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'br', 'ul', 'ol', 'dl', 'dt', 'dd',
+    'figure', 'figcaption', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'td', 'th', 'caption', 'form',
+    'fieldset', 'legend', 'details', 'summary', 'address',
+}
+# Inline elements that don't render anything of their own around their text,
+# so a space just before one and a space just inside it collapse into one
+INLINE_ELEMENTS = {'a', 'abbr', 'b', 'cite', 'code', 'em', 'i', 'label', 'mark', 'q', 's', 'small', 'span',
+                   'strong', 'sub', 'sup', 'time', 'u'}
+# Elements that aren't rendered at all: whitespace on either side of them
+# collapses as if they weren't there
+HIDDEN_ELEMENTS = {'base', 'link', 'meta', 'noscript', 'script', 'source', 'style', 'template', 'title'}
+# Whitespace is significant inside these
+PRESERVE_ELEMENTS = {'pre', 'textarea'}
+# --- End Configuration ---
+
+WHITESPACE = re.compile(r'[ \t\n\r\f]+')
+SPACE_CHARS = ' \t\n\r\f'
+
+
+def _collapse(match):
+    return '\n' if '\n' in match.group(0) else ' '
+
+
+def _is_block_boundary(kind, name):
+    return kind == DECL or (kind in (START_TAG, END_TAG) and name in BLOCK_ELEMENTS)
+
+
+def minify_html(content):
+    """
+    Returns content with insignificant whitespace and comments removed.
+    The markup is otherwise written out token by token as it was read.
+    """
+    out = []
+    text = []
+    # Whether leading whitespace would collapse away: after a block boundary
+    # (the start of the document counts as one) or a rendered space
+    after_space = True
+    preserve = 0
+    # Whitespace between the elements in <head> is never rendered
+    in_head = False
+
+    def flush_text(before_block):
+        nonlocal after_space
+        value = ''.join(text)
+        text.clear()
+        if preserve:
+            out.append(value)
+            after_space = False
+            return
+        value = WHITESPACE.sub(_collapse, value)
+        if in_head and not value.strip(SPACE_CHARS):
+            return
+        if after_space:
+            value = value.lstrip(SPACE_CHARS)
+        if before_block:
+            value = value.rstrip(SPACE_CHARS)
+        if value:
+            out.append(value)
+            after_space = value[-1] in SPACE_CHARS
+
+    for kind, raw, name in iter_tokens([content]):
+        if kind == TEXT:
+            # A run of text can arrive as several tokens
+            text.append(raw)
+            continue
+        if kind == COMMENT and not raw.startswith('<!--[if'):
+            # Dropped, the text on either side joins up
+            continue
+        block = _is_block_boundary(kind, name) or kind == COMMENT
+        flush_text(block)
+
+        if kind == RAW_TEXT:
+            if name == 'style':
+                try:
+                    raw = minify_css(raw)
+                except Exception:
+                    pass  # Leave styles the minifier can't handle as they are
+            else:
+                raw = raw.strip(SPACE_CHARS)
+        elif kind in (START_TAG, END_TAG) and name in PRESERVE_ELEMENTS:
+            preserve = max(preserve + (1 if kind == START_TAG else -1), 0)
+        elif kind in (START_TAG, END_TAG) and name in ('head', 'body'):
+            in_head = kind == START_TAG and name == 'head'
+        out.append(raw)
+        if block:
+            after_space = True
+        elif kind != RAW_TEXT and name not in INLINE_ELEMENTS and name not in HIDDEN_ELEMENTS:
+            after_space = False
+    flush_text(True)
+    return ''.join(out)
+
+
+MINIFIERS = {'.html': minify_html, '.css': minify_css}
+
+
+def compressors():
+    """Returns (suffix, function) for each available compression format."""
+    formats = [('.gz', lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))]
+    if brotli is not None:
+        formats.append(('.br', lambda data: brotli.compress(data, quality=BROTLI_QUALITY)))
+    return formats
+
+
+def settings_hash(compress=True):
+    return config_hash(sorted(BLOCK_ELEMENTS), sorted(INLINE_ELEMENTS), sorted(HIDDEN_ELEMENTS), sorted(PRESERVE_ELEMENTS),
+                       COMPRESS_EXTENSIONS, MIN_COMPRESS_SIZE, GZIP_LEVEL, BROTLI_QUALITY,
+                       [suffix for suffix, _ in compressors()] if compress else [],
+                       source_hash(__file__, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bundle_css.py')))
+
+
+def minify_file(rel_path, root_dir, output_dir, digest, compress=True):
+    """
+    Worker entry point: writes the minified copy of one file and, if
+    compress is set, its compressed siblings. Returns its cache entry.
+    """
+    with phase('read'), open(os.path.join(root_dir, rel_path), 'rb') as f:
+        data = f.read()
+    ext = os.path.splitext(rel_path)[1].lower()
+    output = data
+    # Files with front matter are rendered by Jekyll, so they are copied as they are
+    if ext in MINIFIERS and not data.startswith((b'---\n', b'---\r\n')):
+        with phase('transform'):
+            output = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+    output_path = os.path.join(output_dir, rel_path)
+    write_if_changed(output_path, output)
+
+    compressed = {}
+    if compress and ext in COMPRESS_EXTENSIONS and len(output) >= MIN_COMPRESS_SIZE:
+        for suffix, compress in compressors():
+            with phase('compress'):
+                packed = compress(output)
+            if len(packed) < len(output):
+                write_if_changed(output_path + suffix, packed)
+                compressed[suffix] = len(packed)
+
+    if ext in MINIFIERS:
+        saved = len(data) - len(output)
+        siblings = ''.join(f", {suffix} {size:,}" for suffix, size in sorted(compressed.items()))
+        print(f"{rel_path}: {len(data):,} -> {len(output):,} bytes "
+              f"(-{saved / len(data) if data else 0:.0%}){siblings}")
+    return {'hash': digest, 'bytes_in': len(data), 'bytes_out': len(output), 'compressed': compressed}
+
+
+def find_site_files(root_dir):
+    """Returns the published files relative to root_dir."""
+    rel_paths = []
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDE and not d.startswith(('_', '.')))
+        for filename in sorted(files):
+            if filename not in EXCLUDE and not filename.startswith(('_', '.')):
+                rel_paths.append(os.path.relpath(os.path.join(root, filename), root_dir).replace('\\', '/'))
+    return rel_paths
+
+
+def _outputs(rel_path, entry):
+    return [rel_path] + [rel_path + suffix for suffix in entry['compressed']]
+
+
+def load_cache(cache_path):
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable minify cache {cache_path}: {e}")
+    return {}
+
+
+def main(root_dir=ROOT_DIR, jobs=1, output_dir=None, compress=True):
+    output_dir = output_dir or os.path.join(root_dir, os.path.relpath(OUTPUT_DIR, ROOT_DIR))
+    # Kept outside the output (and the root, which may be a build directory)
+    cache_path = os.path.join(os.path.dirname(os.path.abspath(output_dir)), os.path.basename(CACHE_PATH))
+    cache = load_cache(cache_path)
+    settings = settings_hash(compress)
+    files = cache.get('files', {}) if cache.get('settings') == settings else {}
+
+    rel_paths = find_site_files(root_dir)
+    digests = {rel: file_hash(os.path.join(root_dir, rel)) for rel in rel_paths}
+    stale = [rel for rel in rel_paths
+             if files.get(rel, {}).get('hash') != digests[rel]
+             or not all(os.path.exists(os.path.join(output_dir, path)) for path in _outputs(rel, files[rel]))]
+    print(f"Minifying {len(stale)} new or changed file(s) into {os.path.relpath(output_dir)}/, "
+          f"reusing {len(rel_paths) - len(stale)}.")
+    results = run_and_report(minify_file, [(rel, root_dir, output_dir, digests[rel], compress) for rel in stale], jobs)
+    for result in results:
+        if result.error is None:
+            files[result.path] = result.value
+        else:
+            files.pop(result.path, None)
+    files = {rel: files[rel] for rel in rel_paths if rel in files}
+
+    expected = {os.path.normpath(path) for rel, entry in files.items() for path in _outputs(rel, entry)}
+    removed = 0
+    for root, _, filenames in os.walk(output_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if os.path.normpath(os.path.relpath(path, output_dir)) not in expected and remove_file(path):
+                removed += 1
+
+    if not is_dry_run():
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'files': files}, f, sort_keys=True)
+
+    minified = {rel: entry for rel, entry in files.items() if os.path.splitext(rel)[1].lower() in MINIFIERS}
+    bytes_in = sum(entry['bytes_in'] for entry in minified.values())
+    bytes_out = sum(entry['bytes_out'] for entry in minified.values())
+    print(f"...Minified {len(minified)} HTML/CSS file(s): {bytes_in:,} -> {bytes_out:,} bytes "
+          f"(saved {bytes_in - bytes_out:,}, {(bytes_in - bytes_out) / bytes_in if bytes_in else 0:.0%}).")
+    for suffix, _ in compressors() if compress else []:
+        packed = sum(entry['compressed'].get(suffix, entry['bytes_out']) for entry in minified.values())
+        print(f"   With {suffix} siblings: {packed:,} bytes ({packed / bytes_in if bytes_in else 0:.0%} of the original).")
+    if compress and brotli is None:
+        print("   brotli is not installed (pip install brotli), no .br files written.")
+    if removed:
+        print(f"   Removed {removed} file(s) no longer in the site.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a minified, precompressed copy of the site to _dist/.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    parser.add_argument('--output', help="Directory to write the copy to (default: _dist/ under the root).")
+    parser.add_argument('--no-compress', action='store_true', help="Don't write .gz/.br siblings.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(os.path.abspath(args.root), args.jobs, args.output and os.path.abspath(args.output), not args.no_compress)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Optimizes the images in assets/ and serves them responsively on case study pages.
+
+For every PNG/JPEG in assets/ this script:
+- losslessly recompresses PNGs in place (only kept if smaller),
+- writes AVIF/WebP variants at a few widths to assets/optimized/,
+- remembers the content hash of each source so unchanged images are never
+  re-encoded on later runs.
+
+It then rewrites the <img> tags in case_studies/*.html that point at an
+optimized image into <picture> elements with srcset sources, intrinsic
+width/height and loading="lazy".
+
+Usage:
+    python utility/optimize_images.py [--no-recompress] [--jobs N]
+
+Requires Pillow (pip install pillow). AVIF output needs Pillow 11.3+ or the
+pillow-avif-plugin package; without it only WebP variants are generated.
+"""
+import os
+import io
+import json
+import glob
+import argparse
+from PIL import Image, features
+
+from parsers import make_soup
+from parallel import add_jobs_argument, report_results, run_per_file
+from instrument import add_report_argument, set_report
+from site_io import add_write_mode_arguments, is_dry_run, set_write_mode, write_if_changed
+from manifest import config_hash, file_hash
+
+try:
+    import pillow_avif  # noqa: F401 -- registers the AVIF plugin on older Pillow
+except ImportError:
+    pass
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ASSETS_DIR = os.path.join(ROOT_DIR, 'assets')
+OUTPUT_DIR = os.path.join(ASSETS_DIR, 'optimized')
+CACHE_PATH = os.path.join(OUTPUT_DIR, 'images.json')
+CASE_STUDIES_DIR = os.path.join(ROOT_DIR, 'case_studies')
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Case study content is at most 800px wide; the larger buckets cover 1.5x/2x screens.
+WIDTHS = [480, 800, 1200, 1600]
+SIZES = '(max-width: 800px) 100vw, 800px'
+# Encoder settings per output format. WebP is lossless for PNG screenshots,
+# which keeps text crisp and is still much smaller than the PNG.
+ENCODERS = {
+    'avif': {'mime': 'image/avif', 'lossy': {'quality': 60}, 'lossless': {'quality': 90}},
+    'webp': {'mime': 'image/webp', 'lossy': {'quality': 82, 'method': 6}, 'lossless': {'lossless': True, 'method': 6}},
+}
+# --- End Configuration ---
+
+
+def available_formats():
+    """
+    Returns the output formats Pillow can encode here, best first.
+    """
+    formats = []
+    if 'AVIF' in Image.SAVE or features.check('avif'):
+        formats.append('avif')
+    if features.check('webp'):
+        formats.append('webp')
+    return formats
+
+
+def settings_hash(formats):
+    return config_hash(WIDTHS, formats, {fmt: ENCODERS[fmt] for fmt in formats})
+
+
+def load_cache():
+    if os.path.exists(CACHE_PATH):
+        with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_cache(cache):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    tmp_path = CACHE_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, CACHE_PATH)
+
+
+def recompress_png(source_path):
+    """
+    Losslessly recompresses a PNG in place if that makes it smaller.
+    Returns the number of bytes saved.
+    """
+    original_size = os.path.getsize(source_path)
+    with Image.open(source_path) as image:
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', optimize=True)
+    data = buffer.getvalue()
+    if len(data) >= original_size:
+        return 0
+    write_if_changed(source_path, data)
+    return original_size - len(data)
+
+
+def optimize_image(source_path, formats, recompress):
+    """
+    Worker entry point: optimizes one source image and returns its cache entry.
+    """
+    saved = 0
+    if recompress and source_path.lower().endswith('.png'):
+        saved = recompress_png(source_path)
+        if saved:
+            print(f"Recompressed {os.path.basename(source_path)}: saved {saved / 1024:.0f} KB")
+
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    lossless = source_path.lower().endswith('.png')
+    variants = {fmt: [] for fmt in formats}
+
+    with Image.open(source_path) as image:
+        width, height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            # LA and PA keep their alpha in a band, palette images in info['transparency']
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        # Never upscale: widths above the original collapse to the original width
+        bucket_widths = sorted({min(w, width) for w in WIDTHS})
+        for bucket_width in bucket_widths:
+            if bucket_width == width:
+                resized = image
+            else:
+                resized = image.resize((bucket_width, round(height * bucket_width / width)), Image.LANCZOS)
+            for fmt in formats:
+                options = ENCODERS[fmt]['lossless' if lossless else 'lossy']
+                output_path = os.path.join(OUTPUT_DIR, f"{stem}-{bucket_width}.{fmt}")
+                buffer = io.BytesIO()
+                resized.save(buffer, format=fmt.upper(), **options)
+                write_if_changed(output_path, buffer.getvalue())
+                variants[fmt].append([bucket_width, os.path.relpath(output_path, ROOT_DIR).replace('\\', '/')])
+
+    print(f"Optimized {os.path.basename(source_path)} ({width}x{height}) into {sum(len(v) for v in variants.values())} variants")
+    return {
+        'sha256': file_hash(source_path),
+        'width': width,
+        'height': height,
+        'variants': variants,
+        'bytes_saved': saved,
+    }
+
+
+def _is_fresh(entry, source_path, digest):
+    if not entry or entry.get('settings') != digest or entry.get('sha256') != file_hash(source_path):
+        return False
+    return all(os.path.exists(os.path.join(ROOT_DIR, path))
+               for variants in entry['variants'].values() for _, path in variants)
+
+
+def optimize_assets(recompress=True, jobs=1):
+    """
+    Optimizes every stale image in assets/ and returns the updated cache.
+    """
+    formats = available_formats()
+    if not formats:
+        print("Error: this Pillow build can encode neither AVIF nor WebP.")
+        return load_cache()
+    digest = settings_hash(formats)
+
+    cache = load_cache()
+    sources = sorted(path for path in glob.glob(os.path.join(ASSETS_DIR, '*'))
+                     if path.lower().endswith(SOURCE_EXTENSIONS))
+    stale = []
+    for source_path in sources:
+        key = os.path.relpath(source_path, ROOT_DIR).replace('\\', '/')
+        if _is_fresh(cache.get(key), source_path, digest):
+            continue
+        stale.append(source_path)
+
+    print(f"{len(sources) - len(stale)} image(s) unchanged, {len(stale)} to optimize ({', '.join(formats)}).")
+    results = run_per_file(optimize_image, [(path, formats, recompress) for path in stale], jobs)
+    report_results(results)
+
+    for result in results:
+        if result.error is None:
+            result.value['settings'] = digest
+            cache[os.path.relpath(result.path, ROOT_DIR).replace('\\', '/')] = result.value
+    if not is_dry_run():
+        save_cache(cache)
+    return cache
+
+
+def _srcset(variants, prefix):
+    return ', '.join(f"{prefix}{path} {width}w" for width, path in variants)
+
+
+def picture_for_img(soup, img, entry, prefix):
+    """
+    Wraps img in a <picture> with a <source> per optimized format and
+    returns the <picture>. An existing <picture> wrapper is reused.
+    """
+    picture = img.parent if img.parent is not None and img.parent.name == 'picture' else None
+    if picture is None:
+        picture = soup.new_tag('picture')
+        img.wrap(picture)
+    for source in picture.find_all('source'):
+        source.decompose()
+
+    for fmt, variants in entry['variants'].items():
+        source = soup.new_tag('source', type=ENCODERS[fmt]['mime'], srcset=_srcset(variants, prefix), sizes=SIZES)
+        img.insert_before(source)
+
+    img['width'] = str(entry['width'])
+    img['height'] = str(entry['height'])
+    # resource_hints.py loads the page's LCP image eagerly
+    if img.get('fetchpriority') != 'high':
+        img['loading'] = 'lazy'
+    return picture
+
+
+def rewrite_page(file_path, cache):
+    """
+    Wraps the optimized images on one page in <picture> elements.
+    Returns True if the page was changed.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    soup = make_soup(content)
+    prefix = os.path.relpath(ROOT_DIR, os.path.dirname(file_path)).replace('\\', '/') + '/'
+
+    changed = False
+    for img in soup.find_all('img', src=True):
+        target = os.path.normpath(os.path.join(os.path.dirname(file_path), img['src']))
+        entry = cache.get(os.path.relpath(target, ROOT_DIR).replace('\\', '/'))
+        if entry:
+            picture_for_img(soup, img, entry, prefix)
+            changed = True
+
+    if not changed:
+        return False
+    return write_if_changed(file_path, soup.prettify())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize assets/ images and use them on case study pages.")
+    parser.add_argument('--no-recompress', action='store_true', help="Don't recompress the source PNGs in place.")
+    parser.add_argument('--skip-html', action='store_true', help="Only generate the variants, don't rewrite pages.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+
+    print("Optimizing images in assets/...")
+    cache = optimize_assets(not args.no_recompress, args.jobs)
+
+    if args.skip_html:
+        return
+    print("Rewriting <img> tags in case studies...")
+    for file_path in sorted(glob.glob(os.path.join(CASE_STUDIES_DIR, '*.html'))):
+        try:
+            if rewrite_page(file_path, cache):
+                print(f"Updated file: {file_path}")
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+    print("...Finished optimizing images.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Runs a per-file function over many files, optionally in a process pool.
+
+The per-file functions in utility/ report through print(), and print and
+re-raise their errors. To keep the output readable when several processes
+are busy, each call's printed output is captured and the results are
+reported in input order once they are all collected, followed by the files
+that failed, also in input order.
+
+With --report (see instrument.py) each call is also timed, and the timings
+are appended to the run report as the results come back.
+"""
+import io
+import os
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+import instrument
+
+# output is everything the call printed, error is set if it raised,
+# value is whatever the call returned, timing is the instrument record (or None).
+FileResult = namedtuple('FileResult', ['path', 'output', 'error', 'value', 'timing'], defaults=[None])
+
+
+def add_jobs_argument(parser):
+    """
+    Adds the shared --jobs option to an argparse parser.
+    """
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=1,
+        help="Number of worker processes (0 = one per CPU, default: 1).")
+
+
+def resolve_jobs(jobs):
+    if not jobs or jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def _call(func, args):
+    """
+    Calls func(*args) capturing stdout and any exception.
+    """
+    buffer = io.StringIO()
+    error = None
+    value = None
+    if instrument.enabled():
+        instrument.begin(args[0])
+    try:
+        with redirect_stdout(buffer):
+            value = func(*args)
+    except Exception as e:
+        error = f"{e.__class__.__name__}: {e}\n{traceback.format_exc()}"
+    return FileResult(args[0], buffer.getvalue(), error, value, instrument.end(error))
+
+
+def _call_packed(packed):
+    return _call(*packed)
+
+
+def run_per_file(func, arg_tuples, jobs=1, chunksize=4):
+    """
+    Runs func(*args) for each tuple in arg_tuples and returns a list of
+    FileResult in the same order. The first element of each tuple is taken
+    to be the file path. func must be a module level function so it can be
+    sent to worker processes.
+    """
+    arg_tuples = list(arg_tuples)
+    jobs = min(resolve_jobs(jobs), max(len(arg_tuples), 1))
+
+    if jobs == 1:
+        results = [_call(func, args) for args in arg_tuples]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # map() yields results in submission order, which keeps reporting deterministic.
+            results = list(executor.map(_call_packed, [(func, args) for args in arg_tuples], chunksize=chunksize))
+    instrument.log_results(func, results)
+    return results
+
+
+def report_results(results):
+    """
+    Prints the captured output of each result in order, then a list of errors.
+    Returns the number of errors.
+    """
+    errors = []
+    for result in results:
+        if result.output:
+            print(result.output, end='')
+        if result.error:
+            errors.append(result)
+
+    if errors:
+        print(f"\n{len(errors)} file(s) failed:")
+        for result in errors:
+            print(f"  {result.path}: {result.error.splitlines()[0]}")
+    return len(errors)
+
+
+def run_and_report(func, arg_tuples, jobs=1):
+    """
+    Convenience wrapper around run_per_file() and report_results().
+    """
+    results = run_per_file(func, arg_tuples, jobs)
+    report_results(results)
+    return results
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Selectable HTML parser backends for the BeautifulSoup based utilities.
+
+make_soup() builds a BeautifulSoup tree with the standard library's
+html.parser, or the backend named in the SITE_HTML_PARSER environment
+variable. lxml is faster but doesn't serialize every page the way
+html.parser does (it moves a <ul> out of an enclosing <p>, for one), so it is
+never picked on its own: SITE_HTML_PARSER=auto picks the fastest installed
+backend whose pipeline output matches html.parser's on every page under
+writing/ and case_studies/ (see check_conformance and tests/test_parsers.py).
+
+might_match() is a fast path for passes that only need to know whether a
+page could contain something: it searches the raw text, without building a
+soup at all, and never says no to a page the pass would change.
+
+    python utility/parsers.py    # shows the installed and default backends
+"""
+import os
+import glob
+import argparse
+import difflib
+import html
+from bs4 import BeautifulSoup, Doctype, NavigableString
+
+from instrument import phase
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# BeautifulSoup tree builders, fastest first.
+BACKENDS = ['lxml', 'html.parser']
+# The backend every other one has to match, and the default
+REFERENCE_BACKEND = 'html.parser'
+ENV_VAR = 'SITE_HTML_PARSER'
+# SITE_HTML_PARSER value that picks the fastest conforming backend
+AUTO = 'auto'
+# --- End Configuration ---
+
+
+def _is_installed(backend):
+    if backend == 'html.parser':
+        return True
+    try:
+        __import__(backend)
+        return True
+    except ImportError:
+        return False
+
+
+def available_backends():
+    """
+    Returns the installed backends, fastest first.
+    """
+    return [backend for backend in BACKENDS if _is_installed(backend)]
+
+
+def conforming_backend(root_dir=ROOT_DIR):
+    """
+    Returns the fastest installed backend that passes check_conformance()
+    for the pages under root_dir, or REFERENCE_BACKEND.
+    """
+    for backend in available_backends():
+        if backend == REFERENCE_BACKEND:
+            break
+        _, mismatches = check_conformance(root_dir, [backend, REFERENCE_BACKEND])
+        if not mismatches:
+            return backend
+    return REFERENCE_BACKEND
+
+
+def default_backend():
+    """
+    Returns the backend named in SITE_HTML_PARSER, or REFERENCE_BACKEND.
+    """
+    backend = os.environ.get(ENV_VAR)
+    if backend == AUTO:
+        # Passes called by the check parse with the reference backend meanwhile.
+        # The result is kept in the environment, so worker processes and later
+        # calls don't run the check again.
+        os.environ[ENV_VAR] = REFERENCE_BACKEND
+        try:
+            backend = conforming_backend()
+        finally:
+            os.environ[ENV_VAR] = backend if backend != AUTO else REFERENCE_BACKEND
+        return backend
+    if backend:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown parser backend '{backend}', expected one of: {', '.join(BACKENDS + [AUTO])}")
+        return backend
+    return REFERENCE_BACKEND
+
+
+def _restore_doctype_whitespace(soup, markup):
+    """
+    lxml drops the whitespace between <!DOCTYPE html> and <html>, which
+    html.parser keeps. Put it back so both backends serialize identically.
+    """
+    first = next(iter(soup.contents), None)
+    if not isinstance(first, Doctype) or isinstance(first.next_sibling, NavigableString):
+        return
+    start = markup.find('>', markup.lower().find('<!doctype')) + 1
+    end = markup.find('<', start)
+    whitespace = markup[start:end]
+    if whitespace and not whitespace.strip():
+        # BeautifulSoup collapses whitespace-only strings to a single newline or space
+        first.insert_after(NavigableString('\n' if '\n' in whitespace else ' '))
+
+
+def make_soup(markup, backend=None, fragment=False):
+    """
+    Parses markup (a string or open file) with the given or default backend.
+
+    Fragments such as the body of a Substack post are always parsed with
+    html.parser: lxml wraps fragments in <html><body> and bare text in <p>,
+    which would change the cleaned article body.
+    """
+    if hasattr(markup, 'read'):
+        with phase('read'):
+            markup = markup.read()
+    with phase('parse'):
+        if fragment:
+            return BeautifulSoup(markup, 'html.parser')
+
+        backend = backend or default_backend()
+        soup = BeautifulSoup(markup, backend)
+        if backend == 'lxml':
+            _restore_doctype_whitespace(soup, markup)
+        return soup
+
+
+def might_match(markup, needles):
+    """
+    Returns False only when it is certain that none of the needles (lower
+    case strings) occurs in the markup, once character references are
+    decoded. An element or attribute the parser builds is always spelled out
+    in the source, so if a pass only acts on elements containing one of its
+    needles, a False here means the pass has nothing to do on any parser's
+    tree, however malformed the page.
+    """
+    text = html.unescape(markup).lower()
+    return any(needle in text for needle in needles)
+
+
+def check_conformance(root_dir=ROOT_DIR, backends=None):
+    """
+    Runs the pipeline passes over every page under writing/ and case_studies/
+    with each backend and compares the output bytes. Returns a list of
+    (file_path, backend, diff) tuples for the pages that differ.
+    """
+    # Imported here as the pipeline itself depends on this module.
+    from pipeline import PASSES, transform_content
+
+    backends = backends or available_backends()
+    reference = REFERENCE_BACKEND if REFERENCE_BACKEND in backends else backends[-1]
+    file_paths = sorted(glob.glob(os.path.join(root_dir, 'writing', '**', '*.html'), recursive=True)
+                        + glob.glob(os.path.join(root_dir, 'case_studies', '*.html')))
+
+    mismatches = []
+    for file_path in file_paths:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        outputs = {backend: transform_content(content, file_path, root_dir, PASSES, backend).encode('utf-8')
+                   for backend in backends}
+        for backend, output in outputs.items():
+            if output != outputs[reference]:
+                diff = ''.join(difflib.unified_diff(
+                    outputs[reference].decode('utf-8').splitlines(True), output.decode('utf-8').splitlines(True),
+                    f"{reference}", f"{backend}", n=1))
+                mismatches.append((file_path, backend, diff))
+    return file_paths, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the HTML parser backends.")
+    parser.parse_args()
+    print(f"Installed backends (fastest first): {', '.join(available_backends())}")
+    print(f"Default backend: {default_backend()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Runs the site maintenance scripts as passes over a single parse of each page.
+
+Each HTML file is read once, the text passes (link fixes, analytics tags) are
+applied to the raw content, the document is parsed once for the BeautifulSoup
+passes (header sync, stylesheet clean-up), serialized once, and only written
+back when the final output differs from what is on disk.
+
+Usage:
+    python utility/pipeline.py [--passes header,article_css,...] [--jobs N] [--incremental]
+"""
+import os
+import sys
+import argparse
+from collections import namedtuple
+
+from parsers import AUTO, BACKENDS, ENV_VAR, default_backend, make_soup, might_match
+from instrument import add_report_argument, phase, set_report
+from sync_headers import sync_header_in_soup, MENU_ITEMS
+from update_article_css import update_article_soup, ARTICLE_PROBE
+from update_casestudy_css import update_casestudy_soup, CASESTUDY_PROBE
+from fix_links import fix_article_paths_in_text
+from add_analytics import update_gtag_id_in_text, OLD_GTAG_ID, NEW_GTAG_ID
+from update_analytics_tag import update_analytics_in_text, MEASUREMENT_ID
+from build_site import has_source
+from parallel import add_jobs_argument, run_and_report
+from manifest import add_incremental_argument, config_hash, run_incremental, source_hash
+from site_io import add_write_mode_arguments, set_write_mode, write_if_changed
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+EXCLUDE_DIRS = {'utility', '.git', '.github', '_content', '_templates'}
+# Sub-landing pages which should use case_studies.css, not case_studies_articles.css
+CASESTUDY_EXCLUDE_FILES = {'thekey.html', 'atkinsrealis.html'}
+# --- End Configuration ---
+
+# kind is 'text' (str -> str) or 'soup' (soup -> bool changed).
+# pretty marks soup passes whose script wrote soup.prettify() rather than str(soup).
+# probe is an optional tuple of needles (see parsers.might_match); if none occurs, the pass has nothing to do.
+Pass = namedtuple('Pass', ['name', 'kind', 'applies_to', 'apply', 'pretty', 'probe'])
+
+
+def _parts(rel_path):
+    return rel_path.replace('\\', '/').split('/')
+
+
+def _is_article(rel_path):
+    # Files in subdirectories of writing/, e.g. writing/substack/post.html
+    parts = _parts(rel_path)
+    return len(parts) >= 3 and parts[0] == 'writing'
+
+
+def _is_writing_page(rel_path):
+    return _parts(rel_path)[0] == 'writing'
+
+
+def _is_case_study(rel_path):
+    parts = _parts(rel_path)
+    return len(parts) == 2 and parts[0] == 'case_studies' and parts[1] not in CASESTUDY_EXCLUDE_FILES
+
+
+def _everywhere(rel_path):
+    return True
+
+
+# The registered passes, in the order they are applied.
+# Text passes always run before the document is parsed.
+PASSES = [
+    Pass('fix_links', 'text', _is_article,
+         lambda content, path, root: fix_article_paths_in_text(content), False, None),
+    Pass('gtag_id', 'text', _everywhere,
+         lambda content, path, root: update_gtag_id_in_text(content, OLD_GTAG_ID, NEW_GTAG_ID), False, None),
+    Pass('analytics_tag', 'text', _everywhere,
+         lambda content, path, root: update_analytics_in_text(content, MEASUREMENT_ID), False, None),
+    Pass('header', 'soup', _everywhere,
+         lambda soup, path, root: sync_header_in_soup(soup, path, root), True, ('<header', 'header-placeholder')),
+    Pass('article_css', 'soup', _is_writing_page,
+         lambda soup, path, root: update_article_soup(soup, path, root), False, ARTICLE_PROBE),
+    Pass('casestudy_css', 'soup', _is_case_study,
+         lambda soup, path, root: update_casestudy_soup(soup, path, root), True, CASESTUDY_PROBE),
+]
+
+
+def select_passes(names=None):
+    """
+    Returns the registered passes, optionally restricted to the given names.
+    """
+    if not names:
+        return list(PASSES)
+    known = {p.name for p in PASSES}
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown pass(es): {', '.join(unknown)}")
+    return [p for p in PASSES if p.name in names]
+
+
+def transform_content(content, file_path, root_dir, passes, backend=None):
+    """
+    Applies the given passes to the content of one file and returns the result.
+    The content is parsed at most once and serialized at most once.
+    """
+    rel_path = os.path.relpath(file_path, root_dir)
+    applicable = [p for p in passes if p.applies_to(rel_path)]
+
+    for p in applicable:
+        if p.kind == 'text':
+            content = p.apply(content, file_path, root_dir)
+
+    soup_passes = [p for p in applicable if p.kind == 'soup']
+    # Don't build a soup for passes that certainly have nothing to do
+    soup_passes = [p for p in soup_passes if p.probe is None or might_match(content, p.probe)]
+    if not soup_passes:
+        return content
+
+    soup = make_soup(content, backend)
+    changed_passes = [p for p in soup_passes if p.apply(soup, file_path, root_dir)]
+    if not changed_passes:
+        return content
+
+    with phase('serialize'):
+        if any(p.pretty for p in changed_passes):
+            return soup.prettify()
+        return str(soup)
+
+
+def process_file(file_path, root_dir, passes):
+    """
+    Reads, transforms and (if needed) rewrites a single file.
+    Returns True if the file was written.
+    """
+    with phase('read'), open(file_path, 'r', encoding='utf-8') as f:
+        original = f.read()
+
+    with phase('transform'):
+        content = transform_content(original, file_path, root_dir, passes)
+
+    if content == original:
+        return False
+    return write_if_changed(file_path, content)
+
+
+def find_html_files(root_dir):
+    """
+    Yields every HTML file under root_dir, skipping the excluded directories.
+    """
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDE_DIRS)
+        for filename in sorted(files):
+            if filename.endswith('.html'):
+                yield os.path.join(root, filename)
+
+
+def process_file_with_passes(file_path, root_dir, pass_names):
+    """
+    Worker entry point: looks the passes up by name (the pass functions
+    themselves can't be sent to other processes) and processes one file.
+    """
+    if process_file(file_path, root_dir, select_passes(pass_names)):
+        print(f"Updated: {os.path.relpath(file_path, root_dir)}")
+
+
+def transform_config_hash(passes):
+    """
+    Hash of the selected passes and everything they depend on: the parser
+    backend, the header menu items, the GTag IDs and the source of the scripts defining them.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    sources = [os.path.join(script_dir, name) for name in (
+        'pipeline.py', 'sync_headers.py', 'update_article_css.py', 'update_casestudy_css.py', 'bundle_css.py',
+        'fix_links.py', 'add_analytics.py', 'update_analytics_tag.py')]
+    return config_hash([p.name for p in passes], default_backend(), MENU_ITEMS,
+                       OLD_GTAG_ID, NEW_GTAG_ID, MEASUREMENT_ID, source_hash(*sources))
+
+
+def run(root_dir, passes, jobs=1, incremental=False):
+    """
+    Runs the passes over every HTML file under root_dir.
+    """
+    pass_names = [p.name for p in passes]
+    file_paths = list(find_html_files(root_dir))
+    # Pages rendered by build_site.py get their header, stylesheets and tags from the layout
+    built = {path for path in file_paths if has_source(path, root_dir)}
+    if built:
+        print(f"Skipping {len(built)} page(s) built from _content/, run build_site.py for those.")
+        file_paths = [path for path in file_paths if path not in built]
+    arg_tuples = [(path, root_dir, pass_names) for path in file_paths]
+    if incremental:
+        results = run_incremental('pipeline', transform_config_hash(passes), process_file_with_passes, arg_tuples, jobs, root_dir)
+    else:
+        results = run_and_report(process_file_with_passes, arg_tuples, jobs)
+    updated = sum(1 for r in results if r.output)
+    print(f"...Processed {len(file_paths)} files, updated {updated}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the site maintenance passes in a single parse per page.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    parser.add_argument('--passes', help=f"Comma separated passes to run (default: all of {', '.join(p.name for p in PASSES)}).")
+    parser.add_argument('--parser', choices=BACKENDS + [AUTO],
+                        help="HTML parser backend (default: html.parser; auto: the fastest one that "
+                             "serializes every page the same way).")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_incremental_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args(argv)
+    set_write_mode(args)
+    set_report(args)
+
+    if args.parser:
+        # Set through the environment so worker processes pick it up too
+        os.environ[ENV_VAR] = args.parser
+        if args.parser == AUTO:
+            # Resolve it once here rather than in every worker
+            print(f"Using the {default_backend()} parser.")
+
+    try:
+        passes = select_passes(args.passes.split(',') if args.passes else None)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Running passes: {', '.join(p.name for p in passes)}")
+    run(os.path.abspath(args.root), passes, args.jobs, args.incremental)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Adds per-page resource hints for the images on the site.
+
+The landing and case study pages lead with large banners (banner_nepal.jpeg,
+the case_studies.html card banners, the product screenshots) that the
+browser only discovers once it has parsed the stylesheets or reached the
+<img> in the body, and their <img> tags carry no width/height, so the
+layout jumps when they arrive. For every page this script:
+- picks the likely largest contentful paint (LCP) image: the first image in
+  <main> that is above the fold and isn't a logo (see LCP_MIN_WIDTH and
+  LOGO_CLASSES). Inline background-image banners count too,
+- adds a <link rel="preload" as="image" fetchpriority="high"> for it to
+  <head> and fetchpriority="high" to its <img>. Images in a <picture> only
+  get the fetchpriority, since a preload can't choose between the formats,
+- marks the images below the fold loading="lazy" decoding="async",
+- stamps width/height on local images that have neither, read from the
+  image file headers.
+
+An image is above the fold if it's one of the first ABOVE_THE_FOLD_IMAGES
+images in <main> and less than FOLD_TEXT_LENGTH characters of text come
+before it. The sizes are cached in .image_sizes.json by file size and
+modification time, so each image is only read once. The script owns the
+image preloads in <head>: they're replaced when the LCP image changes.
+
+This is a deploy step: the Pages workflow runs it on the checkout after
+bundle_css.py and before fingerprint_assets.py, so the committed pages
+don't carry the hints. optimize_images.py, which wraps the case study
+images in <picture> elements, is run and committed beforehand. Running it
+locally rewrites the pages the same way, to preview the result; git
+checkout the pages afterwards.
+
+Usage:
+    python utility/resource_hints.py [--jobs N]
+"""
+import os
+import re
+import glob
+import json
+import struct
+import argparse
+import urllib.parse
+
+from parsers import make_soup
+from build_site import has_source
+from fingerprint_assets import find_pages
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, record_error, set_report
+from site_io import add_write_mode_arguments, is_dry_run, set_write_mode, write_if_changed
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CACHE_PATH = os.path.join(ROOT_DIR, '.image_sizes.json')
+# Images measured up front; any other local image is measured when a page uses it
+IMAGE_PATTERNS = ['assets/*', 'assets/optimized/*']
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.avif')
+# Images with these classes are never the LCP image
+LOGO_CLASSES = {'company-logo', 'case-study-logo', 'writing-banner-logo'}
+# Narrower images (when their width is known) aren't the LCP image
+LCP_MIN_WIDTH = 400
+ABOVE_THE_FOLD_IMAGES = 2
+# Roughly a desktop screenful of text
+FOLD_TEXT_LENGTH = 2500
+# --- End Configuration ---
+
+BACKGROUND_URL = re.compile(r'background(?:-image)?\s*:[^;]*?url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+SVG_TAG = re.compile(rb'<svg\b[^>]*>', re.S)
+SVG_LENGTH = re.compile(r'^\s*([0-9.]+)\s*(px)?\s*$')
+# JPEG start of frame markers (not DHT 0xC4, JPG 0xC8 or DAC 0xCC)
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _svg_attribute(tag, name):
+    match = re.search(r'\s%s\s*=\s*["\']([^"\']*)["\']' % name, tag)
+    return match.group(1) if match else None
+
+
+def _svg_size(head):
+    match = SVG_TAG.search(head)
+    if not match:
+        return None
+    tag = match.group(0).decode('utf-8', 'replace')
+    width, height = _svg_attribute(tag, 'width'), _svg_attribute(tag, 'height')
+    if width and height and SVG_LENGTH.match(width) and SVG_LENGTH.match(height):
+        return float(SVG_LENGTH.match(width).group(1)), float(SVG_LENGTH.match(height).group(1))
+    view_box = (_svg_attribute(tag, 'viewBox') or '').replace(',', ' ').split()
+    if len(view_box) == 4:
+        return float(view_box[2]), float(view_box[3])
+    return None
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker[1] in JPEG_SOF:
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and len(head) >= 30:
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(head) >= 25:
+        bits = struct.unpack('<I', head[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(head) >= 30:
+        return (int.from_bytes(head[24:27], 'little') + 1,
+                int.from_bytes(head[27:30], 'little') + 1)
+    return None
+
+
+def read_image_size(path):
+    """
+    Returns the (width, height) of a PNG, JPEG, GIF, WebP, AVIF or SVG image
+    from its header, or None if it can't be read.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+        if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head.startswith(b'\xff\xd8'):
+            return _jpeg_size(f)
+        if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+            return _webp_size(head)
+        if head[4:8] == b'ftyp' and b'ispe' in head:
+            # The first image spatial extents box of an AVIF is the primary image
+            offset = head.index(b'ispe') + 8
+            return struct.unpack('>II', head[offset:offset + 8])
+        if path.lower().endswith('.svg'):
+            return _svg_size(head)
+    return None
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_cache(cache_path):
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable image size cache {cache_path}: {e}")
+    return {}
+
+
+def measure_images(root_dir, cache):
+    """
+    Returns {path relative to root_dir: [width, height]} for the images in
+    IMAGE_PATTERNS, reading only those not in the cache, and updates the cache.
+    """
+    sizes = {}
+    measured = 0
+    for pattern in IMAGE_PATTERNS:
+        for path in sorted(glob.glob(os.path.join(root_dir, pattern))):
+            rel = os.path.relpath(path, root_dir).replace('\\', '/')
+            if not os.path.isfile(path) or not rel.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            key = _stat_key(path)
+            entry = cache.get(rel)
+            if entry is None or entry['stat'] != key:
+                try:
+                    size = read_image_size(path)
+                except (OSError, struct.error) as e:
+                    print(f"Can't read the size of {rel}: {e}")
+                    size = None
+                entry = cache[rel] = {'stat': key, 'size': list(size) if size else None}
+                measured += 1
+            if entry['size']:
+                sizes[rel] = entry['size']
+    for rel in [rel for rel in cache if rel not in sizes and not os.path.exists(os.path.join(root_dir, rel))]:
+        del cache[rel]
+    print(f"Measured {measured} new or changed image(s), {len(sizes)} known.")
+    return sizes
+
+
+def local_target(url, file_path, root_dir):
+    """Returns the path relative to root_dir that a page's url points at, or None if it isn't local."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path or '{{' in url:
+        return None
+    path = urllib.parse.unquote(parts.path)
+    if path.startswith('/'):
+        target = os.path.join(root_dir, path.lstrip('/'))
+    else:
+        target = os.path.join(os.path.dirname(file_path), path)
+    return os.path.relpath(os.path.normpath(target), root_dir).replace('\\', '/')
+
+
+def image_size(url, file_path, root_dir, sizes):
+    rel = local_target(url, file_path, root_dir)
+    if rel is None:
+        return None
+    if rel not in sizes:
+        path = os.path.join(root_dir, rel)
+        try:
+            size = read_image_size(path) if os.path.isfile(path) else None
+        except (OSError, struct.error):
+            size = None
+        sizes[rel] = list(size) if size else None
+    return sizes[rel]
+
+
+def _length(value):
+    match = SVG_LENGTH.match(value or '')
+    return float(match.group(1)) if match else None
+
+
+def find_images(container):
+    """
+    Yields (element, url, text_before) for each <img> and inline background
+    image in container, in document order. text_before is the length of the
+    text in container before the image.
+    """
+    text_before = 0
+    for node in container.descendants:
+        if getattr(node, 'name', None) is None:
+            if node.parent.name not in ('script', 'style', 'noscript', 'template'):
+                text_before += len(node.strip())
+            continue
+        if node.name == 'img' and node.get('src'):
+            yield node, node['src'], text_before
+        elif 'url(' in node.get('style', ''):
+            match = BACKGROUND_URL.search(node['style'])
+            if match:
+                yield node, match.group(2).strip(), text_before
+
+
+def is_lcp_candidate(element, url, size):
+    if url.startswith('data:') or LOGO_CLASSES.intersection(element.get('class', [])):
+        return False
+    width = size[0] if size else _length(element.get('width')) or _length(element.get('data-width'))
+    return width is None or width >= LCP_MIN_WIDTH
+
+
+def preload_attributes(element, url):
+    """Returns the attributes of the preload <link> for the LCP image, or None if it shouldn't have one."""
+    if element.name == 'img' and element.parent is not None and element.parent.name == 'picture':
+        return None
+    attrs = {'rel': 'preload', 'as': 'image', 'href': url, 'fetchpriority': 'high'}
+    if element.name == 'img' and element.get('srcset'):
+        attrs['imagesrcset'] = element['srcset']
+        if element.get('sizes'):
+            attrs['imagesizes'] = element['sizes']
+    return attrs
+
+
+def _set(element, name, value):
+    if element.get(name) == value:
+        return False
+    element[name] = value
+    return True
+
+
+def _remove(element, name, value):
+    if element.get(name) != value:
+        return False
+    del element[name]
+    return True
+
+
+def update_preload(soup, attrs):
+    """Makes the image preloads in <head> match attrs (None: no preload). Returns True if anything changed."""
+    head = soup.head
+    if head is None:
+        return False
+    existing = [link for link in head.find_all('link', rel='preload') if link.get('as') == 'image']
+    if attrs is None and not existing:
+        return False
+    if attrs is not None and len(existing) == 1:
+        current = dict(existing[0].attrs, rel=' '.join(existing[0].get('rel', [])))
+        if current == attrs:
+            return False
+    for link in existing:
+        link.decompose()
+    if attrs is not None:
+        link = soup.new_tag('link', attrs=attrs)
+        stylesheet = next((l for l in head.find_all('link') if 'stylesheet' in l.get('rel', [])), None)
+        if stylesheet is not None:
+            stylesheet.insert_before(link)
+        else:
+            head.append(link)
+    return True
+
+
+def add_resource_hints(soup, file_path, root_dir, sizes):
+    """
+    Adds the preload, fetchpriority, lazy loading and intrinsic size hints
+    to one parsed page. Pages without a <head> and <main> are left alone.
+    Returns (changed, LCP image URL or None).
+    """
+    container = soup.find('main')
+    if container is None or soup.head is None:
+        return False, None
+    changed = False
+    lcp = None
+    for index, (element, url, text_before) in enumerate(list(find_images(container))):
+        size = image_size(url, file_path, root_dir, sizes)
+        above_fold = index < ABOVE_THE_FOLD_IMAGES and text_before < FOLD_TEXT_LENGTH
+        if lcp is None and above_fold and is_lcp_candidate(element, url, size):
+            lcp = (element, url)
+        if element.name != 'img':
+            continue
+
+        if lcp is not None and lcp[0] is element:
+            changed |= _set(element, 'fetchpriority', 'high')
+            changed |= _remove(element, 'loading', 'lazy')
+            changed |= _remove(element, 'decoding', 'async')
+        else:
+            changed |= _remove(element, 'fetchpriority', 'high')
+            if not above_fold:
+                if 'loading' not in element.attrs:
+                    changed |= _set(element, 'loading', 'lazy')
+                if 'decoding' not in element.attrs:
+                    changed |= _set(element, 'decoding', 'async')
+
+        if size and 'width' not in element.attrs and 'height' not in element.attrs:
+            element['width'] = str(round(size[0]))
+            element['height'] = str(round(size[1]))
+            changed = True
+
+    changed |= update_preload(soup, preload_attributes(*lcp) if lcp else None)
+    return changed, lcp[1] if lcp else None
+
+
+def hint_page(file_path, root_dir, sizes):
+    """
+    Worker entry point: adds the resource hints to one page.
+    Returns True if the page changed.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            soup = make_soup(f.read())
+        changed, lcp_url = add_resource_hints(soup, file_path, root_dir, sizes)
+        if changed and write_if_changed(file_path, soup.prettify()):
+            print(f"Updated: {os.path.relpath(file_path, root_dir)} (LCP image: {lcp_url or 'none'})")
+            return True
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
+    return False
+
+
+def main(root_dir=ROOT_DIR, jobs=1):
+    cache_path = os.path.join(root_dir, os.path.basename(CACHE_PATH))
+    cache = load_cache(cache_path)
+    sizes = measure_images(root_dir, cache)
+    if not is_dry_run():
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+
+    pages = find_pages(root_dir)
+    # Pages rendered by build_site.py are rewritten from their layout on every build
+    built = [path for path in pages if has_source(path, root_dir)]
+    if built:
+        print(f"Skipping {len(built)} page(s) built from _content/, run build_site.py for those.")
+        pages = [path for path in pages if path not in built]
+    print(f"Adding resource hints to {len(pages)} page(s)...")
+    results = run_and_report(hint_page, [(path, root_dir, sizes) for path in pages], jobs)
+    print(f"...Updated {sum(1 for r in results if r.value)} page(s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preload each page's LCP image, lazy load the rest and add image sizes.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(os.path.abspath(args.root), args.jobs)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Writes files for the site utilities.
+
+write_if_changed() is the one place the utilities write pages and generated
+assets through. It only touches a file when the new bytes differ from what
+is on disk, and writes it atomically: to a temporary file next to it, then
+renamed over the original, so a crash or an interrupted run never leaves a
+half-written page and unchanged files keep their mtime (no git churn, no
+needless Pages or Jekyll rebuilds).
+
+Every utility that writes accepts --dry-run and --diff. In both modes the
+tool runs as usual and reports what it would update, but nothing is
+written; --diff also prints a unified diff of each change. The mode is passed to worker processes
+through the SITE_WRITE_MODE environment variable.
+"""
+import os
+import sys
+import shutil
+import difflib
+import threading
+
+import instrument
+
+# --- Configuration ---
+ENV_VAR = 'SITE_WRITE_MODE'
+MODES = ('write', 'dry-run', 'diff')
+# --- End Configuration ---
+
+
+def write_mode():
+    """Returns 'write', 'dry-run' or 'diff'."""
+    mode = os.environ.get(ENV_VAR) or 'write'
+    if mode not in MODES:
+        raise ValueError(f"{ENV_VAR}={mode} is not one of: {', '.join(MODES)}")
+    return mode
+
+
+def is_dry_run():
+    """True when changes are only being reported (--dry-run or --diff)."""
+    return write_mode() != 'write'
+
+
+def add_write_mode_arguments(parser):
+    """
+    Adds the shared --dry-run and --diff options to an argparse parser.
+    Call set_write_mode() with the parsed arguments.
+    """
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--dry-run', action='store_true', help="List the files that would change without writing them.")
+    group.add_argument('--diff', action='store_true', help="Print a unified diff of each change without writing it.")
+
+
+def set_write_mode(args):
+    if getattr(args, 'diff', False):
+        os.environ[ENV_VAR] = 'diff'
+    elif getattr(args, 'dry_run', False):
+        os.environ[ENV_VAR] = 'dry-run'
+    if is_dry_run():
+        print("Dry run: no files will be written.")
+
+
+def _read_bytes(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def print_diff(path, old, new):
+    """Prints a unified diff between two versions (bytes) of a file."""
+    try:
+        old_lines = (old or b'').decode('utf-8').splitlines(keepends=True)
+        new_lines = new.decode('utf-8').splitlines(keepends=True)
+    except UnicodeDecodeError:
+        print(f"Binary file {path} would change ({len(old or b'')} -> {len(new)} bytes)")
+        return
+    name = os.path.relpath(path).replace('\\', '/')
+    for line in difflib.unified_diff(old_lines, new_lines, 'a/' + name if old is not None else '/dev/null', 'b/' + name):
+        sys.stdout.write(line if line.endswith('\n') else line + '\n\\ No newline at end of file\n')
+
+
+def write_if_changed(path, content):
+    """
+    Writes content (str, encoded as UTF-8, or bytes) to path if it differs
+    from the file's current bytes. Returns True if the file changed, or in
+    --dry-run / --diff mode, would have.
+    """
+    with instrument.phase('write'):
+        return _write_if_changed(path, content)
+
+
+def _write_if_changed(path, content):
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    old = _read_bytes(path)
+    if old == data:
+        return False
+    instrument.mark_changed()
+    instrument.add_bytes_out(len(data))
+
+    mode = write_mode()
+    if mode == 'diff':
+        print_diff(path, old, data)
+    if mode != 'write':
+        return True
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Unique per process and thread, as several workers may write next to each other
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        if old is not None:
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
+
+
+def remove_file(path):
+    """
+    Deletes a generated file, unless in --dry-run / --diff mode.
+    Returns True if the file existed.
+    """
+    if not os.path.exists(path):
+        return False
+    if not is_dry_run():
+        os.remove(path)
+    return True
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+A streaming HTML tokenizer and rewriter for simple attribute / script edits.
+
+The input is read in chunks and split into tokens (text, start tags, end
+tags, comments, declarations and the raw contents of <script>/<style>).
+Every token is written back out exactly as it was read unless a callback
+returns a replacement, so untouched bytes round-trip unchanged. Only the
+token currently being read is held in memory, and output is flushed in
+chunks, so memory use doesn't grow with the size of the page.
+
+This is deliberately not a full HTML parser: it only needs to find tag
+boundaries reliably enough to rewrite href/src attributes and inline
+scripts, which is all fix_links.py and update_analytics_tag.py do.
+"""
+import io
+import os
+import shutil
+import tempfile
+
+import site_io
+import instrument
+
+# --- Configuration ---
+CHUNK_SIZE = 64 * 1024
+# Elements whose contents are raw text rather than markup
+RAW_TEXT_ELEMENTS = ('script', 'style')
+# --- End Configuration ---
+
+# Token kinds
+TEXT = 'text'
+START_TAG = 'start_tag'
+END_TAG = 'end_tag'
+COMMENT = 'comment'
+DECL = 'decl'
+RAW_TEXT = 'raw_text'
+
+_NAME_END = ' \t\n\r\f/>'
+
+
+def _find_tag_end(buffer, start):
+    """
+    Returns the index just past the '>' closing the tag starting at start,
+    skipping over quoted attribute values, or -1 if it isn't in the buffer yet.
+    """
+    quote = None
+    i = start + 1
+    length = len(buffer)
+    while i < length:
+        char = buffer[i]
+        if quote:
+            i = buffer.find(quote, i)
+            if i < 0:
+                return -1
+            quote = None
+        elif char == '>':
+            return i + 1
+        elif char in '"\'' and buffer[i - 1] in '= \t\n\r\f':
+            quote = char
+        i += 1
+    return -1
+
+
+def _find_end_tag(buffer, name, start):
+    """
+    Returns the index of the first '</name' (any case) at or after start, or -1.
+    """
+    i = buffer.find('</', start)
+    while i >= 0:
+        candidate = buffer[i + 2:i + 2 + len(name)]
+        if len(candidate) < len(name):
+            return -1
+        if candidate.lower() == name:
+            return i
+        i = buffer.find('</', i + 2)
+    return -1
+
+
+def tag_name(raw_tag):
+    """
+    Returns the lower-cased element name of a raw start or end tag.
+    """
+    start = 2 if raw_tag.startswith('</') else 1
+    end = start
+    while end < len(raw_tag) and raw_tag[end] not in _NAME_END:
+        end += 1
+    return raw_tag[start:end].lower()
+
+
+def iter_tokens(chunks):
+    """
+    Yields (kind, raw, name) tuples for the markup in an iterable of string
+    chunks. name is the element name for tags and raw text, '' otherwise.
+    Concatenating every raw value gives back the original input.
+    """
+    buffer = ''
+    pos = 0
+    raw_text_element = None
+    search_from = 0
+    chunks = iter(chunks)
+    exhausted = False
+
+    while True:
+        if pos > 0:
+            buffer = buffer[pos:]
+            search_from = max(search_from - pos, 0)
+            pos = 0
+        if not exhausted:
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+            else:
+                buffer += chunk
+
+        while pos < len(buffer):
+            if raw_text_element:
+                # Everything up to the matching end tag is raw text. It is
+                # yielded in one piece so callbacks see whole scripts.
+                end = _find_end_tag(buffer, raw_text_element, max(pos, search_from))
+                if end < 0:
+                    if not exhausted:
+                        # Don't rescan what we've already searched, minus
+                        # enough of the tail to spot a split end tag
+                        search_from = max(pos, len(buffer) - len(raw_text_element) - 2)
+                        break
+                    end = len(buffer)
+                search_from = 0
+                if end > pos:
+                    yield RAW_TEXT, buffer[pos:end], raw_text_element
+                pos = end
+                raw_text_element = None
+                continue
+
+            lt = buffer.find('<', pos)
+            if lt < 0:
+                yield TEXT, buffer[pos:], ''
+                pos = len(buffer)
+                break
+            if lt > pos:
+                yield TEXT, buffer[pos:lt], ''
+                pos = lt
+
+            rest = buffer[pos + 1:pos + 4]
+            if len(rest) < 3 and not exhausted:
+                break
+
+            if rest.startswith('!--'):
+                end = buffer.find('-->', pos + 4)
+                if end < 0:
+                    if exhausted:
+                        end = len(buffer) - 3
+                    else:
+                        break
+                yield COMMENT, buffer[pos:end + 3], ''
+                pos = end + 3
+            elif rest[:1] in ('!', '?'):
+                end = buffer.find('>', pos)
+                if end < 0:
+                    if exhausted:
+                        end = len(buffer) - 1
+                    else:
+                        break
+                yield DECL, buffer[pos:end + 1], ''
+                pos = end + 1
+            elif rest[:1] == '/' or rest[:1].isalpha():
+                end = _find_tag_end(buffer, pos)
+                if end < 0:
+                    if exhausted:
+                        end = len(buffer)
+                    else:
+                        break
+                raw = buffer[pos:end]
+                name = tag_name(raw)
+                if raw.startswith('</'):
+                    yield END_TAG, raw, name
+                else:
+                    yield START_TAG, raw, name
+                    if name in RAW_TEXT_ELEMENTS and not raw.endswith('/>'):
+                        raw_text_element = name
+                pos = end
+            else:
+                # A bare '<' in text
+                yield TEXT, '<', ''
+                pos += 1
+
+        if exhausted and pos >= len(buffer):
+            return
+
+
+def iter_attributes(raw_tag):
+    """
+    Yields (name, value, value_start, value_end) for each attribute of a raw
+    start tag. value_start/value_end are the offsets of the value inside
+    raw_tag (excluding quotes); both are -1 for attributes without a value.
+    """
+    i = 1 + len(tag_name(raw_tag))
+    length = len(raw_tag)
+    while i < length:
+        while i < length and raw_tag[i] in ' \t\n\r\f/':
+            i += 1
+        if i >= length or raw_tag[i] == '>':
+            return
+        name_start = i
+        while i < length and raw_tag[i] not in ' \t\n\r\f/>=':
+            i += 1
+        name = raw_tag[name_start:i].lower()
+        while i < length and raw_tag[i] in ' \t\n\r\f':
+            i += 1
+        if i >= length or raw_tag[i] != '=':
+            yield name, None, -1, -1
+            continue
+        i += 1
+        while i < length and raw_tag[i] in ' \t\n\r\f':
+            i += 1
+        if i < length and raw_tag[i] in '"\'':
+            quote = raw_tag[i]
+            end = raw_tag.find(quote, i + 1)
+            if end < 0:
+                end = length
+            yield name, raw_tag[i + 1:end], i + 1, end
+            i = end + 1
+        else:
+            value_start = i
+            while i < length and raw_tag[i] not in ' \t\n\r\f>':
+                i += 1
+            yield name, raw_tag[value_start:i], value_start, i
+
+
+def replace_attribute_values(raw_tag, replacer):
+    """
+    Returns raw_tag with each attribute value replaced by
+    replacer(name, value, quote); replacer returns the value unchanged to
+    leave it alone. quote is the quote character used, or '' if unquoted.
+    """
+    pieces = []
+    last = 0
+    for name, value, start, end in iter_attributes(raw_tag):
+        if value is None:
+            continue
+        quote = raw_tag[start - 1] if raw_tag[start - 1] in '"\'' else ''
+        new_value = replacer(name, value, quote)
+        if new_value != value:
+            pieces.append(raw_tag[last:start])
+            pieces.append(new_value)
+            last = end
+    if not pieces:
+        return raw_tag
+    pieces.append(raw_tag[last:])
+    return ''.join(pieces)
+
+
+def read_chunks(file_obj, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def rewrite_stream(src, dst, on_start_tag=None, on_raw_text=None, chunk_size=CHUNK_SIZE):
+    """
+    Copies markup from the src file object to the dst file object, passing
+    start tags through on_start_tag(raw, name) and raw script/style text
+    through on_raw_text(raw, name). Returns True if anything was changed.
+    """
+    changed = False
+    pending = []
+    pending_size = 0
+    for kind, raw, name in iter_tokens(read_chunks(src, chunk_size)):
+        if kind == START_TAG and on_start_tag:
+            new_raw = on_start_tag(raw, name)
+        elif kind == RAW_TEXT and on_raw_text:
+            new_raw = on_raw_text(raw, name)
+        else:
+            new_raw = raw
+        if new_raw != raw:
+            changed = True
+        pending.append(new_raw)
+        pending_size += len(new_raw)
+        if pending_size >= chunk_size:
+            dst.write(''.join(pending))
+            pending = []
+            pending_size = 0
+    if pending:
+        dst.write(''.join(pending))
+    return changed
+
+
+def rewrite_text(content, on_start_tag=None, on_raw_text=None):
+    """
+    rewrite_stream() for content that is already in memory.
+    """
+    output = io.StringIO()
+    rewrite_stream(io.StringIO(content), output, on_start_tag, on_raw_text)
+    return output.getvalue()
+
+
+def rewrite_file(file_path, on_start_tag=None, on_raw_text=None):
+    """
+    Rewrites a file in place through rewrite_stream(). The output goes to a
+    temporary file next to it which only replaces the original if something
+    changed. Returns True if the file was changed. In --dry-run / --diff mode
+    the change is only reported, through site_io.
+    """
+    if site_io.is_dry_run():
+        with instrument.phase('read'), open(file_path, 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+        with instrument.phase('transform'):
+            content = rewrite_text(content, on_start_tag, on_raw_text)
+        return site_io.write_if_changed(file_path, content)
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        # newline='' keeps the original line endings byte for byte. Reading,
+        # rewriting and writing are interleaved here, so they time as one phase.
+        with instrument.phase('transform'), open(file_path, 'r', encoding='utf-8', newline='') as src, \
+                os.fdopen(fd, 'w', encoding='utf-8', newline='') as dst:
+            changed = rewrite_stream(src, dst, on_start_tag, on_raw_text)
+        if changed:
+            with instrument.phase('write'):
+                # mkstemp() creates the file owner-only; keep the original's permissions
+                shutil.copymode(file_path, tmp_path)
+                os.replace(tmp_path, file_path)
+            instrument.mark_changed()
+            instrument.add_bytes_out(os.path.getsize(file_path))
+        return changed
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Downloads the images referenced by imported Substack posts into assets/.
+
+Images are fetched concurrently from a thread pool in which each thread
+keeps one keep-alive connection per host, stored under their content hash
+(so the same picture served from two URLs is only kept once) and the <img>
+src attributes are rewritten to the local copies. An index of URL -> file
+is kept in assets/substack/index.json so re-imports never fetch an image
+that is already stored.
+"""
+import os
+import html
+import json
+import hashlib
+import mimetypes
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from stream_rewrite import START_TAG, iter_tokens, iter_attributes, replace_attribute_values, rewrite_text
+from site_io import is_dry_run, write_if_changed
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+IMAGES_DIR = os.path.join(ROOT_DIR, 'assets', 'substack')
+INDEX_PATH = os.path.join(IMAGES_DIR, 'index.json')
+MAX_WORKERS = 8
+MAX_REDIRECTS = 5
+TIMEOUT_SECONDS = 30
+USER_AGENT = 'harryjan.github.io feed importer'
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif',
+    'image/webp': '.webp', 'image/avif': '.avif', 'image/svg+xml': '.svg',
+}
+# --- End Configuration ---
+
+_local = threading.local()
+
+
+def _connection(scheme, host):
+    """
+    Returns this thread's connection to scheme://host, opening it if needed.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = (scheme, host)
+    if key not in connections:
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        connections[key] = connection_class(host, timeout=TIMEOUT_SECONDS)
+    return connections[key]
+
+
+def _get(url):
+    """
+    GETs a URL over a reused connection, following redirects.
+    Returns (body_bytes, content_type).
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        connection = _connection(parts.scheme, parts.netloc)
+        try:
+            connection.request('GET', path, headers={'User-Agent': USER_AGENT})
+            response = connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # The server may have closed an idle keep-alive connection; retry once on a fresh one
+            connection.close()
+            connection.request('GET', path, headers={'User-Agent': USER_AGENT})
+            response = connection.getresponse()
+        body = response.read()
+        if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+            url = urllib.parse.urljoin(url, response.getheader('Location'))
+            continue
+        if response.status != 200:
+            raise OSError(f"HTTP {response.status} for {url}")
+        return body, (response.getheader('Content-Type') or '').split(';')[0].strip()
+    raise OSError(f"Too many redirects for {url}")
+
+
+def _extension(url, content_type):
+    if content_type in CONTENT_TYPE_EXTENSIONS:
+        return CONTENT_TYPE_EXTENSIONS[content_type]
+    guessed = os.path.splitext(urllib.parse.urlsplit(url).path)[1].lower()
+    return guessed if guessed in mimetypes.types_map else '.img'
+
+
+def load_index():
+    if os.path.exists(INDEX_PATH):
+        with open(INDEX_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_index(index):
+    write_if_changed(INDEX_PATH, json.dumps(index, indent=1, sort_keys=True))
+
+
+def find_remote_images(markup):
+    """
+    Returns the http(s) <img> src URLs in the markup, in document order.
+    """
+    urls = []
+    for kind, raw, name in iter_tokens([markup]):
+        if kind == START_TAG and name == 'img':
+            for attr, value, _, _ in iter_attributes(raw):
+                if attr == 'src' and value and value.startswith(('http://', 'https://')) and value not in urls:
+                    urls.append(value)
+    return urls
+
+
+def _download(url):
+    """
+    Downloads one image and stores it under its content hash.
+    Returns the file name inside IMAGES_DIR.
+    """
+    # url is the raw attribute value, which may still contain entities like &amp;
+    url = html.unescape(url)
+    body, content_type = _get(url)
+    filename = hashlib.sha256(body).hexdigest()[:20] + _extension(url, content_type)
+    path = os.path.join(IMAGES_DIR, filename)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+    return filename
+
+
+def download_images(urls, max_workers=MAX_WORKERS):
+    """
+    Makes sure every URL has a local copy and returns a dict URL -> file name.
+    URLs already in the index (with the file still present) are not fetched.
+    """
+    index = load_index()
+    missing = [url for url in dict.fromkeys(urls)
+               if url not in index or not os.path.exists(os.path.join(IMAGES_DIR, index[url]))]
+
+    if missing and is_dry_run():
+        print(f"Skipping {len(missing)} image download(s) in a dry run; they keep their remote URLs.")
+    elif missing:
+        os.makedirs(IMAGES_DIR, exist_ok=True)
+        print(f"Downloading {len(missing)} image(s) ({len(urls) - len(missing)} already stored)...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {url: executor.submit(_download, url) for url in missing}
+        for url, future in futures.items():
+            try:
+                index[url] = future.result()
+            except Exception as e:
+                print(f"Could not download {url}: {e}")
+        save_index(index)
+
+    return {url: index[url] for url in urls if url in index}
+
+
+def rewrite_image_sources(markup, local_files, article_dir):
+    """
+    Points <img src> at the local copies, relative to the article's directory.
+    """
+    prefix = os.path.relpath(IMAGES_DIR, article_dir).replace('\\', '/') + '/'
+
+    def on_start_tag(raw, name):
+        if name != 'img':
+            return raw
+        return replace_attribute_values(
+            raw, lambda attr, value, quote: prefix + local_files[value] if attr == 'src' and value in local_files else value)
+
+    return rewrite_text(markup, on_start_tag=on_start_tag)
+
+
+def localize_images(bodies, article_dir):
+    """
+    Localizes the images of several cleaned article bodies at once, so an
+    image shared between posts is fetched a single time. Returns the
+    rewritten bodies in the same order.
+    """
+    urls = []
+    for body in bodies:
+        urls.extend(find_remote_images(body))
+    if not urls:
+        return list(bodies)
+    local_files = download_images(urls)
+    return [rewrite_image_sources(body, local_files, article_dir) for body in bodies]
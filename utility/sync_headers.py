@@ -1,6 +1,22 @@
 #!/usr/bin/env python3
 import os
-from bs4 import BeautifulSoup
+import argparse
+
+from parsers import default_backend, make_soup
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, record_error, set_report
+from manifest import add_incremental_argument, config_hash, run_incremental, source_hash
+from site_io import add_write_mode_arguments, set_write_mode, write_if_changed
+
+# Define menu items
+MENU_ITEMS = {
+    "Home": "index.html",
+    "Consulting": "consulting.html",
+    "CV": "cv.html",
+    "Case Studies": "case_studies.html",
+    "Writing": "writing.html",
+    "Books": "books.html"
+}
 
 def create_header_html(soup, relative_path_prefix):
     """
@@ -17,17 +33,7 @@ def create_header_html(soup, relative_path_prefix):
     nav = soup.new_tag('nav')
     ul = soup.new_tag('ul')
 
-    # Define menu items
-    menu_items = {
-        "Home": "index.html",
-        "Consulting": "consulting.html",
-        "CV": "cv.html",
-        "Case Studies": "case_studies.html",
-        "Writing": "writing.html",
-        "Books": "books.html"
-    }
-
-    for text, href in menu_items.items():
+    for text, href in MENU_ITEMS.items():
         li = soup.new_tag('li')
         a = soup.new_tag('a', href=f"{relative_path_prefix}{href}")
         a.string = text
@@ -39,6 +45,38 @@ def create_header_html(soup, relative_path_prefix):
     
     return header
 
+def sync_header_in_soup(soup, file_path, root_dir):
+    """
+    Replaces the placeholder or old header in an already parsed document.
+    Returns True if the document was changed.
+    """
+    # Find either the placeholder or an existing header tag
+    placeholder = soup.find('div', id='header-placeholder')
+    old_header = soup.find('header')
+
+    element_to_replace = placeholder or old_header
+
+    # If neither is found, there's nothing to do for this file.
+    if not element_to_replace:
+        return False
+
+    # Calculate the relative path from the file's directory to the root
+    file_dir = os.path.dirname(file_path)
+    relative_path_to_root = os.path.relpath(root_dir, file_dir)
+
+    if relative_path_to_root == '.':
+        relative_path_prefix = ''
+    else:
+        # os.path.join will correctly handle path separators
+        relative_path_prefix = os.path.join(relative_path_to_root, '').replace('\\', '/')
+
+    # Generate the new header with correct paths
+    new_header = create_header_html(soup, relative_path_prefix)
+
+    # Replace the placeholder with the new header
+    element_to_replace.replace_with(new_header)
+    return True
+
 def sync_header_in_file(file_path, root_dir):
     """
     Finds an old header or a placeholder and replaces it with a new,
@@ -46,55 +84,55 @@ def sync_header_in_file(file_path, root_dir):
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'html.parser')
+            soup = make_soup(f)
 
-        # Find either the placeholder or an existing header tag
-        placeholder = soup.find('div', id='header-placeholder')
-        old_header = soup.find('header')
-        
-        element_to_replace = placeholder or old_header
+        if not sync_header_in_soup(soup, file_path, root_dir):
+            return
 
-        # If neither is found, there's nothing to do for this file.
-        if not element_to_replace:
+        # The header may have been replaced with an identical one
+        if not write_if_changed(file_path, soup.prettify()):
             return
 
-        # Calculate the relative path from the file's directory to the root
-        file_dir = os.path.dirname(file_path)
-        relative_path_to_root = os.path.relpath(root_dir, file_dir)
-        
-        if relative_path_to_root == '.':
-            relative_path_prefix = ''
-        else:
-            # os.path.join will correctly handle path separators
-            relative_path_prefix = os.path.join(relative_path_to_root, '').replace('\\', '/')
-
-        # Generate the new header with correct paths
-        new_header = create_header_html(soup, relative_path_prefix)
-
-        # Replace the placeholder with the new header
-        element_to_replace.replace_with(new_header)
-
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(str(soup.prettify()))
-        
         print(f"Synced header in: {os.path.relpath(file_path, root_dir)}")
 
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
 
-def main():
-    """Walks through the project directory and syncs headers in all HTML files."""
-    portfolio_dir = '/Users/harryhunter/Documents/1_dev_projects/my-portfolio'
+def find_html_files(portfolio_dir):
+    """Returns every HTML file in the project, excluding the utility directory."""
     exclude_dirs = {os.path.join(portfolio_dir, 'utility')}
-
-    print("Starting to sync headers across all HTML files...")
+    file_paths = []
     for root, dirs, files in os.walk(portfolio_dir):
-        dirs[:] = [d for d in dirs if os.path.join(root, d) not in exclude_dirs]
-        for filename in files:
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) not in exclude_dirs)
+        for filename in sorted(files):
             if filename.endswith('.html'):
-                file_path = os.path.join(root, filename)
-                sync_header_in_file(file_path, portfolio_dir)
+                file_paths.append(os.path.join(root, filename))
+    return file_paths
+
+def transform_config_hash():
+    """Hash of everything that decides what the synced header looks like."""
+    return config_hash(MENU_ITEMS, default_backend(), source_hash(__file__))
+
+def main(portfolio_dir='/Users/harryhunter/Documents/1_dev_projects/my-portfolio', jobs=1, incremental=False):
+    """Walks through the project directory and syncs headers in all HTML files."""
+    print("Starting to sync headers across all HTML files...")
+    arg_tuples = [(path, portfolio_dir) for path in find_html_files(portfolio_dir)]
+    if incremental:
+        run_incremental('sync_headers', transform_config_hash(), sync_header_in_file, arg_tuples, jobs, portfolio_dir)
+    else:
+        run_and_report(sync_header_in_file, arg_tuples, jobs)
     print("...Finished syncing headers.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync the standard header across all HTML files.")
+    parser.add_argument('--root', default='/Users/harryhunter/Documents/1_dev_projects/my-portfolio', help="Root directory of the site.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_incremental_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(args.root, args.jobs, args.incremental)
\ No newline at end of file
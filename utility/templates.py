@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+A small template engine for the site's {{NAME}} placeholders.
+
+A template is compiled once into a list of literal chunks and placeholder
+names, so rendering is a single join instead of one str.replace() pass per
+placeholder. Compiled templates are cached per process and recompiled only
+when the file's size or modification time changes.
+
+Values are inserted as is (they are HTML). Rendering with a missing value
+raises TemplateError rather than leaving the placeholder in the page.
+"""
+import os
+import re
+
+PLACEHOLDER = re.compile(r'\{\{\s*([A-Z0-9_]+)\s*\}\}')
+
+_cache = {}
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:
+    """
+    A compiled template: literal chunks interleaved with placeholder names.
+    """
+
+    def __init__(self, source, name='<string>'):
+        self.name = name
+        self.parts = []
+        pos = 0
+        for match in PLACEHOLDER.finditer(source):
+            self.parts.append((source[pos:match.start()], None))
+            self.parts.append((None, match.group(1)))
+            pos = match.end()
+        self.parts.append((source[pos:], None))
+        self.parts = [part for part in self.parts if part != ('', None)]
+        self.placeholders = {name for _, name in self.parts if name is not None}
+
+    def render(self, values):
+        missing = self.placeholders - values.keys()
+        if missing:
+            raise TemplateError(f"{self.name}: no value for {', '.join(sorted(missing))}")
+        return ''.join(literal if name is None else str(values[name]) for literal, name in self.parts)
+
+
+def load_template(path):
+    """
+    Returns the compiled template at path, reusing the cached one if the
+    file hasn't changed since it was compiled.
+    """
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        template = Template(f.read(), os.path.basename(path))
+    _cache[path] = (key, template)
+    return template
+
+
+def render(path, values):
+    """
+    Renders the template file at path with the given placeholder values.
+    """
+    return load_template(path).render(values)
@@ -1,63 +1,258 @@
 import os
-import re
+import argparse
 
-def update_analytics_in_file(file_path, new_id):
+from stream_rewrite import END_TAG, RAW_TEXT, START_TAG, TEXT, iter_attributes, iter_tokens
+from stream_rewrite import replace_attribute_values, rewrite_file, rewrite_text
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, phase, record_error, set_report
+from site_io import add_write_mode_arguments, set_write_mode, write_if_changed
+
+# IMPORTANT: Replace this with your actual Google Analytics 4 Measurement ID
+MEASUREMENT_ID = 'G-VE38R5Y66Q'
+
+CONFIG_CALL_START = "gtag('config', '"
+CONFIG_CALL_END = "');"
+ID_PREFIXES = ('GTM-', 'G-')
+SRC_ID_PREFIX = 'id=GTM-'
+GTAG_JS_URL = 'https://www.googletagmanager.com/gtag/js?id='
+LOADER_ID_PREFIX = 'gtag/js?id='
+
+# Appended to the inline gtag snippet by --defer, in place of the blocking
+# <script async src="...gtag/js"> tag. The gtag() calls before it only queue
+# on dataLayer; gtag.js replays them once it has loaded after the page.
+DEFERRED_LOADER = """
+
+      // Load gtag.js once the page has loaded and the browser is idle
+      window.addEventListener('load', function () {{
+        function loadGtag() {{
+          var script = document.createElement('script');
+          script.async = true;
+          script.src = '{url}{measurement_id}';
+          document.head.appendChild(script);
+        }}
+        if ('requestIdleCallback' in window) {{
+          requestIdleCallback(loadGtag, {{timeout: 2000}});
+        }} else {{
+          setTimeout(loadGtag, 1);
+        }}
+      }});"""
+
+def _id_length(text, start):
     """
-    Updates the Google Analytics tracking code in a given HTML file.
+    Returns the length of the measurement ID (G-XXXX or GTM-XXXX) at start, or 0.
+    """
+    for prefix in ID_PREFIXES:
+        if text.startswith(prefix, start):
+            end = start + len(prefix)
+            while end < len(text) and (text[end].isdigit() or 'A' <= text[end] <= 'Z'):
+                end += 1
+            return end - start if end > start + len(prefix) else 0
+    return 0
+
+class AnalyticsRewriter:
+    """
+    Streaming callbacks that point every gtag config call and gtag.js URL at
+    new_id, keeping only the first config call in the document.
+    """
+
+    def __init__(self, new_id):
+        self.new_id = new_id
+        self.config_calls = 0
+
+    def on_raw_text(self, raw, name):
+        if name != 'script' or CONFIG_CALL_START not in raw:
+            return raw
+        pieces = []
+        last = 0
+        start = raw.find(CONFIG_CALL_START)
+        while start >= 0:
+            id_start = start + len(CONFIG_CALL_START)
+            id_length = _id_length(raw, id_start)
+            end = id_start + id_length
+            if id_length and raw.startswith(CONFIG_CALL_END, end):
+                end += len(CONFIG_CALL_END)
+                self.config_calls += 1
+                if self.config_calls == 1:
+                    pieces.append(raw[last:start])
+                    pieces.append(f"gtag('config', '{self.new_id}');")
+                else:
+                    # Remove the duplicate call together with its indentation
+                    line_start = raw.rfind('\n', last, start)
+                    if line_start < 0 or raw[line_start + 1:start].strip():
+                        line_start = start
+                    pieces.append(raw[last:line_start])
+                last = end
+            start = raw.find(CONFIG_CALL_START, end if id_length else start + 1)
+        pieces.append(raw[last:])
+        return self._replace_loader_id(''.join(pieces))
+
+    def _replace_loader_id(self, raw):
+        # The gtag.js URL in a deferred loader (see DEFERRED_LOADER)
+        start = raw.find(LOADER_ID_PREFIX)
+        while start >= 0:
+            id_start = start + len(LOADER_ID_PREFIX)
+            id_length = _id_length(raw, id_start)
+            if id_length:
+                raw = raw[:id_start] + self.new_id + raw[id_start + id_length:]
+            start = raw.find(LOADER_ID_PREFIX, id_start)
+        return raw
+
+    def on_start_tag(self, raw, name):
+        if SRC_ID_PREFIX not in raw:
+            return raw
+        return replace_attribute_values(raw, self._replace_src_id)
+
+    def _replace_src_id(self, name, value, quote):
+        # Also replace the ID in the script src URL
+        start = value.find(SRC_ID_PREFIX)
+        if name != 'src' or start < 0:
+            return value
+        id_start = start + len('id=')
+        id_length = _id_length(value, id_start)
+        if not id_length:
+            return value
+        return value[:id_start] + self.new_id + value[id_start + id_length:]
+
+def update_analytics_in_text(content, new_id):
+    """
+    Returns the content with the Google Analytics tracking code updated.
     It replaces old IDs and ensures there is only one correct config line.
 
+    Args:
+        content (str): The HTML content.
+        new_id (str): The new GA4 Measurement ID to use (e.g., 'G-XXXXXXXXXX').
+    """
+    rewriter = AnalyticsRewriter(new_id)
+    return rewrite_text(content, rewriter.on_start_tag, rewriter.on_raw_text)
+
+def _is_gtag_js(raw_tag):
+    return any(name == 'src' and value and LOADER_ID_PREFIX in value
+               for name, value, _, _ in iter_attributes(raw_tag))
+
+def _config_id(raw):
+    # The ID (or template placeholder) of the first config call in a script
+    start = raw.find(CONFIG_CALL_START) + len(CONFIG_CALL_START)
+    return raw[start:raw.find("'", start)]
+
+def count_analytics(content):
+    """
+    Returns (config calls, gtag.js script tags, deferred loaders) in the content.
+    """
+    config_calls = script_tags = loaders = 0
+    for kind, raw, name in iter_tokens([content]):
+        if kind == START_TAG and name == 'script' and _is_gtag_js(raw):
+            script_tags += 1
+        elif kind == RAW_TEXT and name == 'script':
+            config_calls += raw.count(CONFIG_CALL_START)
+            loaders += raw.count(LOADER_ID_PREFIX)
+    return config_calls, script_tags, loaders
+
+def defer_analytics_in_text(content, new_id=None):
+    """
+    Returns the content with the blocking gtag.js <script> tag removed and
+    a loader that fetches gtag.js after the page has loaded appended to the
+    inline gtag snippet. Raises ValueError unless the result has exactly one
+    config call and one loader.
+
+    Args:
+        content (str): The HTML content.
+        new_id (str): If given, the GA4 Measurement ID to point the config call at.
+    """
+    rewriter = AnalyticsRewriter(new_id) if new_id else None
+    pieces = []
+    dropping = dropped = False
+    for kind, raw, name in iter_tokens([content]):
+        if dropping:
+            dropping = not (kind == END_TAG and name == 'script')
+            dropped = not dropping
+            continue
+        if kind == START_TAG and name == 'script' and _is_gtag_js(raw):
+            # Drop the element together with its line
+            indent = pieces[-1][pieces[-1].rfind('\n') + 1:] if pieces else ''
+            if pieces and '\n' in pieces[-1] and not indent.strip():
+                pieces[-1] = pieces[-1][:len(pieces[-1]) - len(indent)]
+            dropping = True
+            continue
+        if dropped and kind == TEXT and raw.startswith('\n') and pieces and pieces[-1].endswith('\n'):
+            raw = raw[1:]
+        dropped = False
+        if kind == RAW_TEXT and name == 'script' and CONFIG_CALL_START in raw:
+            if rewriter:
+                raw = rewriter.on_raw_text(raw, name)
+            if LOADER_ID_PREFIX not in raw and CONFIG_CALL_START in raw:
+                body = raw.rstrip()
+                loader = DEFERRED_LOADER.format(url=GTAG_JS_URL, measurement_id=_config_id(body))
+                raw = body + loader + raw[len(body):]
+        pieces.append(raw)
+
+    result = ''.join(pieces)
+    config_calls, script_tags, loaders = count_analytics(result)
+    if (config_calls, script_tags, loaders) != (1, 0, 1):
+        raise ValueError(f"expected one gtag config call and one deferred loader, found "
+                         f"{config_calls} config call(s), {loaders} loader(s) and {script_tags} gtag.js tag(s)")
+    return result
+
+def defer_analytics_in_file(file_path, new_id):
+    """
+    Switches a given HTML file to the deferred gtag.js loader (see
+    defer_analytics_in_text) and checks it keeps a single config call.
+
     Args:
         file_path (str): The path to the HTML file.
         new_id (str): The new GA4 Measurement ID to use (e.g., 'G-XXXXXXXXXX').
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-
-        original_content = content
-        
-        # This regex finds all gtag('config', '...') lines.
-        config_pattern = re.compile(r"gtag\('config', 'G(TM)?-[A-Z0-9]+'\);")
-        
-        # Find all existing config lines
-        config_lines = config_pattern.findall(content)
-
-        # If there are any config lines, replace them with a single, correct one.
-        if config_lines:
-            # Replace the first occurrence with the new ID
-            content = config_pattern.sub(f"gtag('config', '{new_id}');", content, 1)
-            
-            # Remove any other duplicate config lines
-            remaining_configs = config_pattern.findall(content)
-            if len(remaining_configs) > 0:
-                 content = config_pattern.sub("", content)
-                 # And add back the one correct one
-                 content = content.replace("gtag('js', new Date());", f"gtag('js', new Date());\n\n      gtag('config', '{new_id}');")
+        with phase('read'), open(file_path, 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+        with phase('transform'):
+            new_content = defer_analytics_in_text(content, new_id)
+        if write_if_changed(file_path, new_content):
+            print(f"Deferred analytics loading in: {file_path}")
 
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
 
-        # Also replace the ID in the script src URL
-        content = re.sub(r'id=GTM-[A-Z0-9]+', f'id={new_id}', content)
+def update_analytics_in_file(file_path, new_id):
+    """
+    Updates the Google Analytics tracking code in a given HTML file, streaming
+    it through the rewriter in a single pass.
 
-        if content != original_content:
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(content)
+    Args:
+        file_path (str): The path to the HTML file.
+        new_id (str): The new GA4 Measurement ID to use (e.g., 'G-XXXXXXXXXX').
+    """
+    try:
+        rewriter = AnalyticsRewriter(new_id)
+        if rewrite_file(file_path, rewriter.on_start_tag, rewriter.on_raw_text):
             print(f"Updated analytics tag in: {file_path}")
 
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
 
-def main():
+def main(portfolio_directory='/Users/harryhunter/Documents/my-portfolio', jobs=1, defer=False):
     """Main function to run the script."""
-    portfolio_directory = '/Users/harryhunter/Documents/my-portfolio'
-    # IMPORTANT: Replace this with your actual Google Analytics 4 Measurement ID
-    new_measurement_id = 'G-VE38R5Y66Q'
-
-    for root, _, files in os.walk(portfolio_directory):
-        for filename in files:
+    file_paths = []
+    for root, dirs, files in os.walk(portfolio_directory):
+        dirs.sort()
+        for filename in sorted(files):
             if filename.endswith('.html'):
-                file_path = os.path.join(root, filename)
-                update_analytics_in_file(file_path, new_measurement_id)
+                file_paths.append(os.path.join(root, filename))
+    update = defer_analytics_in_file if defer else update_analytics_in_file
+    run_and_report(update, [(path, MEASUREMENT_ID) for path in file_paths], jobs)
     print("\nAnalytics tag update complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Update the Google Analytics tag in all HTML files.")
+    parser.add_argument('--root', default='/Users/harryhunter/Documents/my-portfolio', help="Root directory of the site.")
+    parser.add_argument('--defer', action='store_true', help="Load gtag.js after the page instead of from <head>.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(args.root, args.jobs, args.defer)
\ No newline at end of file
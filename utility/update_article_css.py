@@ -1,69 +1,106 @@
 #!/usr/bin/env python3
 import os
-from bs4 import BeautifulSoup
+import argparse
 
-def update_article_html(file_path):
+from parsers import default_backend, make_soup, might_match
+from bundle_css import link_stylesheets, ROOT_DIR
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, record_error, set_report
+from manifest import add_incremental_argument, config_hash, run_incremental, source_hash
+from site_io import add_write_mode_arguments, set_write_mode, write_if_changed
+
+# Text found in every page update_article_soup() would change (see parsers.might_match).
+ARTICLE_PROBE = ('profile-pic', 'style.css', 'article.css')
+
+def update_article_soup(soup, file_path, root_dir=ROOT_DIR):
+    """
+    Applies the article clean-up to an already parsed document.
+    Returns True if the document was changed.
+    """
+    made_changes = False
+
+    # --- Header Cleanup ---
+    # Find and remove the extra profile picture from article headers
+    extra_profile_pic = soup.select_one('header > img.profile-pic')
+    if extra_profile_pic:
+        extra_profile_pic.decompose()
+        made_changes = True
+
+    # --- Stylesheet Link Cleanup ---
+    head = soup.find('head')
+    if head:
+        # Find all old stylesheet links that need replacing
+        old_links = head.find_all('link', rel='stylesheet', href=lambda href: href and ('style.css' in href or 'article.css' in href))
+        if old_links:
+            # Remove all old links
+            for link in old_links:
+                link.decompose()
+            
+            # Link the stylesheets configured for the page; bundle_css.py folds them into its bundle
+            link_stylesheets(soup, file_path, root_dir)
+            made_changes = True
+
+    return made_changes
+
+def update_article_html(file_path, root_dir=ROOT_DIR):
     """
     Updates article HTML files to a consistent format.
     - Cleans up the header structure to remove duplicate profile information.
-    - Replaces 'style.css' and 'article.css' with 'common.css' and 'writing_articles.css'.
+    - Replaces 'style.css' and 'article.css' with the stylesheets bundle_css.PAGE_STYLESHEETS lists for the page.
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'html.parser')
-
-        made_changes = False
-
-        # --- Header Cleanup ---
-        # Find and remove the extra profile picture from article headers
-        extra_profile_pic = soup.select_one('header > img.profile-pic')
-        if extra_profile_pic:
-            extra_profile_pic.decompose()
-            made_changes = True
+            content = f.read()
 
-        # --- Stylesheet Link Cleanup ---
-        head = soup.find('head')
-        if head:
-            # Find all old stylesheet links that need replacing
-            old_links = head.find_all('link', rel='stylesheet', href=lambda href: href and ('style.css' in href or 'article.css' in href))
-            if old_links:
-                # Remove all old links
-                for link in old_links:
-                    link.decompose()
-                
-                # Create the new, correct links
-                common_css_link = soup.new_tag('link', rel='stylesheet', href='../../styles/common.css')
-                articles_css_link = soup.new_tag('link', rel='stylesheet', href='../../styles/writing_articles.css')
-                
-                # Find the last <link> tag to insert the new ones after
-                last_link_tag = head.find_all('link', href=True)[-1]
-                last_link_tag.insert_after(articles_css_link)
-                last_link_tag.insert_after(common_css_link)
-                made_changes = True
+        # Skip building the full soup for pages that are already up to date
+        if not might_match(content, ARTICLE_PROBE):
+            return
 
-        if made_changes:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(str(soup))
-            print(f"Updated file: {file_path}")
+        soup = make_soup(content)
+        if update_article_soup(soup, file_path, root_dir):
+            if write_if_changed(file_path, str(soup)):
+                print(f"Updated file: {file_path}")
         
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
 
-def main():
+def find_article_files(writing_dir):
+    """Returns every HTML file under the 'writing' directory."""
+    file_paths = []
+    for root, dirs, files in os.walk(writing_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith('.html'):
+                file_paths.append(os.path.join(root, file))
+    return file_paths
+
+def main(jobs=1, incremental=False, portfolio_root=None):
     """
     Walks through the 'writing' directory and updates all HTML files.
     """
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    portfolio_root = os.path.dirname(script_dir)
+    if portfolio_root is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        portfolio_root = os.path.dirname(script_dir)
     writing_dir = os.path.join(portfolio_root, 'writing')
     
     print("Starting to update article CSS links...")
-    for root, _, files in os.walk(writing_dir):
-        for file in files:
-            if file.endswith('.html'):
-                file_to_update = os.path.join(root, file)
-                update_article_html(file_to_update)
+    arg_tuples = [(path, portfolio_root) for path in find_article_files(writing_dir)]
+    if incremental:
+        digest = config_hash(default_backend(), source_hash(__file__, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bundle_css.py')))
+        run_incremental('update_article_css', digest, update_article_html, arg_tuples, jobs, portfolio_root)
+    else:
+        run_and_report(update_article_html, arg_tuples, jobs)
     print("...Finished updating article CSS links.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Update the stylesheet links in article pages.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_incremental_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(args.jobs, args.incremental)
\ No newline at end of file
@@ -1,67 +1,97 @@
 #!/usr/bin/env python3
 import os
-from bs4 import BeautifulSoup
+import argparse
 
-def update_casestudy_html(file_path):
+from parsers import default_backend, make_soup, might_match
+from bundle_css import link_stylesheets, ROOT_DIR
+from parallel import add_jobs_argument, run_and_report
+from instrument import add_report_argument, record_error, set_report
+from manifest import add_incremental_argument, config_hash, run_incremental, source_hash
+from site_io import add_write_mode_arguments, set_write_mode, write_if_changed
+
+# Text found in every page update_casestudy_soup() would change (see parsers.might_match).
+CASESTUDY_PROBE = ('style.css', 'article.css')
+
+def update_casestudy_soup(soup, file_path, root_dir=ROOT_DIR):
+    """
+    Applies the case study stylesheet clean-up to an already parsed document.
+    Returns True if the document was changed.
+    """
+    made_changes = False
+
+    # --- Stylesheet Link Cleanup ---
+    head = soup.find('head')
+    if head:
+        # Find all old stylesheet links that need replacing
+        old_links = head.find_all('link', rel='stylesheet', href=lambda href: href and ('style.css' in href or 'article.css' in href))
+        if old_links:
+            # Remove all old links
+            for link in old_links:
+                link.decompose()
+            
+            # Link the stylesheets configured for the page; bundle_css.py folds them into its bundle
+            link_stylesheets(soup, file_path, root_dir)
+            made_changes = True
+
+    return made_changes
+
+def update_casestudy_html(file_path, root_dir=ROOT_DIR):
     """
     Updates case study HTML files to a consistent format.
-    - Replaces old CSS links with 'common.css' and 'case_studies_articles.css'.
+    - Replaces old CSS links with the stylesheets bundle_css.PAGE_STYLESHEETS lists for the page.
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'html.parser')
+            content = f.read()
 
-        made_changes = False
+        # Skip building the full soup for pages that are already up to date
+        if not might_match(content, CASESTUDY_PROBE):
+            return
 
-        # --- Stylesheet Link Cleanup ---
-        head = soup.find('head')
-        if head:
-            # Find all old stylesheet links that need replacing
-            old_links = head.find_all('link', rel='stylesheet', href=lambda href: href and ('style.css' in href or 'article.css' in href))
-            if old_links:
-                # Remove all old links
-                for link in old_links:
-                    link.decompose()
-                
-                # Create the new, correct links
-                common_css_link = soup.new_tag('link', rel='stylesheet', href='../styles/common.css')
-                casestudies_css_link = soup.new_tag('link', rel='stylesheet', href='../styles/case_studies_articles.css')
-                
-                # Find the last <link> tag to insert the new ones after
-                # This helps keep the new links at the end of the other links.
-                all_links = head.find_all('link', href=True)
-                if all_links:
-                    last_link_tag = all_links[-1]
-                    last_link_tag.insert_after(casestudies_css_link) # Insert new specific CSS
-                    last_link_tag.insert_after(common_css_link)
-                else: # If no links exist, just append them to head
-                    head.append(common_css_link)
-                    head.append(casestudies_css_link)
-                made_changes = True
-
-        if made_changes:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(str(soup.prettify()))
-            print(f"Updated file: {file_path}")
+        soup = make_soup(content)
+        if update_casestudy_soup(soup, file_path, root_dir):
+            if write_if_changed(file_path, str(soup.prettify())):
+                print(f"Updated file: {file_path}")
         
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
+        record_error(e)
+        raise
 
-def main():
-    """Walks through the 'case_studies' directory and updates all HTML files."""
-    case_studies_dir = '/Users/harryhunter/Documents/my-portfolio/case_studies'
+def find_casestudy_files(case_studies_dir):
+    """Returns the case study pages, skipping the excluded sub-landing pages."""
     # Exclude sub-landing pages which should use case_studies.css, not case_studies_articles.css
     exclude_files = ['thekey.html', 'atkinsrealis.html']
-    
-    print("Starting to update case study CSS links...")
-    for filename in os.listdir(case_studies_dir):
+
+    file_paths = []
+    for filename in sorted(os.listdir(case_studies_dir)):
         if filename.endswith('.html'):
             if filename in exclude_files:
                 print(f"Skipping excluded file: {filename}")
                 continue
-            file_to_update = os.path.join(case_studies_dir, filename)
-            update_casestudy_html(file_to_update)
+            file_paths.append(os.path.join(case_studies_dir, filename))
+    return file_paths
+
+def main(case_studies_dir='/Users/harryhunter/Documents/my-portfolio/case_studies', jobs=1, incremental=False):
+    """Walks through the 'case_studies' directory and updates all HTML files."""
+    print("Starting to update case study CSS links...")
+    portfolio_root = os.path.dirname(os.path.abspath(case_studies_dir))
+    arg_tuples = [(path, portfolio_root) for path in find_casestudy_files(case_studies_dir)]
+    if incremental:
+        digest = config_hash(default_backend(), source_hash(__file__, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bundle_css.py')))
+        run_incremental('update_casestudy_css', digest, update_casestudy_html, arg_tuples, jobs, portfolio_root)
+    else:
+        run_and_report(update_casestudy_html, arg_tuples, jobs)
     print("...Finished updating case study CSS links.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Update the stylesheet links in case study pages.")
+    parser.add_argument('--dir', default='/Users/harryhunter/Documents/my-portfolio/case_studies', help="The case_studies directory.")
+    add_jobs_argument(parser)
+    add_report_argument(parser)
+    add_incremental_argument(parser)
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    set_report(args)
+    main(args.dir, args.jobs, args.incremental)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Watches the site and applies the maintenance passes to pages as they are saved.
+
+Instead of re-running sync_headers.py, update_article_css.py and friends over
+the whole tree after every edit, keep this running while you work:
+
+    python utility/watch_site.py [--passes header,article_css] [--poll]
+
+The pipeline passes, the parser and their configuration are loaded once. The
+watcher subscribes to the kernel's file change events (inotify, through
+ctypes, on Linux) or, where those aren't available, polls the tree. A burst of
+events, like an editor's save or a git checkout, is collected until things go
+quiet for DEBOUNCE_SECONDS and then handled in one go:
+- a changed page gets the passes that apply to it (see pipeline.PASSES),
+- a change under _content/, _templates/ or _data/ runs build_site's
+  incremental rebuild, which rebuilds only the pages it affects.
+Files the watcher writes itself are recognised by their hash and not handled
+again. Changes to the scripts themselves need a restart.
+"""
+import os
+import sys
+import time
+import errno
+import ctypes
+import select
+import struct
+import argparse
+import ctypes.util
+
+import pipeline
+import build_site
+from parsers import make_soup
+from manifest import file_hash
+from site_io import add_write_mode_arguments, is_dry_run, set_write_mode
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Directories that hold no pages or page inputs (dot directories are skipped too)
+EXCLUDE_DIRS = {'utility', 'assets', 'styles', '_dist', 'node_modules'}
+# Changes here go through build_site's incremental rebuild
+BUILD_INPUT_DIRS = (build_site.CONTENT_DIR, '_templates', '_data')
+WATCHED_EXTENSIONS = ('.html', '.json')
+DEBOUNCE_SECONDS = 0.1
+POLL_INTERVAL_SECONDS = 0.5
+# --- End Configuration ---
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _is_watched_dir(name):
+    return name not in EXCLUDE_DIRS and not name.startswith('.')
+
+
+def _is_watched_file(name):
+    # Skips editor swap files and the temporary files site_io writes through
+    return name.endswith(WATCHED_EXTENSIONS) and not name.startswith('.')
+
+
+def watched_dirs(root_dir):
+    dirs_found = []
+    for root, dirs, _ in os.walk(root_dir):
+        dirs[:] = sorted(d for d in dirs if _is_watched_dir(d))
+        dirs_found.append(root)
+    return dirs_found
+
+
+class InotifyWatcher:
+    """
+    Reports changed files from inotify events. Raises OSError when inotify
+    isn't available.
+    """
+
+    def __init__(self, root_dir):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or libc_name is None:
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        for directory in watched_dirs(root_dir):
+            self.add_dir(directory)
+
+    def add_dir(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            print(f"Can't watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self.dirs[wd] = directory
+
+    def wait(self, timeout):
+        """Returns the set of files changed within timeout seconds (None: block)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                print("Too many changes at once, some may have been missed; save the file again.")
+                continue
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and _is_watched_dir(name):
+                    # Watch new directories, and pick up files written before the watch was in place
+                    for new_dir in watched_dirs(path):
+                        self.add_dir(new_dir)
+                        changed.update(os.path.join(new_dir, f) for f in os.listdir(new_dir) if _is_watched_file(f))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and _is_watched_file(name):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Reports changed files by comparing the size and mtime of every watched
+    file every POLL_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, root_dir, interval=POLL_INTERVAL_SECONDS):
+        self.root_dir = root_dir
+        self.interval = interval
+        self.stats = self.scan()
+
+    def scan(self):
+        stats = {}
+        for directory in watched_dirs(self.root_dir):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_file() and _is_watched_file(entry.name):
+                    stat = entry.stat()
+                    stats[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return stats
+
+    def wait(self, timeout):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        stats = self.scan()
+        changed = {path for path, stat in stats.items() if self.stats.get(path) != stat}
+        self.stats = stats
+        return changed
+
+    def close(self):
+        pass
+
+
+class SiteWatcher:
+    """
+    Applies the passes to changed pages, remembering what it wrote itself.
+    """
+
+    def __init__(self, root_dir, passes):
+        self.root_dir = root_dir
+        self.passes = passes
+        # path -> hash of the content the watcher last wrote there
+        self.written = {}
+
+    def handle(self, paths):
+        rebuild = False
+        for path in sorted(paths):
+            if not os.path.exists(path):
+                continue
+            if self.written.pop(path, None) == file_hash(path):
+                continue
+            rel_path = os.path.relpath(path, self.root_dir).replace('\\', '/')
+            if rel_path.split('/')[0] in BUILD_INPUT_DIRS:
+                rebuild = True
+            elif path.endswith('.html') and 'template' not in os.path.basename(rel_path):
+                self.process_page(path, rel_path)
+        if rebuild:
+            self.rebuild()
+
+    def process_page(self, path, rel_path):
+        if build_site.has_source(path, self.root_dir):
+            print(f"{time.strftime('%H:%M:%S')} {rel_path} is built from {build_site.CONTENT_DIR}/, edit the source instead.")
+            return
+        started = time.perf_counter()
+        try:
+            changed = pipeline.process_file(path, self.root_dir, self.passes)
+        except Exception as e:
+            print(f"Error processing {rel_path}: {e}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        if changed:
+            if not is_dry_run():
+                self.written[path] = file_hash(path)
+            print(f"{time.strftime('%H:%M:%S')} Updated {rel_path} ({elapsed:.0f} ms)")
+        else:
+            print(f"{time.strftime('%H:%M:%S')} {rel_path} is up to date ({elapsed:.0f} ms)")
+
+    def rebuild(self):
+        print(f"{time.strftime('%H:%M:%S')} Build inputs changed, rebuilding...")
+        try:
+            results = build_site.rebuild(self.root_dir)
+        except Exception as e:
+            print(f"Error rebuilding: {e}")
+            return
+        for result in results:
+            if result.value and not is_dry_run():
+                page_path = build_site.page_path_for(result.path, self.root_dir)
+                self.written[page_path] = file_hash(page_path)
+
+
+def make_watcher(root_dir, poll=False):
+    if not poll:
+        try:
+            watcher = InotifyWatcher(root_dir)
+            print(f"Watching {len(watcher.dirs)} directories with inotify.")
+            return watcher
+        except (OSError, AttributeError) as e:
+            print(f"inotify not available ({e}), polling instead.")
+    watcher = PollingWatcher(root_dir)
+    print(f"Polling {len(watcher.stats)} files every {watcher.interval}s.")
+    return watcher
+
+
+def watch(root_dir=ROOT_DIR, passes=None, poll=False, debounce=DEBOUNCE_SECONDS):
+    site = SiteWatcher(root_dir, passes or pipeline.select_passes())
+    # Load the parser before the first change comes in
+    make_soup('<!DOCTYPE html><html><head></head><body></body></html>')
+    watcher = make_watcher(root_dir, poll)
+    print(f"Applying passes: {', '.join(p.name for p in site.passes)}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            pending = watcher.wait(None)
+            # Debounce: keep collecting until the burst is over
+            while pending:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                pending |= more
+            if pending:
+                site.handle(pending)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        watcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the site passes to pages as they are saved.")
+    parser.add_argument('--root', default=ROOT_DIR, help="Root directory of the site.")
+    parser.add_argument('--passes', help=f"Comma separated passes to run (default: all of "
+                                         f"{', '.join(p.name for p in pipeline.PASSES)}).")
+    parser.add_argument('--poll', action='store_true', help="Poll for changes instead of using inotify.")
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS,
+                        help="Seconds without changes before a burst is handled (default: %(default)s).")
+    add_write_mode_arguments(parser)
+    args = parser.parse_args()
+    set_write_mode(args)
+    try:
+        passes = pipeline.select_passes(args.passes.split(',') if args.passes else None)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    watch(os.path.abspath(args.root), passes, args.poll, args.debounce)
+
+
+if __name__ == "__main__":
+    main()